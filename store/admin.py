@@ -88,10 +88,10 @@ class OrderAdmin(admin.ModelAdmin):
     inlines = [OrderItemInline]
     list_display = ["id", "placed_at", "customer_name"]
     ordering = ["-placed_at"]
-    list_select_related = ["customer"]
+    list_select_related = ["customer__user"]
 
     def customer_name(self, order):
-        return f"{order.customer.first_name} {order.customer.last_name}"
+        return f"{order.customer.first_name()} {order.customer.last_name()}"
 
 
 @admin.register(Collection)
@@ -110,13 +110,6 @@ class CollectionAdmin(admin.ModelAdmin):
             '<a href="{}">{}</a>', url, collection.products_count
         )
 
-    def get_queryset(self, request):
-        return (
-            super()
-            .get_queryset(request)
-            .annotate(products_count=Count("product"))
-        )
-
 
 # admin.site.register(Product, ProductAdmin)
 # admin.site.register(Customer, CustomerAdmin)
@@ -0,0 +1,647 @@
+import json
+import logging
+import math
+import statistics
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from storefront.metrics import QueryRecorder
+
+from .generator import WORDS, generate, scaled_volumes
+from .models import (
+    MAX_HELD_CARTS,
+    Cart,
+    CartItem,
+    Customer,
+    Product,
+    Review,
+)
+from .pagination import DefaultPagination
+from .serializers import TokenObtainPairSerializer
+from .urls import urlpatterns
+
+DEFAULT_SCALES = [0.01, 0.1]
+# Rows of each kind the routes rotate through.
+SAMPLE_SIZE = 100
+# Keyset pages walked to find the cursor of a deep page.
+KEYSET_DEPTH = 20
+# Each scale gets its own caches, so that results do not depend on what
+# the catalog cache held before the run.
+BENCHMARK_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "catalog": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark-catalog",
+    },
+}
+
+Call = namedtuple("Call", ["method", "path", "data", "token"])
+
+
+def _sample(queryset, size=SAMPLE_SIZE):
+    rows = list(queryset)
+    return rows[:: max(1, len(rows) // size)][:size] or [None]
+
+
+def _rotate(rows, count):
+    return [rows[index % len(rows)] for index in range(count)]
+
+
+def _access_token(user):
+    return str(TokenObtainPairSerializer.get_token(user).access_token)
+
+
+class Fixture:
+    """Users, tokens and row ids the routes are driven with."""
+
+    def __init__(self, client):
+        admin = User.objects.create_user(
+            "benchmark-admin", is_staff=True, is_superuser=True
+        )
+        shopper = User.objects.create_user("benchmark-shopper")
+        Customer.objects.create(user=shopper, phone="555-0100")
+        self.admin = admin
+        self.admin_token = _access_token(admin)
+        self.customer_token = _access_token(shopper)
+
+        self.product_ids = _sample(
+            Product.objects.order_by("id").values_list("id", flat=True)
+        )
+        self.stocked_ids = _sample(
+            Product.objects.filter(inventory__gte=100)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        self.collection_ids = _sample(
+            Product.objects.order_by("collection_id")
+            .values_list("collection_id", flat=True)
+            .distinct()
+        )
+        self.reviews = _sample(
+            Review.objects.order_by("id").values_list("product_id", "id")
+        )
+        self.cart_ids = _sample(
+            Cart.objects.order_by("id").values_list("id", flat=True)
+        )
+        self.cart_items = _sample(
+            CartItem.objects.order_by("id").values_list("cart_id", "id")
+        )
+        self.last_page = max(
+            1, math.ceil(Product.objects.count() / DefaultPagination.page_size)
+        )
+
+        path = "/store/products/?cursor="
+        for _ in range(KEYSET_DEPTH):
+            next_url = client.get(path).data.get("next")
+            if next_url is None:
+                break
+            parts = urlsplit(next_url)
+            path = f"{parts.path}?{parts.query}"
+        self.deep_cursor_path = path
+
+    def new_carts(self, count, items=1):
+        carts = []
+        for index in range(count):
+            cart = Cart.objects.create()
+            CartItem.objects.add_quantities(
+                cart.id,
+                {
+                    product_id: 1
+                    for product_id in _rotate(
+                        self.stocked_ids[index:] + self.stocked_ids, items
+                    )
+                },
+            )
+            carts.append(cart)
+        return carts
+
+
+def products_list(fixture, count):
+    return [Call("GET", "/store/products/", None, None)] * count
+
+
+def products_filter(fixture, count):
+    return [
+        Call(
+            "GET",
+            f"/store/products/?collection_id={collection_id}"
+            "&unit_price__gt=10&unit_price__lt=500",
+            None,
+            None,
+        )
+        for collection_id in _rotate(fixture.collection_ids, count)
+    ]
+
+
+def products_search(fixture, count):
+    return [
+        Call("GET", f"/store/products/?search={word}", None, None)
+        for word in _rotate(WORDS, count)
+    ]
+
+
+def products_ordering(fixture, count):
+    return [
+        Call("GET", f"/store/products/?ordering={ordering}", None, None)
+        for ordering in _rotate(
+            ["-unit_price", "unit_price", "-last_update"], count
+        )
+    ]
+
+
+def products_deep_page(fixture, count):
+    path = f"/store/products/?page={fixture.last_page}"
+    return [Call("GET", path, None, None)] * count
+
+
+def products_deep_cursor(fixture, count):
+    return [Call("GET", fixture.deep_cursor_path, None, None)] * count
+
+
+def product_detail(fixture, count):
+    return [
+        Call("GET", f"/store/products/{product_id}/", None, None)
+        for product_id in _rotate(fixture.product_ids, count)
+    ]
+
+
+def reviews_list(fixture, count):
+    return [
+        Call("GET", f"/store/products/{product_id}/reviews/", None, None)
+        for product_id in _rotate(fixture.product_ids, count)
+    ]
+
+
+def reviews_create(fixture, count):
+    return [
+        Call(
+            "POST",
+            f"/store/products/{product_id}/reviews/",
+            {"name": "Benchmark", "description": "Benchmark review."},
+            None,
+        )
+        for product_id in _rotate(fixture.product_ids, count)
+    ]
+
+
+def review_detail(fixture, count):
+    return [
+        Call("GET", f"/store/products/{product_id}/reviews/{id}", None, None)
+        for product_id, id in _rotate(fixture.reviews, count)
+    ]
+
+
+def review_delete(fixture, count):
+    reviews = [
+        Review.objects.create(
+            product_id=product_id, name="Benchmark", description="Delete me."
+        )
+        for product_id in _rotate(fixture.product_ids, count)
+    ]
+    return [
+        Call(
+            "DELETE",
+            f"/store/products/{review.product_id}/reviews/{review.id}",
+            None,
+            None,
+        )
+        for review in reviews
+    ]
+
+
+def collections_list(fixture, count):
+    return [Call("GET", "/store/collections/", None, None)] * count
+
+
+def collection_detail(fixture, count):
+    return [
+        Call("GET", f"/store/collections/{collection_id}/", None, None)
+        for collection_id in _rotate(fixture.collection_ids, count)
+    ]
+
+
+def catalog_cache_stats(fixture, count):
+    path = "/store/catalog-cache/stats/"
+    return [Call("GET", path, None, fixture.admin_token)] * count
+
+
+def db_pool_stats(fixture, count):
+    path = "/store/db-pool/stats/"
+    return [Call("GET", path, None, fixture.admin_token)] * count
+
+
+def carts_list(fixture, count):
+    return [Call("GET", "/store/carts/", None, None)] * count
+
+
+def carts_list_expanded(fixture, count):
+    return [Call("GET", "/store/carts/?expand=items", None, None)] * count
+
+
+def carts_create(fixture, count):
+    return [Call("POST", "/store/carts/", {}, None)] * count
+
+
+def cart_detail(fixture, count):
+    return [
+        Call("GET", f"/store/carts/{cart_id}/", None, None)
+        for cart_id in _rotate(fixture.cart_ids, count)
+    ]
+
+
+def cart_delete(fixture, count):
+    return [
+        Call("DELETE", f"/store/carts/{cart.id}/", None, None)
+        for cart in fixture.new_carts(count, items=2)
+    ]
+
+
+def cart_items_list(fixture, count):
+    return [
+        Call("GET", f"/store/carts/{cart_id}/items/", None, None)
+        for cart_id in _rotate(fixture.cart_ids, count)
+    ]
+
+
+def cart_items_add(fixture, count):
+    return [
+        Call(
+            "POST",
+            f"/store/carts/{cart_id}/items/",
+            {"product_id": product_id, "quantity": 1},
+            None,
+        )
+        for cart_id, product_id in zip(
+            _rotate(fixture.cart_ids, count),
+            _rotate(fixture.product_ids, count),
+        )
+    ]
+
+
+def cart_items_batch(fixture, count):
+    calls = []
+    for index, cart_id in enumerate(_rotate(fixture.cart_ids, count)):
+        first, second, third = _rotate(fixture.product_ids[index:], 3)
+        calls.append(
+            Call(
+                "POST",
+                f"/store/carts/{cart_id}/items/",
+                [
+                    {"op": "add", "product_id": first, "quantity": 2},
+                    {"op": "update", "product_id": second, "quantity": 1},
+                    {"op": "remove", "product_id": third},
+                ],
+                None,
+            )
+        )
+    return calls
+
+
+def cart_item_detail(fixture, count):
+    return [
+        Call("GET", f"/store/carts/{cart_id}/items/{id}/", None, None)
+        for cart_id, id in _rotate(fixture.cart_items, count)
+    ]
+
+
+def cart_item_patch(fixture, count):
+    return [
+        Call(
+            "PATCH",
+            f"/store/carts/{cart_id}/items/{id}/",
+            {"quantity": index % 5 + 1},
+            None,
+        )
+        for index, (cart_id, id) in enumerate(
+            _rotate(fixture.cart_items, count)
+        )
+    ]
+
+
+def cart_item_delete(fixture, count):
+    items = CartItem.objects.filter(
+        cart__in=fixture.new_carts(count)
+    ).values_list("cart_id", "id")
+    return [
+        Call("DELETE", f"/store/carts/{cart_id}/items/{id}/", None, None)
+        for cart_id, id in items
+    ]
+
+
+def reservations(fixture, count):
+    calls = []
+    for index, cart in enumerate(fixture.new_carts(count, items=2)):
+        # A user holds inventory for at most MAX_HELD_CARTS carts.
+        if index % MAX_HELD_CARTS == 0:
+            user = User.objects.create_user(
+                f"benchmark-reserver-{index // MAX_HELD_CARTS}"
+            )
+            token = _access_token(user)
+        calls.append(
+            Call("POST", f"/store/carts/{cart.id}/reservations/", None, token)
+        )
+    return calls
+
+
+def checkout(fixture, count):
+    return [
+        Call(
+            "POST",
+            f"/store/carts/{cart.id}/checkout/",
+            None,
+            fixture.customer_token,
+        )
+        for cart in fixture.new_carts(count, items=2)
+    ]
+
+
+def customers_create(fixture, count):
+    return [
+        Call(
+            "POST",
+            "/store/customers/",
+            {"phone": "555-0101"},
+            fixture.admin_token,
+        )
+    ] * count
+
+
+def customers_me(fixture, count):
+    path = "/store/customers/me/"
+    return [Call("GET", path, None, fixture.customer_token)] * count
+
+
+def customers_me_update(fixture, count):
+    return [
+        Call(
+            "PATCH",
+            "/store/customers/me/",
+            {"phone": f"555-{index % 10000:04d}"},
+            fixture.customer_token,
+        )
+        for index in range(count)
+    ]
+
+
+def exports(fixture, count):
+    path = "/store/exports/products/?output=ndjson"
+    return [Call("GET", path, None, fixture.admin_token)] * count
+
+
+# (name, pattern in store.urls, builder of `count` calls)
+ROUTES = [
+    ("products-list", "products/", products_list),
+    ("products-filter", "products/", products_filter),
+    ("products-search", "products/", products_search),
+    ("products-ordering", "products/", products_ordering),
+    ("products-deep-page", "products/", products_deep_page),
+    ("products-deep-cursor", "products/", products_deep_cursor),
+    ("product-detail", "products/<int:pk>/", product_detail),
+    ("reviews-list", "products/<int:pk>/reviews/", reviews_list),
+    ("reviews-create", "products/<int:pk>/reviews/", reviews_create),
+    ("review-detail", "products/<int:pk>/reviews/<int:id>", review_detail),
+    ("review-delete", "products/<int:pk>/reviews/<int:id>", review_delete),
+    ("collections-list", "collections/", collections_list),
+    ("collection-detail", "collections/<int:pk>/", collection_detail),
+    ("catalog-cache-stats", "catalog-cache/stats/", catalog_cache_stats),
+    ("db-pool-stats", "db-pool/stats/", db_pool_stats),
+    ("carts-list", "carts/", carts_list),
+    ("carts-list-expanded", "carts/", carts_list_expanded),
+    ("carts-create", "carts/", carts_create),
+    ("cart-detail", "carts/<str:pk>/", cart_detail),
+    ("cart-delete", "carts/<str:pk>/", cart_delete),
+    ("cart-items-list", "carts/<str:pk>/items/", cart_items_list),
+    ("cart-items-add", "carts/<str:pk>/items/", cart_items_add),
+    ("cart-items-batch", "carts/<str:pk>/items/", cart_items_batch),
+    ("cart-item-detail", "carts/<str:pk>/items/<int:id>/", cart_item_detail),
+    ("cart-item-patch", "carts/<str:pk>/items/<int:id>/", cart_item_patch),
+    ("cart-item-delete", "carts/<str:pk>/items/<int:id>/", cart_item_delete),
+    ("reservations", "carts/<str:pk>/reservations/", reservations),
+    ("checkout", "carts/<str:pk>/checkout/", checkout),
+    ("customers-create", "customers/", customers_create),
+    ("customers-me", "customers/me/", customers_me),
+    ("customers-me-update", "customers/me/", customers_me_update),
+    ("exports", "exports/<str:name>/", exports),
+]
+
+
+def uncovered_routes():
+    """Return the patterns in store.urls no benchmark route drives."""
+    covered = {pattern for _, pattern, _ in ROUTES}
+    return [
+        str(url.pattern)
+        for url in urlpatterns
+        if str(url.pattern) not in covered
+    ]
+
+
+def send(client, call):
+    extra = {}
+    if call.token:
+        extra["HTTP_AUTHORIZATION"] = f"Bearer {call.token}"
+    if call.method == "GET":
+        response = client.get(call.path, **extra)
+    else:
+        response = getattr(client, call.method.lower())(
+            call.path, call.data, format="json", **extra
+        )
+    if response.streaming:
+        b"".join(response.streaming_content)
+    return response.status_code
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(client, calls, warmup):
+    for call in calls[:warmup]:
+        send(client, call)
+
+    latencies, queries, statuses = [], [], Counter()
+    for call in calls[warmup:]:
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            started = time.perf_counter()
+            status = send(client, call)
+            latencies.append(time.perf_counter() - started)
+        queries.append(recorder.count)
+        statuses[status] += 1
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "throughput": round(len(latencies) / sum(latencies), 1),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "queries": statistics.median(queries),
+        "queries_max": max(queries),
+        "errors": sum(
+            count for status, count in statuses.items() if status >= 500
+        ),
+        "statuses": {str(status): count for status, count in statuses.items()},
+    }
+
+
+@contextmanager
+def test_database():
+    """
+    Switch the default connection to a fresh test database, with its own
+    caches, and destroy it on exit, so the database configured in settings
+    is not touched. Connections opened by other threads use it too.
+    """
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        with override_settings(CACHES=BENCHMARK_CACHES):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def seeded_database(scale, seed="42", workers=1, log=print):
+    """
+    Seed `scale` of the generator's default volumes into a test_database
+    and yield the row counts, a client and a Fixture.
+    """
+    with test_database():
+        volumes = generate(
+            scaled_volumes(scale), seed=seed, workers=workers, log=log
+        )
+        # Outside INTERNAL_IPS, so the debug toolbar stays out of the way.
+        client = APIClient(SERVER_NAME="localhost", REMOTE_ADDR="10.0.0.1")
+        client.raise_request_exception = False
+        yield volumes, client, Fixture(client)
+
+
+def run(
+    scales=DEFAULT_SCALES,
+    requests=50,
+    warmup=5,
+    seed="42",
+    workers=1,
+    routes=None,
+    log=print,
+):
+    """
+    Benchmark `routes` (names from ROUTES, default all) at each scale of
+    the generator's default volumes and return the results.
+
+    Every scale is seeded into its own test database.
+    """
+    results = {
+        "vendor": connection.vendor,
+        "seed": seed,
+        "requests": requests,
+        "scales": {},
+    }
+    selected = [route for route in ROUTES if not routes or route[0] in routes]
+    # Server errors are counted in the results; their tracebacks would
+    # drown the report.
+    request_logger = logging.getLogger("django.request")
+    level = request_logger.level
+    for scale in scales:
+        with seeded_database(scale, seed, workers, log) as database:
+            volumes, client, fixture = database
+            request_logger.setLevel(logging.CRITICAL)
+            try:
+                measured = {}
+                for name, _, build in selected:
+                    calls = build(fixture, warmup + requests)
+                    measured[name] = measure(client, calls, warmup)
+                    log(format_result(scale, name, measured[name]))
+            finally:
+                request_logger.setLevel(level)
+        results["scales"][str(scale)] = {
+            "volumes": volumes,
+            "routes": measured,
+        }
+    return results
+
+
+def format_result(scale, name, result):
+    statuses = ",".join(
+        f"{status}x{count}" for status, count in result["statuses"].items()
+    )
+    return (
+        f"scale={scale:<5} {name:<22} {result['throughput']:>8.1f} req/s "
+        f"p50={result['p50_ms']:>8.2f}ms p95={result['p95_ms']:>8.2f}ms "
+        f"p99={result['p99_ms']:>8.2f}ms "
+        f"queries={result['queries']:g}/{result['queries_max']} {statuses}"
+    )
+
+
+def _slower(current, previous, threshold, floor):
+    return current > previous * (1 + threshold) and current - previous > floor
+
+
+def compare(
+    results, baseline, threshold, query_threshold=0, latency_floor_ms=1.0
+):
+    """
+    Return a description of every route that regressed against
+    `baseline`: p95 or mean latency up by more than `threshold` (a
+    fraction) and by more than `latency_floor_ms`, more than
+    `query_threshold` extra queries, or more server errors. Routes and
+    scales missing from either side are skipped.
+    """
+    regressions = []
+    for scale, current in results["scales"].items():
+        previous = baseline["scales"].get(scale, {}).get("routes", {})
+        for name, result in current["routes"].items():
+            base = previous.get(name)
+            if base is None:
+                continue
+            label = f"scale={scale} {name}"
+            if _slower(
+                result["p95_ms"], base["p95_ms"], threshold, latency_floor_ms
+            ):
+                regressions.append(
+                    f"{label}: p95 {base['p95_ms']}ms -> {result['p95_ms']}ms"
+                )
+            # Requests run one after the other, so throughput is the
+            # inverse of the mean latency.
+            if _slower(
+                1000 / result["throughput"],
+                1000 / base["throughput"],
+                threshold,
+                latency_floor_ms,
+            ):
+                regressions.append(
+                    f"{label}: throughput {base['throughput']} -> "
+                    f"{result['throughput']} req/s"
+                )
+            if result["queries_max"] > base["queries_max"] + query_threshold:
+                regressions.append(
+                    f"{label}: queries {base['queries_max']} -> "
+                    f"{result['queries_max']}"
+                )
+            if result["errors"] > base["errors"]:
+                regressions.append(
+                    f"{label}: server errors {base['errors']} -> "
+                    f"{result['errors']}"
+                )
+    return regressions
+
+
+def save(results, path):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
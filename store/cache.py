@@ -0,0 +1,179 @@
+import hashlib
+import threading
+from calendar import timegm
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from storefront.replicas import read_from_primary
+
+CATALOG_CACHE = "catalog"
+
+
+class CacheStats:
+    """Per-process hit/miss counters for the catalog response cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+stats = CacheStats()
+
+
+def get_catalog_cache():
+    return caches[CATALOG_CACHE]
+
+
+def _generation_key(model):
+    return f"generation:{model._meta.label_lower}"
+
+
+def get_generation(model):
+    cache = get_catalog_cache()
+    key = _generation_key(model)
+    generation = cache.get(key)
+    if generation is None:
+        # A random value rather than a counter, so that a generation
+        # evicted from the cache can never come back to a value still in
+        # use.
+        cache.add(key, uuid4().hex, timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(model, using=None):
+    """
+    Invalidate every cached response that depends on `model` once the
+    current transaction commits.
+    """
+
+    def bump():
+        # Not incr(): FileBasedCache implements it as a get and a set, so
+        # two processes bumping together could both write the same next
+        # value, and a response cached between the two writes would
+        # outlive the second one.
+        get_catalog_cache().set(
+            _generation_key(model), uuid4().hex, timeout=None
+        )
+
+    transaction.on_commit(bump, using=using)
+
+
+def normalized_query_string(request):
+    return urlencode(
+        sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+        )
+    )
+
+
+class CatalogCacheMixin:
+    """
+    Caches successful GET responses, keyed on the scheme, host, path and
+    normalized query string, which absolute links in the body depend on,
+    and the generation of every model in `cache_models`.
+
+    Writes never delete entries: bumping a generation changes the key of
+    every response built from that model, and stale entries age out.
+    """
+
+    cache_models = []
+    cache_timeout = 300
+
+    def get_cache_key(self, request):
+        generations = ".".join(
+            str(get_generation(model)) for model in self.cache_models
+        )
+        return (
+            f"response:{type(self).__name__}:{generations}:"
+            f"{request.scheme}://{request.get_host()}{request.path}"
+            f"?{normalized_query_string(request)}"
+        )
+
+    def get(self, request, *args, **kwargs):
+        cache = get_catalog_cache()
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        stats.record(cached is not None)
+
+        if cached is not None:
+            data, status = cached
+            response = Response(data, status=status)
+            response["X-Cache"] = "HIT"
+            return response
+
+        # The key holds the current generations, which a lagging replica
+        # may not match; filling it from one would cache stale data.
+        with read_from_primary():
+            response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(
+                key, (response.data, response.status_code), self.cache_timeout
+            )
+        response["X-Cache"] = "MISS"
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Adds strong `ETag` and `Last-Modified` validators to GET responses and
+    answers `If-None-Match` / `If-Modified-Since` with a 304 before any
+    serialization happens.
+
+    Views implement `get_validators()` and return `(version, last_modified)`,
+    where `version` is any cheap value that changes whenever the response
+    body would, or `None` when the resource does not exist.
+    """
+
+    def get_validators(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        version, last_modified = self.get_validators(request, *args, **kwargs)
+        if version is None:
+            return super().get(request, *args, **kwargs)
+
+        digest = hashlib.md5(
+            "|".join(
+                [
+                    str(version),
+                    request.path,
+                    normalized_query_string(request),
+                    request.accepted_media_type or "",
+                ]
+            ).encode()
+        ).hexdigest()
+        etag = quote_etag(digest)
+        timestamp = None
+        if last_modified is not None:
+            timestamp = timegm(last_modified.utctimetuple())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+        return response
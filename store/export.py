@@ -0,0 +1,124 @@
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db import router
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Collection, Order, OrderItem, Product
+
+# name: (model, columns, timestamp column used by `since`)
+EXPORTS = {
+    "products": (
+        Product,
+        [
+            "id",
+            "title",
+            "slug",
+            "description",
+            "unit_price",
+            "inventory",
+            "last_update",
+            "collection_id",
+        ],
+        "last_update",
+    ),
+    "collections": (
+        Collection,
+        ["id", "title", "featured_product_id", "products_count"],
+        None,
+    ),
+    "orders": (
+        Order,
+        ["id", "placed_at", "payment_status", "customer_id"],
+        "placed_at",
+    ),
+    "orderitems": (
+        OrderItem,
+        ["id", "order_id", "product_id", "quantity", "unit_price"],
+        "order__placed_at",
+    ),
+}
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _to_text(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def parse_since(value):
+    """
+    Parse an ISO date or datetime; naive values are taken as the current
+    time zone. Raises ValueError for anything else.
+    """
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value!r}")
+        since = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def export_rows(name, since=None, chunk_size=2000):
+    """
+    Return the column names and an iterator over rows of export `name`.
+
+    Rows are tuples read through a server-side cursor where the database
+    supports one, so memory does not grow with the size of the table.
+
+    The rows are read while the response streams, after the middleware
+    has returned, so the database is chosen here, within the request.
+    """
+    model, columns, timestamp = EXPORTS[name]
+    queryset = model.objects.using(router.db_for_read(model)).order_by("pk")
+    if since is not None and timestamp is not None:
+        queryset = queryset.filter(**{f"{timestamp}__gte": since})
+    rows = queryset.values_list(*columns).iterator(chunk_size=chunk_size)
+    return columns, rows
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def render_ndjson(columns, rows, batch_size=500):
+    batch = []
+    for row in rows:
+        batch.append(json.dumps(dict(zip(columns, map(_to_text, row)))) + "\n")
+        if len(batch) >= batch_size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def render_csv(columns, rows, batch_size=500):
+    writer = csv.writer(_Echo())
+    batch = [writer.writerow(columns)]
+    for row in rows:
+        batch.append(writer.writerow(map(_to_text, row)))
+        if len(batch) >= batch_size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+RENDERERS = {
+    "ndjson": render_ndjson,
+    "csv": render_csv,
+}
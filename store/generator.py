@@ -0,0 +1,406 @@
+import random
+import time
+import uuid
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import accumulate
+from multiprocessing import get_context
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, transaction
+from django.db.models import Max
+
+from tags.models import Tag, TaggedItem
+
+from .importer import Importer
+from .models import (
+    Cart,
+    CartItem,
+    Collection,
+    Customer,
+    Order,
+    OrderItem,
+    Product,
+    Promotion,
+    Review,
+)
+
+DEFAULT_VOLUMES = {
+    "promotions": 20,
+    "tags": 100,
+    "collections": 50,
+    "products": 10_000,
+    "customers": 5_000,
+    "orders": 20_000,
+    "items_per_order": 3,
+    "reviews": 10_000,
+    "carts": 2_000,
+    "items_per_cart": 4,
+}
+
+# Kinds generated in the same stage only reference earlier stages, so a
+# stage can be split across worker processes.
+STAGES = [
+    ["promotions", "tags", "collections"],
+    ["products"],
+    ["customers"],
+    ["orders", "reviews", "carts"],
+]
+
+START_DATE = datetime(2021, 1, 1, tzinfo=dt_timezone.utc)
+WORDS = (
+    "organic fresh roasted smoked spicy sweet classic premium crunchy "
+    "smooth coffee tea bread cheese apple honey butter pasta rice bean "
+    "tomato olive walnut almond chocolate vanilla caramel maple cinnamon"
+).split()
+FIRST_NAMES = (
+    "Ada Bob Cleo Dan Eve Finn Gia Hal Ivy Jon Kay Leo Mia Ned".split()
+)
+LAST_NAMES = (
+    "Smith Jones Brown Taylor Wilson Evans Thomas Roberts Walker".split()
+)
+
+
+def scaled_volumes(scale, volumes=DEFAULT_VOLUMES):
+    """
+    Multiply every volume except the per-order/cart ones by `scale`,
+    keeping each non-zero volume at one or more.
+    """
+    return {
+        name: (
+            value
+            if not value or name.startswith("items_per_")
+            else max(1, int(value * scale))
+        )
+        for name, value in volumes.items()
+    }
+
+
+def unit_price(product_id):
+    """Deterministic price, so order items can snapshot it in any chunk."""
+    return f"{(product_id * 7919) % 99900 // 100 + 1}.{product_id % 100:02d}"
+
+
+def random_time(rng, days=365):
+    return START_DATE + timedelta(seconds=rng.randrange(days * 86400))
+
+
+_popularity = {}
+
+
+def popular_product(rng, context):
+    """
+    Pick a product with Zipf-like skew: a few products get most of the
+    orders, reviews and cart lines.
+    """
+    count = context["products"]["count"]
+    weights = _popularity.get(count)
+    if weights is None:
+        weights = _popularity[count] = list(
+            accumulate(1 / (rank + 1) ** 1.1 for rank in range(count))
+        )
+    rank = bisect_left(weights, rng.random() * weights[-1])
+    return context["products"]["start"] + min(rank, count - 1)
+
+
+def gen_promotions(rng, start, count, context):
+    yield Promotion, [
+        {
+            "id": start + i,
+            "description": f"Promotion {start + i}",
+            "discount": rng.choice([0.05, 0.1, 0.15, 0.2, 0.25]),
+        }
+        for i in range(count)
+    ]
+
+
+def gen_tags(rng, start, count, context):
+    yield Tag, [
+        {"id": start + i, "label": rng.choice(WORDS) + f"-{start + i}"}
+        for i in range(count)
+    ]
+
+
+def gen_collections(rng, start, count, context):
+    yield Collection, [
+        {"id": start + i, "title": f"Collection {start + i}"}
+        for i in range(count)
+    ]
+
+
+def gen_products(rng, start, count, context):
+    collections = context["collections"]
+    promotions = context["promotions"]
+    tags = context["tags"]
+    products, product_promotions, tagged_items = [], [], []
+
+    for i in range(count):
+        product_id = start + i
+        title = " ".join(rng.choices(WORDS, k=3)).title()
+        products.append(
+            {
+                "id": product_id,
+                "title": f"{title} {product_id}",
+                "slug": f"product-{product_id}",
+                "description": " ".join(rng.choices(WORDS, k=25)),
+                "unit_price": unit_price(product_id),
+                "inventory": rng.randrange(0, 500),
+                "last_update": random_time(rng),
+                "collection_id": collections["start"]
+                + rng.randrange(collections["count"]),
+            }
+        )
+        if promotions["count"] and rng.random() < 0.1:
+            product_promotions.append(
+                {
+                    "product_id": product_id,
+                    "promotion_id": promotions["start"]
+                    + rng.randrange(promotions["count"]),
+                }
+            )
+        if tags["count"]:
+            tagged_items.append(
+                {
+                    "id": context["tagged_items"]["start"]
+                    + product_id
+                    - context["products"]["start"],
+                    "tag_id": tags["start"] + rng.randrange(tags["count"]),
+                    "content_type_id": context["product_content_type"],
+                    "object_id": product_id,
+                }
+            )
+
+    yield Product, products
+    yield Product.promotions.through, product_promotions
+    yield TaggedItem, tagged_items
+
+
+def gen_customers(rng, start, count, context):
+    users, customers = [], []
+    for i in range(count):
+        offset = start - context["customers"]["start"] + i
+        user_id = context["users"]["start"] + offset
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        users.append(
+            {
+                "id": user_id,
+                "username": f"customer{user_id}",
+                "email": f"customer{user_id}@example.com",
+                "first_name": first_name,
+                "last_name": last_name,
+                "password": "!",
+                "date_joined": random_time(rng),
+            }
+        )
+        customers.append(
+            {
+                "id": start + i,
+                "phone": f"{rng.randrange(10**9, 10**10)}",
+                "birth_date": (
+                    START_DATE - timedelta(days=rng.randrange(6000, 25000))
+                ).date(),
+                "membership": rng.choice(["B", "B", "B", "S", "S", "G"]),
+                "user_id": user_id,
+            }
+        )
+    yield User, users
+    yield Customer, customers
+
+
+def gen_orders(rng, start, count, context):
+    customers = context["customers"]
+    per_order = context["items_per_order"]
+    orders, items = [], []
+    for i in range(count):
+        order_id = start + i
+        orders.append(
+            {
+                "id": order_id,
+                "placed_at": random_time(rng),
+                "payment_status": rng.choice(["C", "C", "C", "P", "F"]),
+                "customer_id": customers["start"]
+                + rng.randrange(customers["count"]),
+            }
+        )
+        for j in range(per_order):
+            product_id = popular_product(rng, context)
+            items.append(
+                {
+                    "id": context["order_items"]["start"]
+                    + (order_id - context["orders"]["start"]) * per_order
+                    + j,
+                    "order_id": order_id,
+                    "product_id": product_id,
+                    "quantity": rng.randrange(1, 6),
+                    "unit_price": unit_price(product_id),
+                }
+            )
+    yield Order, orders
+    yield OrderItem, items
+
+
+def gen_reviews(rng, start, count, context):
+    yield Review, [
+        {
+            "id": start + i,
+            "product_id": popular_product(rng, context),
+            "name": rng.choice(FIRST_NAMES),
+            "description": " ".join(rng.choices(WORDS, k=15)),
+            "date": random_time(rng).date(),
+        }
+        for i in range(count)
+    ]
+
+
+def gen_carts(rng, start, count, context):
+    per_cart = context["items_per_cart"]
+    carts, items = [], []
+    for i in range(count):
+        cart_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+        created_at = random_time(rng)
+        carts.append(
+            {
+                "id": cart_id,
+                "created_at": created_at,
+                "last_activity": created_at,
+            }
+        )
+        product_ids = set()
+        while len(product_ids) < min(per_cart, context["products"]["count"]):
+            product_ids.add(popular_product(rng, context))
+        items.extend(
+            {
+                "cart_id": cart_id,
+                "product_id": product_id,
+                "quantity": rng.randrange(1, 4),
+            }
+            for product_id in sorted(product_ids)
+        )
+    yield Cart, carts
+    yield CartItem, items
+
+
+GENERATORS = {
+    "promotions": gen_promotions,
+    "tags": gen_tags,
+    "collections": gen_collections,
+    "products": gen_products,
+    "customers": gen_customers,
+    "orders": gen_orders,
+    "reviews": gen_reviews,
+    "carts": gen_carts,
+}
+
+
+def run_chunk(task):
+    """Generate and insert one chunk; runs in the parent or a worker."""
+    kind, start, count, seed, context = task
+    rng = random.Random(f"{seed}:{kind}:{start}")
+    importer = Importer(batch_size=count)
+    with transaction.atomic():
+        for model, rows in GENERATORS[kind](rng, start, count, context):
+            if rows:
+                importer.insert(model, list(rows[0]), rows)
+    return kind, count
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+
+
+def generate(volumes, seed=42, workers=1, chunk_size=10_000, log=print):
+    """
+    Insert a synthetic dataset of the given `volumes` on top of whatever
+    is already in the database and return the row counts.
+
+    Every chunk draws from its own generator seeded with `seed`, its kind
+    and its first id, so the same seed, chunk size and starting database
+    give the same rows whatever the number of workers.
+    """
+    volumes = {**DEFAULT_VOLUMES, **volumes}
+    if volumes["products"] and not volumes["collections"]:
+        raise ValueError("Products need at least one collection.")
+    if volumes["orders"] and not (
+        volumes["customers"] and volumes["products"]
+    ):
+        raise ValueError("Orders need customers and products.")
+    if (volumes["reviews"] or volumes["carts"]) and not volumes["products"]:
+        raise ValueError("Reviews and carts need products.")
+
+    if connections["default"].vendor != "postgresql" and workers > 1:
+        log("Parallel workers need Postgres; falling back to one process.")
+        workers = 1
+
+    context = {
+        "items_per_order": volumes["items_per_order"],
+        "items_per_cart": volumes["items_per_cart"],
+        "product_content_type": ContentType.objects.get_for_model(Product).id,
+        "users": {"start": _next_id(User)},
+        "tagged_items": {"start": _next_id(TaggedItem)},
+        "order_items": {"start": _next_id(OrderItem)},
+    }
+    for kind, model in [
+        ("promotions", Promotion),
+        ("tags", Tag),
+        ("collections", Collection),
+        ("products", Product),
+        ("customers", Customer),
+        ("orders", Order),
+        ("reviews", Review),
+    ]:
+        context[kind] = {"start": _next_id(model), "count": volumes[kind]}
+    # Carts have UUID keys; their position only seeds the generator.
+    context["carts"] = {
+        "start": Cart.objects.count() + 1,
+        "count": volumes["carts"],
+    }
+
+    connections.close_all()
+    pool = get_context("fork").Pool(workers) if workers > 1 else None
+    started = time.perf_counter()
+    try:
+        for stage in STAGES:
+            tasks = [
+                (
+                    kind,
+                    context[kind]["start"] + offset,
+                    min(chunk_size, volumes[kind] - offset),
+                    seed,
+                    context,
+                )
+                for kind in stage
+                for offset in range(0, volumes[kind], chunk_size)
+            ]
+            results = (
+                pool.imap_unordered(run_chunk, tasks)
+                if pool
+                else map(run_chunk, tasks)
+            )
+            for kind, count in results:
+                elapsed = time.perf_counter() - started
+                log(f"{kind}: +{count} rows ({elapsed:.1f}s)")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    importer = Importer()
+    importer.loaded_models.update(
+        [
+            Promotion,
+            Tag,
+            TaggedItem,
+            Collection,
+            Product,
+            User,
+            Customer,
+            Order,
+            OrderItem,
+            Review,
+        ]
+    )
+    with transaction.atomic():
+        importer.finish()
+    return volumes
@@ -0,0 +1,256 @@
+import csv
+import io
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connections
+from django.utils import timezone
+
+from .cache import bump_generation
+from .models import (
+    Collection,
+    Customer,
+    Order,
+    OrderItem,
+    Product,
+    recount_products,
+)
+
+# Load order matters: every kind only references kinds loaded before it,
+# except Collection.featured_product, which is resolved at the end.
+KINDS = {
+    "customers": (
+        Customer,
+        ["id", "phone", "birth_date", "membership", "user_id"],
+    ),
+    "collections": (Collection, ["id", "title"]),
+    "products": (
+        Product,
+        [
+            "id",
+            "title",
+            "slug",
+            "description",
+            "unit_price",
+            "inventory",
+            "last_update",
+            "collection_id",
+        ],
+    ),
+    "orders": (
+        Order,
+        ["id", "placed_at", "payment_status", "customer_id"],
+    ),
+    "orderitems": (
+        OrderItem,
+        ["id", "order_id", "product_id", "quantity", "unit_price"],
+    ),
+}
+
+# Postgres COPY marker for NULL, so that empty strings stay empty strings.
+COPY_NULL = "\\N"
+
+
+def read_rows(path):
+    """Yield dicts from a .csv or .ndjson/.jsonl file."""
+    with open(path, newline="") as file:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(file):
+                yield {
+                    key: (value if value != "" else None)
+                    for key, value in row.items()
+                }
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Importer:
+    """
+    Loads rows straight into the store tables in batches, with Postgres
+    COPY when available and multi-row INSERTs otherwise.
+
+    Rows keep the ids and timestamps from the input, which is why this
+    does not go through `bulk_create()`: it would overwrite `auto_now`
+    and `auto_now_add` columns. Derived data (`products_count`, primary
+    key sequences) is rebuilt by `finish()`.
+    """
+
+    def __init__(
+        self, using="default", batch_size=5000, use_copy=True, log=None
+    ):
+        self.connection = connections[using]
+        self.batch_size = batch_size
+        self.use_copy = use_copy and self.connection.vendor == "postgresql"
+        self.log = log or (lambda message: None)
+        self.loaded_models = set()
+        self.featured_products = []
+
+    def load(self, kind, rows):
+        model, columns = KINDS[kind]
+        started = time.perf_counter()
+        total = 0
+
+        for batch in batches(rows, self.batch_size):
+            if kind == "customers":
+                self._resolve_users(batch)
+            if kind == "collections":
+                self.featured_products.extend(
+                    (row["id"], row["featured_product_id"])
+                    for row in batch
+                    if row.get("id") and row.get("featured_product_id")
+                )
+
+            present = [column for column in columns if column in batch[0]]
+            self.insert(model, present, batch)
+            total += len(batch)
+            elapsed = time.perf_counter() - started
+            self.log(f"{kind}: {total} rows, {total / elapsed:.0f} rows/sec")
+
+        self.loaded_models.add(model)
+        return total
+
+    def insert(self, model, columns, rows):
+        fields = [model._meta.get_field(column) for column in columns]
+
+        # Raw inserts skip Django's defaults, so fill them in here.
+        now = timezone.now()
+        defaults = {}
+        for field in model._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            if getattr(field, "auto_now", False) or getattr(
+                field, "auto_now_add", False
+            ):
+                defaults[field] = now
+            elif field.has_default():
+                defaults[field] = field.get_default()
+        fields += [field for field in defaults if field not in fields]
+
+        values = []
+        for row in rows:
+            prepared = []
+            for field in fields:
+                value = row.get(field.attname, row.get(field.name))
+                if value is None:
+                    value = defaults.get(field)
+                prepared.append(
+                    field.get_db_prep_save(
+                        field.to_python(value), self.connection
+                    )
+                )
+            values.append(prepared)
+        table = self.connection.ops.quote_name(model._meta.db_table)
+        names = ", ".join(
+            self.connection.ops.quote_name(field.column) for field in fields
+        )
+
+        with self.connection.cursor() as cursor:
+            if self.use_copy:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for row in values:
+                    writer.writerow(
+                        COPY_NULL if value is None else value for value in row
+                    )
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {table} ({names}) FROM STDIN "
+                    f"WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                    buffer,
+                )
+            else:
+                # As many rows per INSERT as the database takes parameters.
+                size = max(
+                    self.connection.ops.bulk_batch_size(fields, values), 1
+                )
+                for chunk in batches(values, size):
+                    sql = self.connection.ops.bulk_insert_sql(
+                        fields, [["%s"] * len(fields)] * len(chunk)
+                    )
+                    cursor.execute(
+                        f"INSERT INTO {table} ({names}) {sql}",
+                        [value for row in chunk for value in row],
+                    )
+
+    def _resolve_users(self, batch):
+        """
+        Create the auth users for a batch of customers and replace their
+        usernames with the new user ids, with one lookup per batch.
+        """
+        now = timezone.now()
+        users = [
+            {
+                "username": row["username"],
+                "email": row.get("email") or "",
+                "first_name": row.get("first_name") or "",
+                "last_name": row.get("last_name") or "",
+                # Unusable password; customers set one through djoser.
+                "password": "!",
+                "is_staff": False,
+                "is_superuser": False,
+                "is_active": True,
+                "date_joined": row.get("date_joined") or now,
+            }
+            for row in batch
+        ]
+        self.insert(User, list(users[0]), users)
+        user_ids = dict(
+            User.objects.using(self.connection.alias)
+            .filter(username__in=[row["username"] for row in batch])
+            .values_list("username", "id")
+        )
+        for row in batch:
+            row["user_id"] = user_ids[row["username"]]
+        self.loaded_models.add(User)
+
+    def finish(self):
+        """
+        Resolve deferred foreign keys and rebuild derived data once every
+        kind has been loaded.
+        """
+        if self.featured_products:
+            Collection.objects.using(self.connection.alias).bulk_update(
+                [
+                    Collection(
+                        id=collection_id, featured_product_id=product_id
+                    )
+                    for collection_id, product_id in self.featured_products
+                ],
+                ["featured_product"],
+                batch_size=self.batch_size,
+            )
+
+        if Product in self.loaded_models or Collection in self.loaded_models:
+            collection_ids = list(
+                Collection.objects.using(self.connection.alias).values_list(
+                    "pk", flat=True
+                )
+            )
+            for batch in batches(collection_ids, self.batch_size):
+                recount_products(batch, using=self.connection.alias)
+
+        sql = self.connection.ops.sequence_reset_sql(
+            no_style(), list(self.loaded_models)
+        )
+        if sql:
+            with self.connection.cursor() as cursor:
+                for statement in sql:
+                    cursor.execute(statement)
+
+        bump_generation(Product, using=self.connection.alias)
+        bump_generation(Collection, using=self.connection.alias)
@@ -0,0 +1,224 @@
+import asyncio
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+
+from storefront.asgi import StorefrontASGIHandler
+from store.benchmark import test_database
+from store.models import Cart, CartItem, Collection, Product
+
+# Outside INTERNAL_IPS, so the debug toolbar stays out of the way.
+CLIENT_ADDR = "10.0.0.1"
+# Added to ALLOWED_HOSTS while the command runs.
+HOST = "localhost"
+
+
+def wsgi_get(handler, url):
+    parts = urlsplit(url)
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": parts.path,
+        "QUERY_STRING": parts.query,
+        "REMOTE_ADDR": CLIENT_ADDR,
+        "SERVER_NAME": HOST,
+        "SERVER_PORT": "80",
+        "HTTP_ACCEPT": "application/json",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.url_scheme": "http",
+    }
+    status = []
+    response = handler(environ, lambda line, headers: status.append(line))
+    b"".join(response)
+    response.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_get(handler, url):
+    parts = urlsplit(url)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", HOST.encode()),
+            (b"accept", b"application/json"),
+        ],
+        "client": (CLIENT_ADDR, 0),
+        "server": (HOST, 80),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await handler(scope, receive, send)
+    return status[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the catalog and cart endpoints for many "
+        "concurrent clients served through WSGI worker threads, Django's "
+        "ASGI handler and storefront.asgi, all in process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=1000)
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=5,
+            help="Requests each client sends, one after the other.",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=settings.ASGI_MAX_CONCURRENCY,
+            help="WSGI worker threads.",
+        )
+        parser.add_argument("--products", type=int, default=100)
+        parser.add_argument(
+            "--db-latency",
+            type=float,
+            default=0,
+            help="Milliseconds added to every query, to stand in for the "
+            "network round trip to a remote database.",
+        )
+
+    def handle(self, *args, **options):
+        def add_latency(execute, sql, params, many, context):
+            time.sleep(options["db_latency"] / 1000)
+            return execute(sql, params, many, context)
+
+        def on_connection_created(connection, **kwargs):
+            # A thread keeps its connection object across reconnects.
+            if add_latency not in connection.execute_wrappers:
+                connection.execute_wrappers.append(add_latency)
+
+        if options["db_latency"]:
+            connection_created.connect(on_connection_created)
+        # Handler threads need committed rows, so they go to a test database
+        # dropped afterwards.
+        try:
+            with test_database(), override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, HOST]
+            ):
+                urls = self.seed(options["products"])
+                for name, run in [
+                    ("wsgi", self.run_wsgi),
+                    ("asgi-django", self.run_asgi_django),
+                    ("asgi-storefront", self.run_asgi_storefront),
+                ]:
+                    self.report(name, *run(urls, options))
+        finally:
+            connection_created.disconnect(on_connection_created)
+
+    def seed(self, count):
+        self.collection = Collection.objects.create(title="ASGI benchmark")
+        self.cart = Cart.objects.create()
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title=f"ASGI benchmark {i}",
+                    slug="asgi-benchmark",
+                    unit_price=i % 100 + 1,
+                    inventory=100,
+                    collection=self.collection,
+                )
+                for i in range(count)
+            ]
+        )
+        product_id = (
+            Product.objects.filter(collection=self.collection)
+            .values_list("id", flat=True)
+            .first()
+        )
+        CartItem.objects.create(
+            cart=self.cart, product_id=product_id, quantity=1
+        )
+        return [
+            f"/store/products/?collection_id={self.collection.id}",
+            f"/store/products/{product_id}/",
+            "/store/collections/",
+            f"/store/carts/{self.cart.id}/",
+            f"/store/carts/{self.cart.id}/items/",
+        ]
+
+    def client_urls(self, urls, client, options):
+        return [
+            urls[(client + i) % len(urls)] for i in range(options["requests"])
+        ]
+
+    def run_wsgi(self, urls, options):
+        handler = WSGIHandler()
+
+        def client(index):
+            # Clients connect at once, so the first request also counts
+            # the wait for a free thread, as it does under ASGI.
+            started = submitted
+            results = []
+            for url in self.client_urls(urls, index, options):
+                status = wsgi_get(handler, url)
+                results.append((status, time.perf_counter() - started))
+                started = time.perf_counter()
+            return results
+
+        started = submitted = time.perf_counter()
+        with ThreadPoolExecutor(options["threads"]) as executor:
+            results = executor.map(client, range(options["clients"]))
+            results = [result for batch in results for result in batch]
+        return results, time.perf_counter() - started
+
+    def run_asgi(self, handler, urls, options):
+        async def client(index):
+            results = []
+            for url in self.client_urls(urls, index, options):
+                started = time.perf_counter()
+                status = await asgi_get(handler, url)
+                results.append((status, time.perf_counter() - started))
+            return results
+
+        async def main():
+            return await asyncio.gather(
+                *[client(index) for index in range(options["clients"])]
+            )
+
+        started = time.perf_counter()
+        results = asyncio.run(main())
+        results = [result for batch in results for result in batch]
+        return results, time.perf_counter() - started
+
+    def run_asgi_django(self, urls, options):
+        return self.run_asgi(ASGIHandler(), urls, options)
+
+    def run_asgi_storefront(self, urls, options):
+        return self.run_asgi(StorefrontASGIHandler(), urls, options)
+
+    def report(self, name, results, elapsed):
+        latencies = sorted(latency for _, latency in results)
+        errors = sum(1 for status, _ in results if status != 200)
+        p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+        self.stdout.write(
+            f"{name:<16} {len(results) / elapsed:>8.1f} req/s "
+            f"p50={statistics.median(latencies) * 1000:>8.1f}ms "
+            f"p99={p99 * 1000:>8.1f}ms errors={errors}"
+        )
@@ -0,0 +1,116 @@
+import gc
+import resource
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from store.models import Cart, CartItem, Collection, Product
+
+
+class Rollback(Exception):
+    pass
+
+
+def current_rss_kb():
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure peak memory and latency of GET /store/carts/ as the "
+        "number of carts grows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--carts",
+            type=int,
+            action="append",
+            dest="scales",
+            help="Number of carts to measure at, may be given several times.",
+        )
+        parser.add_argument("--items", type=int, default=5)
+        parser.add_argument("--products", type=int, default=200)
+
+    def handle(self, *args, **options):
+        scales = sorted(options["scales"] or [1000, 5000, 20000])
+        try:
+            with transaction.atomic():
+                self.seed_products(options["products"])
+                client = APIClient(SERVER_NAME="localhost")
+                seeded = 0
+                for scale in scales:
+                    self.seed_carts(scale - seeded, options["items"])
+                    seeded = scale
+                    for url in [
+                        "/store/carts/",
+                        "/store/carts/?expand=items",
+                    ]:
+                        self.measure(client, url, scale)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed_products(self, count):
+        collection = Collection.objects.create(title="Cart list benchmark")
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title=f"Cart list benchmark {i}",
+                    slug="cart-list-benchmark",
+                    unit_price=f"{i % 900 + 1}.{i % 100:02d}",
+                    inventory=100,
+                    collection=collection,
+                )
+                for i in range(count)
+            ]
+        )
+        self.product_ids = list(
+            Product.objects.filter(collection=collection).values_list(
+                "id", flat=True
+            )
+        )
+
+    def seed_carts(self, count, items):
+        carts = Cart.objects.bulk_create(
+            [Cart() for _ in range(count)], batch_size=5000
+        )
+        CartItem.objects.bulk_create(
+            [
+                CartItem(
+                    cart=cart,
+                    product_id=self.product_ids[
+                        (index + offset) % len(self.product_ids)
+                    ],
+                    quantity=1,
+                )
+                for index, cart in enumerate(carts)
+                for offset in range(items)
+            ],
+            batch_size=5000,
+        )
+
+    def measure(self, client, url, scale):
+        gc.collect()
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = client.get(url)
+        elapsed = (time.perf_counter() - started) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if response.status_code != 200:
+            raise CommandError(f"{url} returned {response.status_code}")
+
+        self.stdout.write(
+            f"carts={scale:<7} {url:<30} "
+            f"peak={peak // 1024:>6}KB rss={current_rss_kb():>7}KB "
+            f"{elapsed:.1f}ms"
+        )
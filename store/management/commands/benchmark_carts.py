@@ -0,0 +1,89 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from store.models import Cart, CartItem, Collection, Product
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Measure query count and latency of the cart read endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--carts", type=int, default=200)
+        parser.add_argument("--items", type=int, default=50)
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                cart = self.seed(options)
+                client = APIClient(SERVER_NAME="localhost")
+                for url in [
+                    "/store/carts/",
+                    f"/store/carts/{cart.id}/",
+                    f"/store/carts/{cart.id}/items/",
+                ]:
+                    self.measure(client, url, options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        rng = random.Random(options["seed"])
+        collection = Collection.objects.create(title="Cart benchmark")
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title=f"Cart benchmark {i}",
+                    slug="cart-benchmark",
+                    description="lorem ipsum " * 200,
+                    unit_price=rng.randint(100, 99999) / 100,
+                    inventory=100,
+                    collection=collection,
+                )
+                for i in range(options["products"])
+            ]
+        )
+        product_ids = list(
+            Product.objects.filter(collection=collection).values_list(
+                "id", flat=True
+            )
+        )
+
+        carts = [Cart() for _ in range(options["carts"])]
+        Cart.objects.bulk_create(carts)
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=cart, product_id=product_id, quantity=1)
+                for cart in carts
+                for product_id in rng.sample(product_ids, options["items"])
+            ],
+            batch_size=5000,
+        )
+        return carts[0]
+
+    def measure(self, client, url, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.status_code
+
+        self.stdout.write(
+            f"{url:<60} queries={len(queries.captured_queries):<3} "
+            f"median={statistics.median(timings):.1f}ms "
+            f"best={min(timings):.1f}ms"
+        )
@@ -0,0 +1,132 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+
+from store.benchmark import test_database
+from store.models import (
+    Cart,
+    CartItem,
+    Collection,
+    Customer,
+    InsufficientInventory,
+    Order,
+    OrderItem,
+    Product,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that checkout runs a constant number of statements whatever "
+        "the cart size, and that concurrent checkouts of a hot product do "
+        "not oversell it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cart-size",
+            type=int,
+            action="append",
+            dest="cart_sizes",
+            help="Cart size to count statements for, may be repeated.",
+        )
+        parser.add_argument("--carts", type=int, default=200)
+        parser.add_argument("--stock", type=int, default=50)
+        parser.add_argument("--threads", type=int, default=8)
+
+    def handle(self, *args, **options):
+        # Worker threads need committed rows, so they go to a test database
+        # dropped afterwards.
+        with test_database():
+            self.seed(
+                max(options["cart_sizes"] or [100]) + 1, options["stock"]
+            )
+            self.count_statements(options["cart_sizes"] or [1, 10, 100])
+            self.stress(options["carts"], options["threads"])
+
+    def seed(self, products, stock):
+        self.collection = Collection.objects.create(title="Checkout benchmark")
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title=f"Checkout benchmark {i}",
+                    slug="checkout-benchmark",
+                    unit_price=f"{i % 900 + 1}.{i % 100:02d}",
+                    inventory=stock if i == 0 else 1_000_000,
+                    collection=self.collection,
+                )
+                for i in range(products)
+            ]
+        )
+        self.product_ids = list(
+            Product.objects.filter(collection=self.collection)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        self.hot_product_id = self.product_ids[0]
+        self.stock = stock
+        user = User.objects.create(username="checkout-benchmark")
+        self.customer = Customer.objects.create(user=user, phone="0")
+
+    def make_cart(self, product_ids):
+        cart = Cart.objects.create()
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=cart, product_id=product_id, quantity=1)
+                for product_id in product_ids
+            ]
+        )
+        return cart.id
+
+    def count_statements(self, cart_sizes):
+        for size in cart_sizes:
+            cart_id = self.make_cart(self.product_ids[1 : size + 1])
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                order = Order.objects.place_from_cart(
+                    cart_id, self.customer.id
+                )
+                elapsed = (time.perf_counter() - started) * 1000
+            if len(order.orderitem_set.all()) != size:
+                raise CommandError(f"Order has the wrong items for {size}")
+            self.stdout.write(
+                f"cart_size={size:<5} "
+                f"statements={len(queries.captured_queries):<3} "
+                f"{elapsed:.1f}ms"
+            )
+
+    def stress(self, carts, threads):
+        cart_ids = [
+            self.make_cart([self.hot_product_id, self.product_ids[-1]])
+            for _ in range(carts)
+        ]
+
+        def checkout(cart_id):
+            try:
+                Order.objects.place_from_cart(cart_id, self.customer.id)
+                return True
+            except InsufficientInventory:
+                return False
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            placed = sum(pool.map(checkout, cart_ids))
+        elapsed = time.perf_counter() - started
+
+        inventory = Product.objects.get(pk=self.hot_product_id).inventory
+        sold = OrderItem.objects.filter(product_id=self.hot_product_id).count()
+        self.stdout.write(
+            f"threads={threads} carts={carts} placed={placed} "
+            f"stock={self.stock} left={inventory} "
+            f"({carts / elapsed:.0f} checkouts/sec)"
+        )
+        if inventory < 0 or sold != self.stock - inventory:
+            raise CommandError("Hot product was oversold")
+        if placed != min(carts, self.stock):
+            raise CommandError("Checkouts failed with stock left")
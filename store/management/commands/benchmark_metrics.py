@@ -0,0 +1,105 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+
+from store.models import Cart, CartItem, Collection, Product
+
+METRICS_MIDDLEWARE = "storefront.metrics.MetricsMiddleware"
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per-request overhead of MetricsMiddleware on the "
+        "catalog and cart endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--rounds",
+            type=int,
+            default=5,
+            help="Alternating rounds with and without the middleware.",
+        )
+
+    def handle(self, *args, **options):
+        without = [m for m in settings.MIDDLEWARE if m != METRICS_MIDDLEWARE]
+        timings = {"without": [], "with": []}
+        try:
+            with transaction.atomic():
+                urls = self.seed()
+                for _ in range(options["rounds"]):
+                    for name, middleware in [
+                        ("without", without),
+                        ("with", [METRICS_MIDDLEWARE, *without]),
+                    ]:
+                        with override_settings(MIDDLEWARE=middleware):
+                            timings[name].append(
+                                self.measure(urls, options["requests"])
+                            )
+                raise Rollback
+        except Rollback:
+            pass
+
+        base = statistics.median(timings["without"])
+        measured = statistics.median(timings["with"])
+        for name, per_request in [("without", base), ("with", measured)]:
+            self.stdout.write(f"{name:<8} {per_request * 1e6:>8.1f}us/request")
+        self.stdout.write(
+            f"overhead {(measured - base) * 1e6:>8.1f}us/request "
+            f"({(measured - base) / base:+.1%})"
+        )
+
+    def seed(self):
+        collection = Collection.objects.create(title="Metrics benchmark")
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title=f"Metrics benchmark {i}",
+                    slug="metrics-benchmark",
+                    unit_price=i + 1,
+                    inventory=100,
+                    collection=collection,
+                )
+                for i in range(20)
+            ]
+        )
+        product_ids = list(
+            Product.objects.filter(collection=collection).values_list(
+                "id", flat=True
+            )
+        )
+        cart = Cart.objects.create()
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=cart, product_id=product_id, quantity=1)
+                for product_id in product_ids[:5]
+            ]
+        )
+        return [
+            f"/store/products/?collection_id={collection.id}",
+            f"/store/products/{product_ids[0]}/",
+            "/store/collections/",
+            f"/store/carts/{cart.id}/",
+            f"/store/carts/{cart.id}/items/",
+        ]
+
+    def measure(self, urls, count):
+        # Outside INTERNAL_IPS, so the debug toolbar stays out of the way.
+        client = Client(
+            SERVER_NAME="localhost",
+            REMOTE_ADDR="10.0.0.1",
+            HTTP_ACCEPT="application/json",
+        )
+        started = time.perf_counter()
+        for index in range(count):
+            client.get(urls[index % len(urls)])
+        return (time.perf_counter() - started) / count
@@ -0,0 +1,104 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from store.benchmark import test_database
+from store.models import (
+    Cart,
+    CartItem,
+    Collection,
+    Customer,
+    InsufficientInventory,
+    InventoryHold,
+    InventoryStripe,
+    Order,
+    OrderItem,
+    Product,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare checkout throughput for concurrent buyers of one product "
+        "with direct inventory updates and with striped reservations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=200)
+        parser.add_argument("--threads", type=int, default=100)
+        parser.add_argument("--stock", type=int, default=150)
+        parser.add_argument("--stripes", type=int, default=8)
+
+    def handle(self, *args, **options):
+        # Worker threads need committed rows, so they go to a test database
+        # dropped afterwards.
+        with test_database():
+            self.collection = Collection.objects.create(
+                title="Reservation benchmark"
+            )
+            user = User.objects.create(username="reservation-benchmark")
+            self.customer = Customer.objects.create(user=user, phone="0")
+            for striped in [False, True]:
+                self.run(striped, options)
+
+    def run(self, striped, options):
+        product = Product.objects.create(
+            title="Reservation benchmark",
+            slug="reservation-benchmark",
+            unit_price=10,
+            inventory=options["stock"],
+            collection=self.collection,
+        )
+        if striped:
+            InventoryStripe.objects.allocate(
+                product.id, options["stock"], stripes=options["stripes"]
+            )
+
+        cart_ids = []
+        for _ in range(options["buyers"]):
+            cart = Cart.objects.create()
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            cart_ids.append(cart.id)
+
+        def buy(cart_id):
+            try:
+                if striped:
+                    InventoryHold.objects.reserve(cart_id, {product.id: 1})
+                Order.objects.place_from_cart(cart_id, self.customer.id)
+                return True
+            except InsufficientInventory:
+                return False
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options["threads"]) as pool:
+            placed = sum(pool.map(buy, cart_ids))
+        elapsed = time.perf_counter() - started
+
+        # Holds that were not converted go back to the stripes.
+        InventoryHold.objects.filter(product=product).update(
+            expires_at=timezone.now()
+        )
+        while InventoryHold.objects.release_expired():
+            pass
+
+        product.refresh_from_db()
+        left = product.inventory + sum(
+            product.stripes.values_list("available", flat=True)
+        )
+        sold = OrderItem.objects.filter(product=product).count()
+        self.stdout.write(
+            f"{'striped' if striped else 'direct':<8} "
+            f"buyers={options['buyers']} threads={options['threads']} "
+            f"placed={placed} left={left} "
+            f"{options['buyers'] / elapsed:>8.0f} checkouts/sec"
+        )
+        if sold != placed or sold + left != options["stock"]:
+            raise CommandError("Inventory does not add up")
+        if placed != min(options["buyers"], options["stock"]):
+            raise CommandError("Checkouts failed with stock left")
@@ -0,0 +1,103 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed the synthetic dataset at several scales into a test database, "
+        "drive every route in store/urls.py and report throughput, latency "
+        "percentiles and query counts. With --baseline, fail when a route "
+        "regressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=float,
+            action="append",
+            dest="scales",
+            help="Fraction of the generator's default volumes, may be given "
+            "several times.",
+        )
+        parser.add_argument(
+            "--route",
+            action="append",
+            dest="routes",
+            choices=[name for name, _, _ in benchmark.ROUTES],
+            help="Only run this route, may be given several times.",
+        )
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--seed", default="42")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Seeding worker processes (Postgres only).",
+        )
+        parser.add_argument("--output", default="benchmark-results.json")
+        parser.add_argument(
+            "--baseline", help="Results file to compare against."
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Allowed fractional increase in p95 or mean latency.",
+        )
+        parser.add_argument(
+            "--latency-floor",
+            type=float,
+            default=1.0,
+            help="Latency increases below this many milliseconds are noise.",
+        )
+        parser.add_argument(
+            "--query-threshold",
+            type=int,
+            default=0,
+            help="Allowed increase in queries per request.",
+        )
+
+    def handle(self, *args, **options):
+        for pattern in benchmark.uncovered_routes():
+            self.stderr.write(f"No benchmark drives {pattern}")
+
+        baseline = None
+        if options["baseline"]:
+            try:
+                baseline = benchmark.load(options["baseline"])
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Cannot read baseline: {error}")
+
+        results = benchmark.run(
+            scales=options["scales"] or benchmark.DEFAULT_SCALES,
+            requests=options["requests"],
+            warmup=options["warmup"],
+            seed=options["seed"],
+            workers=options["workers"],
+            routes=options["routes"],
+            log=self.stdout.write,
+        )
+        benchmark.save(results, options["output"])
+        self.stdout.write(f"Results saved to {options['output']}")
+
+        if baseline is None:
+            return
+        if baseline["vendor"] != results["vendor"]:
+            self.stderr.write(
+                f"Baseline ran on {baseline['vendor']}, this run on "
+                f"{results['vendor']}."
+            )
+        regressions = benchmark.compare(
+            results,
+            baseline,
+            options["threshold"],
+            options["query_threshold"],
+            options["latency_floor"],
+        )
+        if regressions:
+            raise CommandError(
+                "Regressions against the baseline:\n" + "\n".join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS("No regressions."))
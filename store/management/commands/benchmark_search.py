@@ -0,0 +1,112 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from store.models import Collection, Product
+from store.search import ProductSearchFilter, inverted_index_backend
+from store.views import ProductList
+
+WORDS = (
+    "coffee tea bread cheese apple banana orange lemon pepper salt sugar "
+    "honey butter milk cream yogurt pasta rice bean lentil tomato potato "
+    "onion garlic ginger basil mint thyme olive walnut almond cashew "
+    "chocolate vanilla caramel maple cinnamon nutmeg organic fresh frozen "
+    "roasted smoked spicy sweet sour bitter crunchy smooth premium classic"
+).split()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ProductList search latency of SearchFilter (icontains) and "
+        "ProductSearchFilter on a synthetic catalog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--query",
+            action="append",
+            dest="queries",
+            help="Search term to benchmark, may be given several times.",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the synthetic catalog instead of rolling it back.",
+        )
+
+    def handle(self, *args, **options):
+        queries = options["queries"] or ["coffee", "smoked almond", "van"]
+        try:
+            with transaction.atomic():
+                self.seed(
+                    options["rows"], options["batch_size"], options["seed"]
+                )
+                for query in queries:
+                    self.compare(query, options["repeat"])
+                if not options["keep"]:
+                    raise Rollback
+        except Rollback:
+            pass
+        finally:
+            inverted_index_backend.reset()
+
+    def seed(self, rows, batch_size, seed):
+        rng = random.Random(seed)
+        collection = Collection.objects.create(title="Search benchmark")
+        started = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            Product.objects.bulk_create(
+                [
+                    Product(
+                        title=" ".join(rng.choices(WORDS, k=3)),
+                        slug="search-benchmark",
+                        description=" ".join(rng.choices(WORDS, k=20)),
+                        unit_price=rng.randint(1, 999),
+                        inventory=rng.randint(0, 100),
+                        collection=collection,
+                    )
+                    for _ in range(min(batch_size, rows - offset))
+                ],
+                batch_size=batch_size,
+            )
+        self.stdout.write(
+            f"Seeded {rows} products in {time.perf_counter() - started:.1f}s"
+        )
+
+    def compare(self, query, repeat):
+        request = Request(
+            APIRequestFactory().get("/store/products/", {"search": query})
+        )
+        view = ProductList()
+        for backend in [SearchFilter(), ProductSearchFilter()]:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                queryset = backend.filter_queryset(
+                    request, Product.objects.all(), view
+                )
+                count = queryset.count()
+                list(queryset[:10])
+                timings.append((time.perf_counter() - started) * 1000)
+
+            self.stdout.write(
+                f"{type(backend).__name__:<20} {query!r:<18} "
+                f"matches={count:<8} "
+                f"first={timings[0]:.1f}ms "
+                f"median={statistics.median(timings):.1f}ms "
+                f"best={min(timings):.1f}ms"
+            )
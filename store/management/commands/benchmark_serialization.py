@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from store.models import Collection, Product
+from store.serializers import ProductSerializer, ProductValuesSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/sec of ProductSerializer and ProductValuesSerializer "
+        "for several page sizes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            action="append",
+            dest="page_sizes",
+            help="Page size to measure, may be given several times.",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        page_sizes = options["page_sizes"] or [10, 100, 1000]
+        try:
+            with transaction.atomic():
+                self.seed(max(page_sizes))
+                for page_size in page_sizes:
+                    self.compare(page_size, options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, rows):
+        collection = Collection.objects.create(title="Serializer benchmark")
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title=f"Serializer benchmark {i}",
+                    slug="serializer-benchmark",
+                    description="lorem ipsum " * 20,
+                    unit_price=f"{i % 900 + 1}.{i % 100:02d}",
+                    inventory=i % 50,
+                    collection=collection,
+                )
+                for i in range(rows)
+            ]
+        )
+        self.collection = collection
+
+    def compare(self, page_size, repeat):
+        queryset = Product.objects.filter(collection=self.collection)
+        values_serializer = ProductValuesSerializer()
+        columns = values_serializer.get_values_fields()
+
+        def model_path():
+            page = list(queryset[:page_size])
+            return ProductSerializer(page, many=True).data
+
+        def values_path():
+            page = list(queryset.values(*columns)[:page_size])
+            return values_serializer.many(page)
+
+        renderer = JSONRenderer()
+        if renderer.render(model_path()) != renderer.render(values_path()):
+            raise CommandError(f"Output differs at page size {page_size}")
+
+        for name, run in [("serializer", model_path), ("values", values_path)]:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                run()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"page_size={page_size:<5} {name:<10} "
+                f"{page_size * repeat / elapsed:>10.0f} rows/sec"
+            )
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import query_plans
+from storefront.slow_queries import normalize
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed the synthetic dataset into a test database, run the queries "
+        "of every store endpoint, admin changelist and tag lookup, and fail "
+        "when a plan scans a large table or spills a sort to disk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=query_plans.DEFAULT_SCALE,
+            help="Fraction of the generator's default volumes.",
+        )
+        parser.add_argument(
+            "--check",
+            action="append",
+            dest="checks",
+            choices=[name for name, _ in query_plans.CHECKS],
+            help="Only run this check, may be given several times.",
+        )
+        parser.add_argument("--seed", default="42")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Seeding worker processes (Postgres only).",
+        )
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=query_plans.MIN_ROWS,
+            help="Scans of tables with fewer rows are not reported.",
+        )
+        parser.add_argument(
+            "--show-plans",
+            action="store_true",
+            help="Print every plan, not only those with problems.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            results = query_plans.run(
+                scale=options["scale"],
+                seed=options["seed"],
+                workers=options["workers"],
+                checks=options["checks"],
+                min_rows=options["min_rows"],
+                log=self.stdout.write,
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        failed = []
+        for name, plans in results.items():
+            for plan in plans:
+                if not (plan.problems or options["show_plans"]):
+                    continue
+                self.stdout.write(f"\n{name}: {normalize(plan.sql)}")
+                for problem in plan.problems:
+                    self.stdout.write(self.style.ERROR(f"  {problem}"))
+                for line in plan.lines:
+                    self.stdout.write(f"    {line}")
+            if any(plan.problems for plan in plans):
+                failed.append(name)
+
+        if failed:
+            raise CommandError(
+                f"Plan problems in {len(failed)} checks: {', '.join(failed)}"
+            )
+        self.stdout.write(self.style.SUCCESS("\nNo plan problems."))
@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.export import EXPORTS, RENDERERS, export_rows, parse_since
+
+
+class Command(BaseCommand):
+    help = "Stream a store table to stdout or a file as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(EXPORTS))
+        parser.add_argument(
+            "--output", choices=sorted(RENDERERS), default="ndjson"
+        )
+        parser.add_argument(
+            "--since", help="Only rows changed or placed since this date."
+        )
+        parser.add_argument("--file", help="Write here instead of stdout.")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = parse_since(options["since"])
+            except ValueError as error:
+                raise CommandError(error)
+
+        columns, rows = export_rows(
+            options["name"], since=since, chunk_size=options["chunk_size"]
+        )
+        chunks = RENDERERS[options["output"]](columns, rows)
+        if options["file"]:
+            with open(options["file"], "w", newline="") as file:
+                file.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.generator import DEFAULT_VOLUMES, generate, scaled_volumes
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic dataset (collections, products, "
+        "customers, orders, reviews and carts) for benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULT_VOLUMES.items():
+            parser.add_argument(
+                "--" + name.replace("_", "-"), type=int, default=default
+            )
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=1.0,
+            help="Multiply every volume except the per-order/cart ones.",
+        )
+        parser.add_argument("--seed", default="42")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Worker processes per stage (Postgres only).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        volumes = scaled_volumes(
+            options["scale"],
+            {name: options[name] for name in DEFAULT_VOLUMES},
+        )
+        try:
+            volumes = generate(
+                volumes,
+                seed=options["seed"],
+                workers=options["workers"],
+                chunk_size=options["chunk_size"],
+                log=self.stdout.write,
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                ", ".join(f"{name}={value}" for name, value in volumes.items())
+            )
+        )
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.importer import KINDS, Importer, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Load customers, collections, products, orders and order items "
+        "from CSV or NDJSON files in one transaction."
+    )
+
+    def add_arguments(self, parser):
+        for kind in KINDS:
+            parser.add_argument(
+                f"--{kind}", metavar="PATH", help=f"CSV or NDJSON {kind} file."
+            )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Use multi-row INSERTs even on Postgres.",
+        )
+
+    def handle(self, *args, **options):
+        importer = Importer(
+            batch_size=options["batch_size"],
+            use_copy=not options["no_copy"],
+            log=self.stdout.write,
+        )
+        with transaction.atomic():
+            for kind in KINDS:
+                if options[kind]:
+                    importer.load(kind, read_rows(options[kind]))
+            importer.finish()
+        self.stdout.write(self.style.SUCCESS("Import complete."))
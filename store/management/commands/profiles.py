@@ -0,0 +1,109 @@
+import io
+import pstats
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+
+from storefront.profiling import get_config, stored_profiles
+
+SORT_KEYS = ["cumulative", "tottime", "calls"]
+
+
+class Command(BaseCommand):
+    help = (
+        "List the kept request profiles by view, or merge the profiles of "
+        "one view and show where its requests spend their time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "view", nargs="?", help="Merge and show the profiles of this view."
+        )
+        parser.add_argument("--sort", choices=SORT_KEYS, default="cumulative")
+        parser.add_argument(
+            "--limit", type=int, default=30, help="Functions to show."
+        )
+        parser.add_argument(
+            "--min-ms",
+            type=float,
+            default=0,
+            help="Only merge requests that took at least this long.",
+        )
+        parser.add_argument(
+            "--last", type=int, help="Only merge the most recent profiles."
+        )
+        parser.add_argument(
+            "--output",
+            help="Also write the merged profile here, e.g. for snakeviz or "
+            "flameprof.",
+        )
+
+    def handle(self, *args, **options):
+        if options["view"] is None:
+            self.summarize(stored_profiles())
+            return
+
+        profiles = [
+            profile
+            for profile in stored_profiles(options["view"])
+            if profile.duration_ms >= options["min_ms"]
+        ]
+        if options["last"]:
+            profiles = profiles[-options["last"] :]
+        if not profiles:
+            raise CommandError(f"No profiles for {options['view']}")
+
+        buffer = io.StringIO()
+        stats = pstats.Stats(stream=buffer)
+        merged = []
+        for profile in profiles:
+            try:
+                stats.add(str(profile.path))
+            except (OSError, EOFError, ValueError, TypeError) as error:
+                # Pruned since it was listed, or not a profile.
+                self.stderr.write(f"Skipped {profile.path.name}: {error}")
+                continue
+            merged.append(profile)
+        if not merged:
+            raise CommandError(f"No readable profiles for {options['view']}")
+
+        durations = [profile.duration_ms for profile in merged]
+        self.stdout.write(
+            f"{options['view']}: {len(merged)} requests from "
+            f"{merged[0].time:%Y-%m-%d %H:%M:%S} to "
+            f"{merged[-1].time:%Y-%m-%d %H:%M:%S} UTC, "
+            f"median {statistics.median(durations):.1f}ms, "
+            f"max {max(durations):.1f}ms"
+        )
+        if options["output"]:
+            # Before strip_dirs, which would merge same-named modules.
+            stats.dump_stats(options["output"])
+        # Rather than one header line per merged file.
+        stats.files = []
+        stats.strip_dirs().sort_stats(options["sort"])
+        stats.print_stats(options["limit"])
+        self.stdout.write(buffer.getvalue())
+        if options["output"]:
+            self.stdout.write(f"Merged profile saved to {options['output']}")
+
+    def summarize(self, profiles):
+        if not profiles:
+            self.stdout.write(f"No profiles in {get_config()['DIR']}.")
+            return
+        views = {}
+        for profile in profiles:
+            views.setdefault(profile.view, []).append(profile)
+        self.stdout.write(
+            f"{'view':<32} {'count':>6} {'median ms':>10} {'max ms':>9}  "
+            f"latest (UTC)"
+        )
+        for view, group in sorted(
+            views.items(), key=lambda item: -len(item[1])
+        ):
+            durations = [profile.duration_ms for profile in group]
+            self.stdout.write(
+                f"{view:<32} {len(group):>6} "
+                f"{statistics.median(durations):>10.1f} "
+                f"{max(durations):>9.1f}  "
+                f"{group[-1].time:%Y-%m-%d %H:%M:%S}"
+            )
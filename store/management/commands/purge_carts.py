@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.models import Cart
+
+
+class Command(BaseCommand):
+    help = "Delete carts that have been inactive for a while, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=float,
+            default=30,
+            help="Purge carts with no activity for this many days.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches.",
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["days"])
+        started = time.perf_counter()
+        carts = items = 0
+
+        while True:
+            batch_carts, batch_items = Cart.objects.purge_inactive(
+                before, batch_size=options["batch_size"]
+            )
+            if not batch_carts:
+                break
+            carts += batch_carts
+            items += batch_items
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        self.stdout.write(
+            f"Purged {carts} carts and {items} cart items "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Collection, recount_products
+
+
+class Command(BaseCommand):
+    help = "Repair drift in Collection.products_count in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        started = time.perf_counter()
+        last_id = 0
+        checked = repaired = 0
+
+        while True:
+            collection_ids = list(
+                Collection.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not collection_ids:
+                break
+
+            with transaction.atomic():
+                repaired += recount_products(collection_ids)
+            checked += len(collection_ids)
+            last_id = collection_ids[-1]
+
+        self.stdout.write(
+            f"Checked {checked} collections, repaired {repaired} "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
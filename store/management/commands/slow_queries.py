@@ -0,0 +1,133 @@
+from collections import Counter
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from storefront.slow_queries import normalize, slow_query_log
+
+SORT_KEYS = {
+    "total": lambda group: group["total_ms"],
+    "count": lambda group: group["count"],
+    "mean": lambda group: group["total_ms"] / group["count"],
+    "max": lambda group: group["max_ms"],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarize the slow query log by query fingerprint, or show the "
+        "samples and plans of one fingerprint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "fingerprint",
+            nargs="?",
+            help="Show the slowest samples and latest plan of this query.",
+        )
+        parser.add_argument("--sort", choices=SORT_KEYS, default="total")
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument(
+            "--since", help="Only entries at or after this ISO 8601 time."
+        )
+        parser.add_argument("--view", help="Only entries from this view.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = datetime.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError(f"Invalid time: {options['since']}")
+            if since.tzinfo is None:
+                raise CommandError("--since needs a UTC offset, e.g. +00:00")
+
+        groups = {}
+        for entry in slow_query_log.entries():
+            if since and datetime.fromisoformat(entry["time"]) < since:
+                continue
+            if options["view"] and entry["view"] != options["view"]:
+                continue
+            group = groups.setdefault(
+                entry["fingerprint"],
+                {
+                    "count": 0,
+                    "total_ms": 0,
+                    "max_ms": 0,
+                    "views": Counter(),
+                    "entries": [],
+                    "plan": None,
+                },
+            )
+            group["count"] += 1
+            group["total_ms"] += entry["duration_ms"]
+            group["max_ms"] = max(group["max_ms"], entry["duration_ms"])
+            group["views"][entry["url_name"] or entry["view"]] += 1
+            group["entries"].append(entry)
+            if entry.get("plan"):
+                group["plan"] = entry
+
+        if options["fingerprint"]:
+            group = groups.get(options["fingerprint"])
+            if group is None:
+                raise CommandError(
+                    f"No entries for fingerprint {options['fingerprint']}"
+                )
+            self.show(options["fingerprint"], group, options["limit"])
+        else:
+            self.summarize(groups, options["sort"], options["limit"])
+
+    def summarize(self, groups, sort, limit):
+        if not groups:
+            self.stdout.write(
+                f"No slow queries in {slow_query_log.path} or its backups."
+            )
+            return
+        self.stdout.write(
+            f"{'fingerprint':<16} {'count':>6} {'total ms':>10} "
+            f"{'mean ms':>9} {'max ms':>9}  top view / query"
+        )
+        ranked = sorted(
+            groups.items(), key=lambda item: SORT_KEYS[sort](item[1])
+        )
+        for key, group in reversed(ranked[-limit:]):
+            view, _ = group["views"].most_common(1)[0]
+            sql = normalize(group["entries"][-1]["sql"])
+            self.stdout.write(
+                f"{key:<16} {group['count']:>6} {group['total_ms']:>10.1f} "
+                f"{group['total_ms'] / group['count']:>9.1f} "
+                f"{group['max_ms']:>9.1f}  {view}\n"
+                f"{'':<55}{sql[:120]}"
+            )
+
+    def show(self, key, group, limit):
+        entries = group["entries"]
+        self.stdout.write(
+            f"Fingerprint {key}: {normalize(entries[-1]['sql'])}"
+        )
+        self.stdout.write(
+            f"{group['count']} entries, {group['total_ms']:.1f}ms total, "
+            f"{group['max_ms']:.1f}ms max"
+        )
+        self.stdout.write("Views:")
+        for view, count in group["views"].most_common():
+            self.stdout.write(f"  {count:>6}  {view}")
+
+        self.stdout.write("Slowest:")
+        slowest = sorted(entries, key=lambda entry: entry["duration_ms"])
+        for entry in reversed(slowest[-limit:]):
+            self.stdout.write(
+                f"  {entry['time']} {entry['duration_ms']:.1f}ms "
+                f"{entry['method']} {entry['path']} "
+                f"params={', '.join(entry['params'])}"
+            )
+
+        if group["plan"] is None:
+            self.stdout.write("No plan captured yet.")
+            return
+        plan = group["plan"]
+        self.stdout.write(
+            f"Plan captured {plan['time']} ({plan['duration_ms']:.1f}ms):"
+        )
+        for line in plan["plan"].splitlines():
+            self.stdout.write(f"  {line}")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import InsufficientInventory, InventoryStripe, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Move part of a hot product's inventory into reservation stripes, "
+        "or with --release move it back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("product_id", type=int)
+        parser.add_argument(
+            "--quantity",
+            type=int,
+            help="Units to move, defaults to the whole inventory.",
+        )
+        parser.add_argument("--stripes", type=int, default=8)
+        parser.add_argument("--release", action="store_true")
+
+    def handle(self, *args, **options):
+        product_id = options["product_id"]
+        try:
+            inventory = Product.objects.get(pk=product_id).inventory
+        except Product.DoesNotExist:
+            raise CommandError(f"No product with id {product_id}")
+
+        if options["release"]:
+            released = InventoryStripe.objects.release(product_id)
+            self.stdout.write(f"Returned {released} units to the product")
+            return
+
+        quantity = options["quantity"]
+        if quantity is None:
+            quantity = inventory
+        try:
+            InventoryStripe.objects.allocate(
+                product_id, quantity, stripes=options["stripes"]
+            )
+        except InsufficientInventory:
+            raise CommandError(f"Only {inventory} units in stock")
+        self.stdout.write(
+            f"Moved {quantity} units into {options['stripes']} stripes"
+        )
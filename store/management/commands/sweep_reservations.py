@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.models import InventoryHold
+
+
+class Command(BaseCommand):
+    help = "Return expired inventory holds to their stripes in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        released = 0
+        while True:
+            batch = InventoryHold.objects.release_expired(
+                options["batch_size"]
+            )
+            if not batch:
+                break
+            released += batch
+
+        self.stdout.write(
+            f"Released {released} expired holds "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
@@ -0,0 +1,78 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:20
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+CREATE_TRIGGER = """
+CREATE FUNCTION store_product_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER store_product_search_vector_trigger
+BEFORE INSERT OR UPDATE OF title, description ON store_product
+FOR EACH ROW EXECUTE PROCEDURE store_product_search_vector_update();
+"""
+
+# Fires the trigger. Each batch commits on its own, so rows are only
+# locked for one batch and the table keeps taking writes.
+BACKFILL = "UPDATE store_product SET title = title WHERE id > %s AND id <= %s"
+
+BACKFILL_BATCH_SIZE = 10000
+
+CREATE_INDEX = """
+CREATE INDEX CONCURRENTLY store_product_search_vector_idx
+ON store_product USING gin (search_vector);
+"""
+
+DROP_INDEX = "DROP INDEX CONCURRENTLY IF EXISTS store_product_search_vector_idx"
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS store_product_search_vector_trigger ON store_product;
+DROP FUNCTION IF EXISTS store_product_search_vector_update();
+"""
+
+
+def create_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    # Rows written from here on get their vector from the trigger, so the
+    # backfill only has to reach the rows that existed before.
+    schema_editor.execute(CREATE_TRIGGER)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT max(id) FROM store_product")
+        last_id = cursor.fetchone()[0] or 0
+        for start in range(0, last_id, BACKFILL_BATCH_SIZE):
+            cursor.execute(BACKFILL, [start, start + BACKFILL_BATCH_SIZE])
+    schema_editor.execute(CREATE_INDEX)
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_INDEX)
+        schema_editor.execute(DROP_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    # The backfill commits in batches and the index is built concurrently,
+    # neither of which can be done in a transaction.
+    atomic = False
+
+    dependencies = [
+        ('store', '0014_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
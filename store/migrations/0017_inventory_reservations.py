@@ -0,0 +1,80 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0016_collection_products_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryHold",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("stripe", models.PositiveSmallIntegerField()),
+                ("quantity", models.PositiveSmallIntegerField()),
+                ("expires_at", models.DateTimeField()),
+                (
+                    "cart",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="holds",
+                        to="store.cart",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="store.product",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="InventoryStripe",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("stripe", models.PositiveSmallIntegerField()),
+                ("available", models.PositiveIntegerField(default=0)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stripes",
+                        to="store.product",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("product", "stripe")},
+            },
+        ),
+        migrations.AddIndex(
+            model_name="inventoryhold",
+            index=models.Index(
+                fields=["expires_at"], name="store_inven_expires_a03ad4_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:33
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def populate_last_activity(apps, schema_editor):
+    Cart = apps.get_model("store", "Cart")
+    Cart.objects.update(last_activity=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_inventory_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(
+            populate_last_activity, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['last_activity'], name='store_cart_last_ac_b4a9c8_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_cart_last_activity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['created_at', 'id'], name='store_cart_created_e4200b_idx'),
+        ),
+    ]
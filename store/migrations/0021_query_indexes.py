@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import storefront.operations
+
+
+# Customer.Meta.ordering sorts on the user's names. auth_user belongs to
+# django.contrib.auth, so the index is created here.
+CREATE_USER_NAME_INDEX = 'CREATE INDEX {concurrently}store_auth_user_name_idx ON auth_user (first_name, last_name)'
+
+DROP_USER_NAME_INDEX = 'DROP INDEX {concurrently}store_auth_user_name_idx'
+
+
+def _concurrently(schema_editor):
+    return 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+
+
+def create_user_name_index(apps, schema_editor):
+    schema_editor.execute(CREATE_USER_NAME_INDEX.format(concurrently=_concurrently(schema_editor)))
+
+
+def drop_user_name_index(apps, schema_editor):
+    schema_editor.execute(DROP_USER_NAME_INDEX.format(concurrently=_concurrently(schema_editor)))
+
+
+class Migration(migrations.Migration):
+
+    # The indexes are built concurrently on PostgreSQL, which cannot be
+    # done in a transaction.
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('store', '0020_token_claims'),
+    ]
+
+    operations = [
+        storefront.operations.AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['placed_at', 'id'], name='store_order_placed__61eeee_idx'),
+        ),
+        storefront.operations.AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['collection', 'title', 'id'], name='store_produ_collect_59c882_idx'),
+        ),
+        storefront.operations.AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['collection', 'unit_price', 'id'], name='store_produ_collect_5fde5f_idx'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='collection',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='store.collection'),
+        ),
+        migrations.RunPython(create_user_name_index, drop_user_name_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0021_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryhold',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,20 +1,55 @@
-from django.db import models
+import random
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections, models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from uuid import uuid4
 from django.contrib.auth.models import User
 from django.db.models.fields import related
 
+from .cache import bump_generation
+
 
 class Promotion(models.Model):
     description = models.CharField(max_length=255)
     discount = models.FloatField()
 
 
+class CollectionQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        bump_generation(self.model, using=self.db)
+        return objs
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        bump_generation(self.model, using=self.db)
+        return rows
+
+    def delete(self):
+        result = super().delete()
+        bump_generation(self.model, using=self.db)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Collection(models.Model):
     title = models.CharField(max_length=255)
     featured_product = models.ForeignKey(
         "Product", on_delete=models.SET_NULL, null=True, related_name="+"
     )
+    # Denormalized count of products, kept up to date by Product and
+    # ProductQuerySet. `reconcile_products_count` repairs any drift.
+    products_count = models.IntegerField(default=0, editable=False)
+
+    objects = CollectionQuerySet.as_manager()
 
     def __str__(self) -> str:
         return self.title
@@ -23,6 +58,128 @@ class Collection(models.Model):
         ordering = ["title"]
 
 
+def adjust_products_count(deltas, using=None):
+    """
+    Apply `{collection_id: delta}` to `Collection.products_count`, with one
+    UPDATE per distinct delta.
+    """
+    collections_by_delta = defaultdict(list)
+    for collection_id, delta in deltas.items():
+        if delta and collection_id is not None:
+            collections_by_delta[delta].append(collection_id)
+
+    for delta, collection_ids in collections_by_delta.items():
+        Collection.objects.using(using).filter(pk__in=collection_ids).update(
+            products_count=F("products_count") + delta
+        )
+
+
+# Product._loaded_collection_id of instances loaded without collection_id.
+_NOT_LOADED = object()
+
+
+# Product columns the catalog's cached responses leave out. Writes to
+# nothing else, such as checkouts and holds taking inventory, keep them.
+UNCACHED_PRODUCT_FIELDS = {"inventory", "last_update"}
+
+
+class ProductQuerySet(models.QuerySet):
+    def _count_by_collection(self):
+        return Counter(
+            dict(
+                self.order_by()
+                .values_list("collection_id")
+                .annotate(count=Count("id"))
+            )
+        )
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            adjust_products_count(
+                Counter(obj.collection_id for obj in objs), using=self.db
+            )
+        bump_generation(self.model, using=self.db)
+        for obj in objs:
+            obj._loaded_collection_id = obj.collection_id
+        return objs
+
+    def update(self, **kwargs):
+        # QuerySet.update() skips auto_now, but last_update feeds the
+        # catalog's ETag and Last-Modified headers.
+        kwargs.setdefault("last_update", timezone.now())
+        field = "collection" if "collection" in kwargs else "collection_id"
+        if field not in kwargs:
+            rows = super().update(**kwargs)
+            if not set(kwargs) <= UNCACHED_PRODUCT_FIELDS:
+                bump_generation(self.model, using=self.db)
+            return rows
+
+        value = kwargs[field]
+        if isinstance(value, models.Model):
+            value = value.pk
+        if hasattr(value, "resolve_expression"):
+            # The new collections are only known after the update, so
+            # recount everything the moved products touched.
+            with transaction.atomic(using=self.db):
+                product_ids = list(self.values_list("pk", flat=True))
+                collection_ids = set(self._count_by_collection())
+                rows = super().update(**kwargs)
+                collection_ids.update(
+                    Product.objects.using(self.db)
+                    .filter(pk__in=product_ids)
+                    .values_list("collection_id", flat=True)
+                )
+                recount_products(collection_ids, using=self.db)
+            bump_generation(self.model, using=self.db)
+            return rows
+
+        with transaction.atomic(using=self.db):
+            deltas = Counter()
+            deltas.subtract(self._count_by_collection())
+            rows = super().update(**kwargs)
+            deltas[value] += rows
+            adjust_products_count(deltas, using=self.db)
+        bump_generation(self.model, using=self.db)
+        return rows
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            deltas = Counter()
+            deltas.subtract(self._count_by_collection())
+            result = super().delete()
+            adjust_products_count(deltas, using=self.db)
+        bump_generation(self.model, using=self.db)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+def recount_products(collection_ids, using=None):
+    """
+    Recompute `products_count` from the product table for `collection_ids`
+    and return the number of collections that were out of date.
+    """
+    actual = Coalesce(
+        Subquery(
+            Product.objects.filter(collection_id=OuterRef("pk"))
+            .order_by()
+            .values("collection_id")
+            .annotate(count=Count("id"))
+            .values("count")
+        ),
+        0,
+    )
+    return (
+        Collection.objects.using(using)
+        .filter(pk__in=collection_ids)
+        .annotate(actual=actual)
+        .exclude(products_count=F("actual"))
+        .update(products_count=actual)
+    )
+
+
 class Product(models.Model):
     title = models.CharField(max_length=255)
     slug = models.SlugField()
@@ -32,14 +189,80 @@ class Product(models.Model):
     )
     inventory = models.IntegerField()
     last_update = models.DateTimeField(auto_now=True)
-    collection = models.ForeignKey(Collection, on_delete=models.PROTECT)
+    # Indexed by the (collection, ...) indexes in Meta.
+    collection = models.ForeignKey(
+        Collection, on_delete=models.PROTECT, db_index=False
+    )
     promotions = models.ManyToManyField(Promotion, blank=True)
+    # Maintained by a database trigger on Postgres, see migration 0015.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
 
     def __str__(self) -> str:
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_collection_id = instance.__dict__.get(
+            "collection_id", _NOT_LOADED
+        )
+        return instance
+
+    def _saves_collection(self, update_fields):
+        if "collection_id" not in self.__dict__:
+            # Still deferred, so not written.
+            return False
+        return update_fields is None or bool(
+            {"collection", "collection_id"} & set(update_fields)
+        )
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        saves_collection = self._saves_collection(kwargs.get("update_fields"))
+        previous = getattr(self, "_loaded_collection_id", _NOT_LOADED)
+        with transaction.atomic(using=kwargs.get("using")):
+            if not adding and saves_collection and previous is _NOT_LOADED:
+                # Loaded deferred and assigned since: compare with the row.
+                previous = (
+                    Product._base_manager.using(
+                        kwargs.get("using") or self._state.db
+                    )
+                    .filter(pk=self.pk)
+                    .values_list("collection_id", flat=True)
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            if adding:
+                deltas = {self.collection_id: 1}
+            elif saves_collection and previous != self.collection_id:
+                deltas = {previous: -1, self.collection_id: 1}
+            else:
+                deltas = {}
+            adjust_products_count(deltas, using=self._state.db)
+        if saves_collection:
+            self._loaded_collection_id = self.collection_id
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using")):
+            result = super().delete(*args, **kwargs)
+            adjust_products_count(
+                {self.collection_id: -1}, using=self._state.db
+            )
+        return result
+
     class Meta:
         ordering = ["title"]
+        indexes = [
+            models.Index(fields=["title", "id"]),
+            models.Index(fields=["unit_price", "id"]),
+            models.Index(fields=["last_update", "id"]),
+            # ProductFilter's collection and price range, sorted by the
+            # default ordering or by price.
+            models.Index(fields=["collection", "title", "id"]),
+            models.Index(fields=["collection", "unit_price", "id"]),
+        ]
 
 
 class Customer(models.Model):
@@ -74,6 +297,216 @@ class Customer(models.Model):
         ordering = ["user__first_name", "user__last_name"]
 
 
+class ClaimsUser(User):
+    """
+    A User built from access token claims by ClaimsJWTAuthentication, with
+    the other columns deferred. The first access to any of them loads all
+    of them with a single query.
+    """
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields)
+
+
+class UserTokenVersionQuerySet(models.QuerySet):
+    def current(self, user_id):
+        """
+        Return the user's token version, or None if the user does not
+        exist or is inactive.
+        """
+        versions = list(
+            User.objects.using(self.db)
+            .filter(pk=user_id, is_active=True)
+            .values_list("token_version__version", flat=True)[:1]
+        )
+        if not versions:
+            return None
+        return versions[0] or 0
+
+    def revoke(self, user_id):
+        """
+        Invalidate every token issued to the user so far. Deleted users
+        need nothing, their tokens are rejected already.
+        """
+        with transaction.atomic(using=self.db):
+            updated = self.filter(user_id=user_id).update(
+                version=F("version") + 1
+            )
+            if (
+                not updated
+                and User.objects.using(self.db).filter(pk=user_id).exists()
+            ):
+                self.get_or_create(user_id=user_id, defaults={"version": 1})
+
+
+class UserTokenVersion(models.Model):
+    # Tokens carry the version they were issued with; bumping it revokes
+    # them. Users without a row are at version 0.
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="token_version",
+    )
+    version = models.PositiveIntegerField(default=0)
+
+    objects = UserTokenVersionQuerySet.as_manager()
+
+
+class InsufficientInventory(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f"Not enough inventory for products {product_ids}")
+        self.product_ids = product_ids
+
+
+# The most one cart line can hold: CartItem.quantity is a smallint.
+MAX_CART_QUANTITY = 32767
+
+
+class QuantityTooLarge(Exception):
+    def __init__(self, product_ids, limit):
+        super().__init__(
+            f"Quantities of products {product_ids} would exceed {limit}"
+        )
+        self.product_ids = product_ids
+        self.limit = limit
+
+
+class OrderQuerySet(models.QuerySet):
+    def _decrement_inventory(self, quantities):
+        """
+        Take `{product_id: quantity}` from `Product.inventory` with one
+        conditional UPDATE, or raise InsufficientInventory.
+        """
+        if not quantities:
+            return
+
+        connection = connections[self.db]
+        products = connection.ops.quote_name(Product._meta.db_table)
+        # Lock in a fixed order so that carts sharing products cannot
+        # deadlock; a no-op on backends without SELECT ... FOR UPDATE.
+        list(
+            Product.objects.using(self.db)
+            .select_for_update()
+            .filter(pk__in=quantities)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+        values = ", ".join(["(%s, %s)"] * len(quantities))
+        params = [
+            value
+            for product_id, quantity in sorted(quantities.items())
+            for value in (product_id, quantity)
+        ]
+        last_update = Product._meta.get_field("last_update").get_db_prep_value(
+            timezone.now(), connection
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {products} SET "
+                f"inventory = {products}.inventory - v.column2, "
+                f"last_update = %s "
+                f"FROM (VALUES {values}) AS v "
+                f"WHERE {products}.id = v.column1 "
+                f"AND {products}.inventory >= v.column2 "
+                f"RETURNING {products}.id",
+                [last_update] + params,
+            )
+            updated = {product_id for product_id, in cursor.fetchall()}
+        if len(updated) < len(quantities):
+            raise InsufficientInventory(sorted(set(quantities) - updated))
+
+    def place_from_cart(self, cart_id, customer_id):
+        """
+        Turn a cart into a pending order in one transaction and return the
+        order, with its items prefetched, or None if the cart has no items.
+
+        The number of statements does not depend on the size of the cart:
+        the cart items and the cart's inventory holds are claimed with one
+        `DELETE ... RETURNING` each, units that are not held are taken
+        from stripes or with one conditional `UPDATE ... FROM (VALUES ...)`
+        on the products, locked in id order, and the order items are
+        written with one `bulk_create()` using a snapshot of the unit
+        prices. If any product is short the transaction is rolled back
+        and InsufficientInventory is raised.
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        cart_key = CartItem._meta.get_field("cart").get_db_prep_value(
+            cart_id, connection
+        )
+
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                # Claiming the items first means a concurrent checkout of
+                # the same cart waits here and then finds it empty.
+                cursor.execute(
+                    f"DELETE FROM {quote(CartItem._meta.db_table)} "
+                    f"WHERE cart_id = %s RETURNING product_id, quantity",
+                    [cart_key],
+                )
+                quantities = dict(cursor.fetchall())
+            if not quantities:
+                return None
+
+            # Held units were already taken from the product's stripes
+            # and only need converting; anything else is taken from the
+            # stripes now if the product has any, or from its inventory.
+            stripes = InventoryStripe.objects.using(self.db)
+            holds = InventoryHold.objects.using(self.db).claim(cart_id)
+            held, give_back = Counter(), []
+            now = timezone.now()
+            for product_id, stripe, quantity, expires_at in holds:
+                used = 0
+                if expires_at > now:
+                    used = min(quantity, quantities.get(product_id, 0))
+                    held[product_id] += used
+                if quantity > used:
+                    give_back.append((product_id, stripe, quantity - used))
+            stripes.give_back(give_back)
+
+            remaining = {
+                product_id: quantity - held[product_id]
+                for product_id, quantity in quantities.items()
+                if quantity > held[product_id]
+            }
+            for product_id in stripes.take(remaining):
+                del remaining[product_id]
+            self._decrement_inventory(remaining)
+
+            prices = dict(
+                Product.objects.using(self.db)
+                .filter(pk__in=quantities)
+                .values_list("pk", "unit_price")
+            )
+            order = self.create(
+                customer_id=customer_id,
+                payment_status=Order.PAYMENT_PENDING,
+            )
+            items = OrderItem.objects.using(self.db).bulk_create(
+                [
+                    OrderItem(
+                        order=order,
+                        product_id=product_id,
+                        quantity=quantity,
+                        unit_price=prices[product_id],
+                    )
+                    for product_id, quantity in sorted(quantities.items())
+                ]
+            )
+            Cart.objects.using(self.db).filter(pk=cart_id).delete()
+
+        order._prefetched_objects_cache = {"orderitem_set": items}
+        return order
+
+
 class Order(models.Model):
     PAYMENT_PENDING = "P"
     PAYMENT_COMPLETE = "C"
@@ -89,6 +522,11 @@ class Order(models.Model):
     payment_status = models.CharField(max_length=1, choices=PAYMENT_CHOICES)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["placed_at", "id"])]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.PROTECT)
@@ -115,11 +553,146 @@ class Review(models.Model):
     date = models.DateField(auto_now_add=True)
 
 
+# Carts touched more recently than this are not written again, so that
+# every cart mutation does not rewrite the cart row.
+CART_TOUCH_INTERVAL = timedelta(minutes=5)
+
+
+class CartQuerySet(models.QuerySet):
+    def touch(self, cart_id):
+        """Record activity on the cart, at most once per interval."""
+        now = timezone.now()
+        return self.filter(
+            pk=cart_id, last_activity__lt=now - CART_TOUCH_INTERVAL
+        ).update(last_activity=now)
+
+    def purge_inactive(self, before, batch_size=1000):
+        """
+        Delete up to `batch_size` carts, with their items, that have been
+        inactive since before `before` and return the number of carts and
+        items deleted. Concurrent purges skip each other's rows.
+        """
+        with transaction.atomic(using=self.db):
+            cart_ids = list(
+                self.select_for_update(skip_locked=True)
+                .filter(last_activity__lt=before)
+                .order_by("last_activity")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not cart_ids:
+                return 0, 0
+            _, deleted = self.filter(pk__in=cart_ids).delete()
+        return (
+            deleted.get(self.model._meta.label, 0),
+            deleted.get(CartItem._meta.label, 0),
+        )
+
+
 class Cart(models.Model):
     id = models.UUIDField(
         primary_key=True, default=uuid4, unique=True, editable=False
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Moved forward by CartQuerySet.touch() when the items change.
+    last_activity = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["last_activity"]),
+            models.Index(fields=["created_at", "id"]),
+        ]
+
+
+class CartItemQuerySet(models.QuerySet):
+    def add_quantities(self, cart_id, quantities, replace=False):
+        """
+        Add `{product_id: quantity}` to the cart with a single
+        `INSERT ... ON CONFLICT (cart_id, product_id) DO UPDATE` statement
+        and return the resulting items. With `replace=True` existing lines
+        are set to the given quantity instead of incremented.
+
+        Rows are selected from the product and cart tables, so unknown
+        products (or an unknown cart) are simply absent from the result
+        instead of needing a separate existence check.
+
+        Raises QuantityTooLarge, and changes nothing, when a line would
+        go past MAX_CART_QUANTITY.
+        """
+        if not quantities:
+            return []
+
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        too_large = sorted(
+            product_id
+            for product_id, quantity in quantities.items()
+            if quantity > MAX_CART_QUANTITY
+        )
+        if too_large:
+            raise QuantityTooLarge(too_large, MAX_CART_QUANTITY)
+
+        cart_key = self.model._meta.get_field("cart").get_db_prep_value(
+            cart_id, connection
+        )
+        table = quote(self.model._meta.db_table)
+        if replace:
+            new_quantity = "EXCLUDED.quantity"
+        else:
+            # In integer: on Postgres the sum of two smallints is a
+            # smallint, which would fail before the limit is checked.
+            new_quantity = (
+                f"CAST({table}.quantity AS integer) + EXCLUDED.quantity"
+            )
+        values = ", ".join(["(%s, %s)"] * len(quantities))
+        params = [
+            value
+            for product_id, quantity in quantities.items()
+            for value in (product_id, quantity)
+        ]
+        sql = (
+            f"INSERT INTO {table} "
+            f"(cart_id, product_id, quantity) "
+            f"SELECT c.id, p.id, v.column2 "
+            f"FROM (VALUES {values}) AS v "
+            f"JOIN {quote(Product._meta.db_table)} p ON p.id = v.column1 "
+            f"JOIN {quote(Cart._meta.db_table)} c ON c.id = %s "
+            f"WHERE TRUE "
+            f"ON CONFLICT (cart_id, product_id) DO UPDATE SET "
+            f"quantity = {new_quantity} "
+            f"WHERE {new_quantity} <= %s "
+            f"RETURNING id, product_id, quantity"
+        )
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params + [cart_key, MAX_CART_QUANTITY])
+                rows = cursor.fetchall()
+            # Lines the WHERE kept from being updated are missing from
+            # the result, like unknown products, but they exist.
+            missing = set(quantities) - {row[1] for row in rows}
+            if missing:
+                overflowing = sorted(
+                    self.filter(
+                        cart_id=cart_id, product_id__in=missing
+                    ).values_list("product_id", flat=True)
+                )
+                if overflowing:
+                    raise QuantityTooLarge(overflowing, MAX_CART_QUANTITY)
+            Cart.objects.using(self.db).touch(cart_id)
+
+        items = []
+        for item_id, product_id, quantity in rows:
+            item = self.model(
+                id=item_id,
+                cart_id=cart_id,
+                product_id=product_id,
+                quantity=quantity,
+            )
+            item._state.adding = False
+            item._state.db = self.db
+            items.append(item)
+        return items
 
 
 class CartItem(models.Model):
@@ -129,5 +702,404 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveSmallIntegerField()
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = [["cart", "product"]]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Cart.objects.using(self._state.db).touch(self.cart_id)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Cart.objects.using(self._state.db).touch(self.cart_id)
+        return result
+
+
+RESERVATION_TTL = timedelta(minutes=10)
+# Carts one user can hold inventory for at the same time.
+MAX_HELD_CARTS = 3
+
+
+class TooManyHeldCarts(Exception):
+    def __init__(self, limit):
+        super().__init__(f"Inventory is already held for {limit} carts")
+        self.limit = limit
+
+
+def restock(quantities, using=None):
+    """
+    Add `{product_id: quantity}` back to `Product.inventory`, with one
+    UPDATE per distinct quantity.
+    """
+    products_by_quantity = defaultdict(list)
+    for product_id, quantity in quantities.items():
+        if quantity:
+            products_by_quantity[quantity].append(product_id)
+
+    for quantity, product_ids in products_by_quantity.items():
+        Product.objects.using(using).filter(pk__in=product_ids).update(
+            inventory=F("inventory") + quantity
+        )
+
+
+class InventoryStripeQuerySet(models.QuerySet):
+    def allocate(self, product_id, quantity, stripes=8):
+        """
+        Move `quantity` units of a product's inventory into `stripes`
+        reservation rows, so that holds on a hot product spread over
+        several rows instead of all locking the product.
+        """
+        with transaction.atomic(using=self.db):
+            moved = (
+                Product.objects.using(self.db)
+                .filter(pk=product_id, inventory__gte=quantity)
+                .update(inventory=F("inventory") - quantity)
+            )
+            if not moved:
+                raise InsufficientInventory([product_id])
+
+            existing = set(
+                self.filter(product_id=product_id).values_list(
+                    "stripe", flat=True
+                )
+            )
+            for stripe in range(stripes):
+                share = quantity // stripes + (stripe < quantity % stripes)
+                if stripe in existing:
+                    self.filter(product_id=product_id, stripe=stripe).update(
+                        available=F("available") + share
+                    )
+                else:
+                    self.create(
+                        product_id=product_id, stripe=stripe, available=share
+                    )
+
+    def release(self, product_id):
+        """
+        Return the unreserved units of a product's stripes to its
+        inventory and remove the stripes. Units still held are returned
+        to the product when their holds expire.
+        """
+        with transaction.atomic(using=self.db):
+            stripes = self.select_for_update().filter(product_id=product_id)
+            available = sum(stripes.values_list("available", flat=True))
+            stripes.delete()
+            restock({product_id: available}, using=self.db)
+        return available
+
+    def _subtract(self, parts):
+        """
+        Subtract `(product_id, stripe, quantity)` parts from stripes that
+        have enough, in one UPDATE, and return the `(product_id, stripe)`
+        pairs that did.
+        """
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        values = ", ".join(["(%s, %s, %s)"] * len(parts))
+        params = [value for part in sorted(parts) for value in part]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET "
+                f"available = {table}.available - v.column3 "
+                f"FROM (VALUES {values}) AS v "
+                f"WHERE {table}.product_id = v.column1 "
+                f"AND {table}.stripe = v.column2 "
+                f"AND {table}.available >= v.column3 "
+                f"RETURNING {table}.product_id, {table}.stripe",
+                params,
+            )
+            return set(cursor.fetchall())
+
+    def _take_split(self, quantities):
+        """
+        Take each of `{product_id: quantity}` from as many of its stripes
+        as needed, fullest first, and return `{product_id: [(stripe,
+        quantity), ...]}` for the products whose stripes held enough.
+        """
+        with transaction.atomic(using=self.db):
+            stripes = defaultdict(list)
+            for product_id, stripe, available in (
+                self.select_for_update()
+                .filter(product_id__in=quantities, available__gt=0)
+                .order_by("product_id", "stripe")
+                .values_list("product_id", "stripe", "available")
+            ):
+                stripes[product_id].append((stripe, available))
+
+            taken = {}
+            for product_id, quantity in quantities.items():
+                if sum(a for _, a in stripes[product_id]) < quantity:
+                    continue
+                taken[product_id] = []
+                for stripe, available in sorted(
+                    stripes[product_id], key=lambda item: -item[1]
+                ):
+                    share = min(quantity, available)
+                    taken[product_id].append((stripe, share))
+                    quantity -= share
+                    if not quantity:
+                        break
+            if not taken:
+                return {}
+
+            done = self._subtract(
+                [
+                    (product_id, stripe, quantity)
+                    for product_id, parts in taken.items()
+                    for stripe, quantity in parts
+                ]
+            )
+            # Without row locks (SQLite) a stripe can have run short since
+            # it was read; such products give back what they got.
+            short = {
+                product_id
+                for product_id, parts in taken.items()
+                if any((product_id, stripe) not in done for stripe, _ in parts)
+            }
+            self.give_back(
+                (product_id, stripe, quantity)
+                for product_id in short
+                for stripe, quantity in taken.pop(product_id)
+                if (product_id, stripe) in done
+            )
+        return taken
+
+    def take(self, quantities):
+        """
+        Take `{product_id: quantity}` from the products' stripes and
+        return `{product_id: [(stripe, quantity), ...]}` for the ones that
+        could be taken.
+
+        Every product starts at a random stripe and moves to the next one
+        when it is short, with one UPDATE per round for all products.
+        Products that no single stripe can serve are then split across
+        several stripes if together they hold enough. Products without
+        stripes, or short on all of them together, are left out of the
+        result.
+        """
+        stripe_counts = dict(
+            self.filter(product_id__in=quantities)
+            .order_by()
+            .values_list("product_id")
+            .annotate(count=Count("id"))
+        )
+        pending = {
+            product_id: quantity
+            for product_id, quantity in quantities.items()
+            if product_id in stripe_counts
+        }
+        if not pending:
+            return {}
+
+        starts = {
+            product_id: random.randrange(stripe_counts[product_id])
+            for product_id in pending
+        }
+        taken = {}
+        for attempt in range(max(stripe_counts.values())):
+            if not pending:
+                break
+            done = self._subtract(
+                [
+                    (
+                        product_id,
+                        (starts[product_id] + attempt)
+                        % stripe_counts[product_id],
+                        quantity,
+                    )
+                    for product_id, quantity in pending.items()
+                ]
+            )
+            for product_id, stripe in done:
+                taken[product_id] = [(stripe, pending.pop(product_id))]
+        if pending:
+            taken.update(self._take_split(pending))
+        return taken
+
+    def give_back(self, holds):
+        """
+        Return `(product_id, stripe, quantity)` holds to their stripes in
+        one UPDATE. Units whose stripe has been released go back to the
+        product's inventory instead.
+        """
+        quantities = Counter()
+        for product_id, stripe, quantity in holds:
+            quantities[product_id, stripe] += quantity
+        if not quantities:
+            return
+
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        values = ", ".join(["(%s, %s, %s)"] * len(quantities))
+        params = [
+            value
+            for (product_id, stripe), quantity in sorted(quantities.items())
+            for value in (product_id, stripe, quantity)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET "
+                f"available = {table}.available + v.column3 "
+                f"FROM (VALUES {values}) AS v "
+                f"WHERE {table}.product_id = v.column1 "
+                f"AND {table}.stripe = v.column2 "
+                f"RETURNING {table}.product_id, {table}.stripe",
+                params,
+            )
+            for key in cursor.fetchall():
+                del quantities[key]
+
+        leftovers = Counter()
+        for (product_id, stripe), quantity in quantities.items():
+            leftovers[product_id] += quantity
+        restock(leftovers, using=self.db)
+
+
+class InventoryStripe(models.Model):
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="stripes"
+    )
+    stripe = models.PositiveSmallIntegerField()
+    available = models.PositiveIntegerField(default=0)
+
+    objects = InventoryStripeQuerySet.as_manager()
+
+    class Meta:
+        unique_together = [["product", "stripe"]]
+
+
+class InventoryHoldQuerySet(models.QuerySet):
+    def _delete_returning(self, where, params):
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {where} "
+                f"RETURNING product_id, stripe, quantity, expires_at",
+                params,
+            )
+            rows = cursor.fetchall()
+        expires_at = self.model._meta.get_field("expires_at")
+        converters = connection.ops.get_db_converters(
+            expires_at.get_col(self.model._meta.db_table)
+        )
+        for row in rows:
+            value = row[3]
+            for converter in converters:
+                value = converter(value, expires_at, connection)
+            yield row[0], row[1], row[2], value
+
+    def claim(self, cart_id):
+        """
+        Delete the cart's holds and return them as
+        `(product_id, stripe, quantity, expires_at)` tuples; the caller
+        either converts them or gives them back.
+        """
+        cart_key = self.model._meta.get_field("cart").get_db_prep_value(
+            cart_id, connections[self.db]
+        )
+        return list(self._delete_returning("cart_id = %s", [cart_key]))
+
+    def reserve(self, cart_id, quantities, ttl=RESERVATION_TTL, user_id=None):
+        """
+        Hold `{product_id: quantity}` for the cart until `ttl` from now,
+        replacing the cart's earlier holds, and return the new holds.
+        Products without stripes are not held; checkout takes them from
+        `Product.inventory` directly.
+
+        Holds made for `user_id` are counted against MAX_HELD_CARTS, and
+        TooManyHeldCarts is raised when the user already holds inventory
+        for as many other carts.
+        """
+        stripes = InventoryStripe.objects.using(self.db)
+        with transaction.atomic(using=self.db):
+            if user_id is not None:
+                self._check_held_carts(cart_id, user_id)
+            stripes.give_back(hold[:3] for hold in self.claim(cart_id))
+            taken = stripes.take(quantities)
+            expires_at = timezone.now() + ttl
+            return self.bulk_create(
+                [
+                    self.model(
+                        cart_id=cart_id,
+                        user_id=user_id,
+                        product_id=product_id,
+                        stripe=stripe,
+                        quantity=quantity,
+                        expires_at=expires_at,
+                    )
+                    for product_id, parts in sorted(taken.items())
+                    for stripe, quantity in parts
+                ]
+            )
+
+    def _check_held_carts(self, cart_id, user_id):
+        # Serializes the user's reservations, so that two of them cannot
+        # both pass the check; a no-op on backends without SELECT ... FOR
+        # UPDATE.
+        list(
+            User.objects.using(self.db)
+            .select_for_update()
+            .filter(pk=user_id)
+            .values_list("pk", flat=True)
+        )
+        held = (
+            self.filter(user_id=user_id, expires_at__gt=timezone.now())
+            .exclude(cart_id=cart_id)
+            .values("cart_id")
+            .distinct()
+            .count()
+        )
+        if held >= MAX_HELD_CARTS:
+            raise TooManyHeldCarts(MAX_HELD_CARTS)
+
+    def release_expired(self, batch_size=1000):
+        """
+        Give back up to `batch_size` expired holds and return how many
+        were released. Concurrent sweepers skip each other's rows.
+        """
+        with transaction.atomic(using=self.db):
+            ids = list(
+                self.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=timezone.now())
+                .order_by("expires_at")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                return 0
+            holds = list(
+                self._delete_returning(
+                    f"id IN ({', '.join(['%s'] * len(ids))})", ids
+                )
+            )
+            InventoryStripe.objects.using(self.db).give_back(
+                hold[:3] for hold in holds
+            )
+        return len(holds)
+
+
+class InventoryHold(models.Model):
+    # Holds outlive a deleted cart until they expire, so that the sweep
+    # can still return their units.
+    cart = models.ForeignKey(
+        Cart,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="holds",
+    )
+    # Who reserved, for MAX_HELD_CARTS. The holds of a deleted user stay
+    # until they expire, like those of a deleted cart.
+    user = models.ForeignKey(
+        User, null=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    stripe = models.PositiveSmallIntegerField()
+    quantity = models.PositiveSmallIntegerField()
+    expires_at = models.DateTimeField()
+
+    objects = InventoryHoldQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["expires_at"])]
@@ -1,5 +1,201 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict, namedtuple
+from datetime import date
+from decimal import Decimal
+from uuid import UUID
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 10
+
+
+KeysetCursor = namedtuple("KeysetCursor", ["reverse", "position"])
+
+
+def estimate_count(queryset):
+    """
+    Return the planner's row estimate for `queryset` on Postgres and fall
+    back to an exact COUNT on other backends.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination that seeks on the full sort key instead of using
+    OFFSET.
+
+    The ordering chosen by the view's `OrderingFilter` (or `ordering`) is
+    extended with `id` so that every row has a unique position. The total
+    count is skipped unless the client asks for it with `?count=exact` or
+    `?count=estimate`.
+    """
+
+    page_size = 10
+    ordering = "title"
+    tiebreaker = "id"
+    count_query_param = "count"
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view))
+        if self.tiebreaker not in [field.lstrip("-") for field in ordering]:
+            ordering.append(self.tiebreaker)
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+        self.cursor = self.decode_cursor(request)
+        self.count = self.get_count(queryset, request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self._flip(field) for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(
+                self._seek(ordering, self.cursor.position)
+            )
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == "exact":
+            return queryset.count()
+        if mode == "estimate":
+            return estimate_count(queryset)
+        return None
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(
+            KeysetCursor(False, self._get_position(self.page[-1]))
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(
+            KeysetCursor(True, self._get_position(self.page[0]))
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            cursor = KeysetCursor(bool(data["r"]), list(data["p"]))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if len(cursor.position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        # Positions come from the client: values the sort columns cannot
+        # hold would otherwise fail in the database.
+        position = []
+        for field, value in zip(self.ordering, cursor.position):
+            model_field = self.model._meta.get_field(field.lstrip("-"))
+            try:
+                position.append(model_field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(position=position)
+
+    def encode_cursor(self, cursor):
+        data = {"r": int(cursor.reverse), "p": cursor.position}
+        encoded = urlsafe_b64encode(json.dumps(data).encode("ascii"))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode("ascii")
+        )
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response["count"] = self.count
+        response["next"] = self.get_next_link()
+        response["previous"] = self.get_previous_link()
+        response["results"] = data
+        return Response(response)
+
+    def _get_position(self, instance):
+        position = []
+        for field in self.ordering:
+            name = field.lstrip("-")
+            if isinstance(instance, dict):
+                value = instance[name]
+            else:
+                value = getattr(instance, name)
+            if isinstance(value, date):
+                value = value.isoformat()
+            elif isinstance(value, (Decimal, UUID)):
+                value = str(value)
+            position.append(value)
+        return position
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else "-" + field
+
+    @staticmethod
+    def _seek(ordering, position):
+        """
+        Build `(a, b, id) > (x, y, z)` as nested OR/AND terms so that each
+        column can keep its own sort direction, ANDed with `a >= x`: the
+        OR alone cannot be used as an index condition, so Postgres would
+        scan from the start of the index.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        first = ordering[0]
+        bound = "lte" if first.startswith("-") else "gte"
+        return Q(**{f"{first.lstrip('-')}__{bound}": position[0]}) & condition
+
+
+class CartPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
@@ -0,0 +1,244 @@
+import json
+import logging
+import re
+from collections import namedtuple
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.test import Client
+
+from storefront.slow_queries import explainable, fingerprint, normalize
+from tags.models import TaggedItem
+
+from .benchmark import ROUTES, send, seeded_database
+from .models import Product
+
+DEFAULT_SCALE = 0.1
+# Requests each route check sends, with different ids.
+CALLS = 3
+# Planners rightly scan tables with fewer rows than this.
+MIN_ROWS = 1000
+
+# Scans accepted by check, on every database or on one vendor:
+# - the "Low" inventory filter is rare, and an index on inventory would
+#   keep Postgres from updating products as heap-only tuples on checkout;
+# - the in-process search backend ranks every matching product by id.
+ALLOWED_SCANS = {
+    None: {"admin-products-low-inventory": {"store_product"}},
+    "sqlite": {"products-search": {"store_product"}},
+}
+
+Plan = namedtuple("Plan", ["sql", "lines", "problems"])
+
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+
+def _route_check(build):
+    def check(fixture, client, admin_client):
+        for call in build(fixture, CALLS):
+            send(client, call)
+
+    return check
+
+
+def _admin_check(path):
+    def check(fixture, client, admin_client):
+        admin_client.get(path(fixture))
+
+    return check
+
+
+def _tagged_items(fixture, client, admin_client):
+    # How tags of a product are read, e.g. by a GenericRelation.
+    content_type = ContentType.objects.get_for_model(Product)
+    for product_id in fixture.product_ids[:CALLS]:
+        list(
+            TaggedItem.objects.filter(
+                content_type=content_type, object_id=product_id
+            ).select_related("tag")
+        )
+
+
+# (name, function running the queries of the check)
+CHECKS = [
+    *[(name, _route_check(build)) for name, _, build in ROUTES],
+    ("admin-products", _admin_check(lambda f: "/admin/store/product/")),
+    (
+        "admin-products-collection",
+        _admin_check(
+            lambda f: "/admin/store/product/"
+            f"?collection__id__exact={f.collection_ids[0]}"
+        ),
+    ),
+    (
+        "admin-products-low-inventory",
+        _admin_check(lambda f: "/admin/store/product/?inventory=%3C10"),
+    ),
+    ("admin-customers", _admin_check(lambda f: "/admin/store/customer/")),
+    ("admin-orders", _admin_check(lambda f: "/admin/store/order/")),
+    ("tagged-items", _tagged_items),
+]
+
+
+class StatementRecorder:
+    """Execute wrapper keeping the first run of every distinct SELECT."""
+
+    def __init__(self):
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and explainable(sql):
+            self.statements.setdefault(fingerprint(sql), (sql, params))
+        return execute(sql, params, many, context)
+
+
+def reads_every_row(sql):
+    """
+    Whether `sql` has neither WHERE nor LIMIT, so that it reads the whole
+    table by design, like exports and unfiltered counts.
+    """
+    statement = normalize(sql).upper()
+    return " WHERE " not in statement and " LIMIT " not in statement
+
+
+def _postgres_nodes(node, depth=0):
+    yield depth, node
+    for child in node.get("Plans", []):
+        yield from _postgres_nodes(child, depth + 1)
+
+
+def postgres_plan(sql, params, scanned_tables):
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params
+            )
+            plan = cursor.fetchone()[0]
+        transaction.set_rollback(True)
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    lines, problems = [], []
+    for depth, node in _postgres_nodes(plan[0]["Plan"]):
+        table = node.get("Relation Name")
+        line = node["Node Type"]
+        if table:
+            line += f" on {table}"
+        if node.get("Index Name"):
+            line += f" using {node['Index Name']}"
+        if node.get("Index Cond"):
+            # Shows whether a keyset seek bounds the index scan.
+            line += f" cond {node['Index Cond']}"
+        line += f" (rows={node['Actual Rows']} loops={node['Actual Loops']})"
+        if node.get("Sort Method"):
+            line += (
+                f" {node['Sort Method']}, {node['Sort Space Used']}kB "
+                f"{node['Sort Space Type']}"
+            )
+        lines.append("  " * depth + line)
+
+        if node["Node Type"] == "Seq Scan" and table in scanned_tables:
+            problems.append(f"Seq Scan on {table}")
+        if node.get("Sort Space Type") == "Disk":
+            problems.append(
+                f"Sort spilled to disk ({node['Sort Space Used']}kB)"
+            )
+    return lines, problems
+
+
+def sqlite_plan(sql, params, scanned_tables):
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        rows = cursor.fetchall()
+
+    lines, problems, depths = [], [], {0: -1}
+    for node_id, parent, _, detail in rows:
+        depths[node_id] = depths.get(parent, -1) + 1
+        lines.append("  " * depths[node_id] + detail)
+        # SQLite sorts in memory or temporary files without reporting
+        # which, so only full scans are checked.
+        match = _SQLITE_SCAN.match(detail)
+        if match and match[1] in scanned_tables:
+            problems.append(f"Full scan of {match[1]}")
+    return lines, problems
+
+
+PLANNERS = {"postgresql": postgres_plan, "sqlite": sqlite_plan}
+
+
+def explain(sql, params, tables):
+    """
+    Return the Plan of `sql`, with its problems: sequential scans of
+    `tables`, unless `sql` reads every row anyway, and sorts spilled to
+    disk.
+    """
+    scanned_tables = set() if reads_every_row(sql) else tables
+    lines, problems = PLANNERS[connection.vendor](sql, params, scanned_tables)
+    return Plan(sql, lines, problems)
+
+
+def large_tables(min_rows):
+    """Return the tables with `min_rows` rows or more."""
+    tables = set()
+    with connection.cursor() as cursor:
+        for table in connection.introspection.table_names():
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}"
+            )
+            if cursor.fetchone()[0] >= min_rows:
+                tables.add(table)
+    return tables
+
+
+def run(
+    scale=DEFAULT_SCALE,
+    seed="42",
+    workers=1,
+    checks=None,
+    min_rows=MIN_ROWS,
+    log=print,
+):
+    """
+    Seed `scale` of the generator's default volumes into a test database,
+    run `checks` (names from CHECKS, default all) and return
+    `{check: [Plan]}` with the plan of every distinct SELECT they ran.
+    """
+    if connection.vendor not in PLANNERS:
+        raise ValueError(f"Plans cannot be checked on {connection.vendor}.")
+    selected = [check for check in CHECKS if not checks or check[0] in checks]
+    request_logger = logging.getLogger("django.request")
+    level = request_logger.level
+    results = {}
+    with seeded_database(scale, seed, workers, log) as database:
+        _, client, fixture = database
+        with connection.cursor() as cursor:
+            # Planner statistics, as autovacuum keeps them on a live
+            # database.
+            cursor.execute("ANALYZE")
+        tables = large_tables(min_rows)
+        admin_client = Client(SERVER_NAME="localhost", REMOTE_ADDR="10.0.0.1")
+        admin_client.force_login(fixture.admin)
+        admin_client.raise_request_exception = False
+
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            for name, check in selected:
+                recorder = StatementRecorder()
+                with connection.execute_wrapper(recorder):
+                    check(fixture, client, admin_client)
+                allowed = {
+                    *ALLOWED_SCANS[None].get(name, ()),
+                    *ALLOWED_SCANS.get(connection.vendor, {}).get(name, ()),
+                }
+                results[name] = [
+                    explain(sql, params, tables - allowed)
+                    for sql, params in recorder.statements.values()
+                ]
+                problems = sum(len(plan.problems) for plan in results[name])
+                log(
+                    f"{name:<32} {len(results[name]):>3} statements "
+                    f"{problems:>3} problems"
+                )
+        finally:
+            request_logger.setLevel(level)
+    return results
@@ -0,0 +1,200 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from functools import reduce
+from operator import and_
+
+from django.db import connections
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+from storefront.replicas import read_from_primary
+
+from .cache import get_generation
+from .models import Product
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+class PostgresSearchBackend:
+    """
+    Matches against the `search_vector` column, which a trigger keeps in
+    sync with `title` (weight A) and `description` (weight B) and which is
+    covered by a GIN index.
+    """
+
+    config = "english"
+
+    def search(self, queryset, terms):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        tokens = [token for term in terms for token in tokenize(term)]
+        if not tokens:
+            return queryset.none()
+
+        # Prefix matches keep "coff" finding "coffee", like icontains did.
+        # The config drops stopwords, which alone would leave an empty
+        # query matching nothing, so every word also matches as an
+        # unstemmed prefix.
+        query = reduce(
+            and_,
+            [
+                SearchQuery(
+                    f"{token}:*", search_type="raw", config=self.config
+                )
+                | SearchQuery(f"{token}:*", search_type="raw", config="simple")
+                for token in tokens
+            ],
+        )
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(search_rank=SearchRank(F("search_vector"), query))
+            .order_by("-search_rank", "id")
+        )
+
+
+class InvertedIndexSearchBackend:
+    """
+    In-process inverted index over product titles and descriptions.
+
+    Used on databases without full-text search (SQLite in development and
+    tests). The index is built lazily, from the primary, and rebuilt once
+    the Product catalog generation moves on. Every path that writes
+    products bumps it after commit, whichever process made the write.
+    """
+
+    title_weight = 2.0
+    description_weight = 1.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._postings = None
+        self._vocabulary = []
+
+    def search(self, queryset, terms):
+        tokens = [token for term in terms for token in tokenize(term)]
+        if not tokens:
+            return queryset.none()
+
+        scores = self.lookup(tokens)
+        if not scores:
+            return queryset.none()
+
+        # Every match is kept, so that counts and pages cover them all.
+        # As parameters, the ids of a broad search would pass SQLite's
+        # limit of 999 per statement; they are integers from the index,
+        # so they are written into the SQL instead. Scores take few
+        # distinct values, so one WHEN per score keeps the CASE short.
+        buckets = defaultdict(list)
+        for product_id, score in scores.items():
+            buckets[score].append(product_id)
+
+        return (
+            queryset.filter(id__in=_id_list(scores))
+            .annotate(
+                search_rank=Case(
+                    *[
+                        When(id__in=_id_list(product_ids), then=Value(score))
+                        for score, product_ids in buckets.items()
+                    ],
+                    output_field=FloatField(),
+                )
+            )
+            .order_by("-search_rank", "id")
+        )
+
+    def lookup(self, tokens):
+        """
+        Return `{product_id: score}` for products that contain a word
+        starting with every one of `tokens`.
+        """
+        with self._lock:
+            self._ensure_built()
+            result = None
+            for token in tokens:
+                scores = defaultdict(float)
+                start = bisect_left(self._vocabulary, token)
+                for word in self._vocabulary[start:]:
+                    if not word.startswith(token):
+                        break
+                    for product_id, weight in self._postings[word].items():
+                        scores[product_id] += weight
+
+                if result is None:
+                    result = scores
+                else:
+                    result = {
+                        product_id: score + scores[product_id]
+                        for product_id, score in result.items()
+                        if product_id in scores
+                    }
+                if not result:
+                    return {}
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._generation = None
+            self._postings = None
+            self._vocabulary = []
+
+    def _ensure_built(self):
+        # Read before the rows: a write committed in between moves the
+        # generation past this one, and the next lookup rebuilds again.
+        generation = get_generation(Product)
+        if self._postings is not None and generation == self._generation:
+            return
+        postings = defaultdict(dict)
+        with read_from_primary():
+            rows = Product.objects.values_list(
+                "id", "title", "description"
+            ).iterator(chunk_size=5000)
+            for product_id, title, description in rows:
+                self._add(postings, product_id, title, description)
+        self._generation = generation
+        self._postings = postings
+        self._vocabulary = sorted(postings)
+
+    def _add(self, postings, product_id, title, description):
+        weights = defaultdict(float)
+        for token in tokenize(title):
+            weights[token] += self.title_weight
+        for token in tokenize(description):
+            weights[token] += self.description_weight
+
+        for token, weight in weights.items():
+            postings[token][product_id] = weight
+
+
+def _id_list(ids):
+    return RawSQL(",".join(str(int(id_)) for id_ in ids), [])
+
+
+postgres_backend = PostgresSearchBackend()
+inverted_index_backend = InvertedIndexSearchBackend()
+
+
+def get_search_backend(queryset):
+    if connections[queryset.db].vendor == "postgresql":
+        return postgres_backend
+    return inverted_index_backend
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    Drop-in replacement for `SearchFilter` on `ProductList` that uses an
+    indexed full-text backend and orders results by relevance.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend(queryset).search(queryset, terms)
@@ -1,8 +1,38 @@
+from collections import OrderedDict
 from decimal import Decimal
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer
 from djoser.serializers import UserSerializer as BaseUserSerializer
-from store.models import Cart, CartItem, Customer, Product, Collection, Review
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer as BaseTokenObtainPairSerializer,
+    TokenRefreshSerializer as BaseTokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from store.authentication import VERSION_CLAIM, add_claims, get_token_version
+from store.models import (
+    Cart,
+    CartItem,
+    Customer,
+    InventoryHold,
+    MAX_CART_QUANTITY,
+    Order,
+    OrderItem,
+    Product,
+    QuantityTooLarge,
+    Collection,
+    Review,
+)
+
+TAX_RATE = Decimal(1.1)
+
+
+def price_with_tax(unit_price):
+    return round(unit_price * TAX_RATE, 2)
 
 
 class UserCreateSerializer(BaseUserCreateSerializer):
@@ -28,6 +58,22 @@ class UserSerializer(BaseUserSerializer):
         ]
 
 
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs["refresh"])
+        if VERSION_CLAIM in refresh and refresh[VERSION_CLAIM] != (
+            get_token_version(refresh[jwt_settings.USER_ID_CLAIM])
+        ):
+            raise InvalidToken("Token has been revoked")
+        return super().validate(attrs)
+
+
 class CollectionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Collection
@@ -49,6 +95,9 @@ class ProductSerializer(serializers.ModelSerializer):
             "price_with_tax",
             "collection",
         ]
+        # Checkouts change inventory without invalidating the catalog
+        # cache, so it is not part of the cached representation.
+        extra_kwargs = {"inventory": {"write_only": True}}
 
     price_with_tax = serializers.SerializerMethodField(
         method_name="calculate_tax"
@@ -59,7 +108,7 @@ class ProductSerializer(serializers.ModelSerializer):
     # )
 
     def calculate_tax(self, product: Product):
-        return round(product.unit_price * Decimal(1.1), 2)
+        return price_with_tax(product.unit_price)
 
     # def validate(self, data):
     #     if data['password'] != data['confirm_password']:
@@ -84,7 +133,6 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ["id", "date", "name", "description"]
 
     def create(self, validated_data):
-        print("Context: ", self.context)
         product_id = self.context["product_id"]
         return Review.objects.create(product_id=product_id, **validated_data)
 
@@ -104,6 +152,9 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ["id", "product", "quantity", "total_price"]
 
     def get_total_price(self, cart_item: CartItem):
+        # Querysets in store.views annotate the line total in SQL.
+        if hasattr(cart_item, "total_price"):
+            return cart_item.total_price
         return cart_item.quantity * cart_item.product.unit_price
 
 
@@ -117,12 +168,26 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ["id", "items", "total_price"]
 
     def get_total_price(self, cart: Cart):
+        if hasattr(cart, "total_price"):
+            return cart.total_price
         total = 0
         for item in cart.items.all():
             total += item.quantity * item.product.unit_price
         return total
 
 
+class CartSummarySerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(read_only=True)
+    items_count = serializers.IntegerField(read_only=True)
+    total_price = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
+
+    class Meta:
+        model = Cart
+        fields = ["id", "created_at", "items_count", "total_price"]
+
+
 class AddCartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField()
 
@@ -130,40 +195,245 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ["id", "product_id", "quantity"]
 
-    def validate_product_id(self, value):
-        if not Product.objects.filter(pk=value).exists():
-            raise serializers.ValidationError("No product found.")
-        return value
-
     def save(self, **kwargs):
         product_id = self.validated_data["product_id"]
         quantity = self.validated_data["quantity"]
         cart_id = self.context["cart_id"]
 
         try:
-            cart_item = CartItem.objects.get(
-                cart_id=cart_id, product_id=product_id
+            items = CartItem.objects.add_quantities(
+                cart_id, {product_id: quantity}
             )
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            self.instance = CartItem.objects.create(
-                cart_id=cart_id, **self.validated_data
+        except DjangoValidationError:
+            raise NotFound("Cart not found.")
+        except QuantityTooLarge as error:
+            raise serializers.ValidationError(
+                {"quantity": [f"A cart line holds at most {error.limit}."]}
             )
 
+        if not items:
+            if not Cart.objects.filter(pk=cart_id).exists():
+                raise NotFound("Cart not found.")
+            raise serializers.ValidationError(
+                {"product_id": ["No product found."]}
+            )
+
+        self.instance = items[0]
         return self.instance
 
 
+class CartItemOperationSerializer(serializers.Serializer):
+    OP_ADD = "add"
+    OP_UPDATE = "update"
+    OP_REMOVE = "remove"
+
+    op = serializers.ChoiceField(choices=[OP_ADD, OP_UPDATE, OP_REMOVE])
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(
+        min_value=1, max_value=MAX_CART_QUANTITY, required=False
+    )
+
+    def validate(self, data):
+        if data["op"] != self.OP_REMOVE and "quantity" not in data:
+            raise serializers.ValidationError(
+                {"quantity": ["This field is required."]}
+            )
+        return data
+
+
+class BatchCartItemSerializer(serializers.ListSerializer):
+    """
+    Applies a list of add/update/remove operations to a cart with a
+    constant number of statements, whatever the number of lines.
+    """
+
+    child = CartItemOperationSerializer()
+
+    def validate(self, operations):
+        product_ids = {operation["product_id"] for operation in operations}
+        found = set(
+            Product.objects.filter(pk__in=product_ids).values_list(
+                "pk", flat=True
+            )
+        )
+        missing = sorted(product_ids - found)
+        if missing:
+            raise serializers.ValidationError(
+                {"product_id": [f"No product found: {missing}"]}
+            )
+        return operations
+
+    def save(self, **kwargs):
+        cart_id = self.context["cart_id"]
+
+        # Fold the operations per product, in order, into the final
+        # quantity change for that line.
+        adds, sets, removes = {}, {}, set()
+        for operation in self.validated_data:
+            product_id = operation["product_id"]
+            if operation["op"] == CartItemOperationSerializer.OP_REMOVE:
+                adds.pop(product_id, None)
+                sets.pop(product_id, None)
+                removes.add(product_id)
+            elif operation["op"] == CartItemOperationSerializer.OP_UPDATE:
+                adds.pop(product_id, None)
+                removes.discard(product_id)
+                sets[product_id] = operation["quantity"]
+            elif product_id in sets:
+                sets[product_id] += operation["quantity"]
+            elif product_id in removes:
+                removes.discard(product_id)
+                sets[product_id] = operation["quantity"]
+            else:
+                adds[product_id] = (
+                    adds.get(product_id, 0) + operation["quantity"]
+                )
+
+        try:
+            with transaction.atomic():
+                if removes:
+                    CartItem.objects.filter(
+                        cart_id=cart_id, product_id__in=removes
+                    ).delete()
+                    Cart.objects.touch(cart_id)
+                CartItem.objects.add_quantities(cart_id, sets, replace=True)
+                CartItem.objects.add_quantities(cart_id, adds)
+        except DjangoValidationError:
+            raise NotFound("Cart not found.")
+        except QuantityTooLarge as error:
+            raise serializers.ValidationError(
+                f"A cart line holds at most {error.limit}; products "
+                f"{error.product_ids} would go past it."
+            )
+
+
 class UpdateCartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ["quantity"]
 
 
+class InventoryHoldSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = InventoryHold
+        fields = ["product_id", "quantity", "expires_at"]
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = ["product_id", "quantity", "unit_price"]
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(
+        source="orderitem_set", many=True, read_only=True
+    )
+
+    class Meta:
+        model = Order
+        fields = ["id", "customer_id", "placed_at", "payment_status", "items"]
+
+
 class CustomerSerializer(serializers.ModelSerializer):
     user_id = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Customer
         fields = ["id", "user_id", "phone", "birth_date", "membership"]
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path that renders `values()` rows with the same output
+    as `serializer_class`, without building model instances or running the
+    per-field DRF machinery for plain columns.
+
+    Nested serializers read prefixed columns (`product__title`). A
+    `SerializerMethodField` is read from a queryset annotation of the same
+    name, or computed by a `get_<field>(row)` method on the subclass.
+    """
+
+    serializer_class = None
+
+    def __init__(self):
+        self.fields = self._build(self.serializer_class().fields, "")
+
+    def _build(self, fields, prefix):
+        plan = []
+        for name, field in fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                method = getattr(self, f"get_{name}", None)
+                plan.append((name, prefix + name, "method", method))
+            elif isinstance(field, serializers.Serializer):
+                nested = self._build(field.fields, f"{prefix}{field.source}__")
+                plan.append((name, None, "nested", nested))
+            elif isinstance(field, serializers.RelatedField):
+                plan.append(
+                    (name, f"{prefix}{field.source}_id", "plain", None)
+                )
+            elif isinstance(
+                field, (serializers.CharField, serializers.IntegerField)
+            ):
+                plan.append((name, prefix + field.source, "plain", None))
+            else:
+                plan.append(
+                    (
+                        name,
+                        prefix + field.source,
+                        "field",
+                        field.to_representation,
+                    )
+                )
+        return plan
+
+    def get_values_fields(self, plan=None):
+        columns = []
+        if plan is None:
+            plan = self.fields
+        for name, source, kind, extra in plan:
+            if kind == "nested":
+                columns.extend(self.get_values_fields(extra))
+            elif not (kind == "method" and extra is not None):
+                columns.append(source)
+        return columns
+
+    def to_representation(self, row, plan=None):
+        if plan is None:
+            plan = self.fields
+        data = OrderedDict()
+        for name, source, kind, extra in plan:
+            if kind == "nested":
+                data[name] = self.to_representation(row, extra)
+            elif kind == "method" and extra is not None:
+                data[name] = extra(row)
+            else:
+                value = row[source]
+                if kind == "field" and value is not None:
+                    value = extra(value)
+                data[name] = value
+        return data
+
+    def many(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+class ProductValuesSerializer(ValuesSerializer):
+    serializer_class = ProductSerializer
+
+    def get_price_with_tax(self, row):
+        return price_with_tax(row["unit_price"])
+
+
+class CollectionValuesSerializer(ValuesSerializer):
+    serializer_class = CollectionSerializer
+
+
+class CartItemValuesSerializer(ValuesSerializer):
+    serializer_class = CartItemSerializer
+
+
+class CartSummaryValuesSerializer(ValuesSerializer):
+    serializer_class = CartSummarySerializer
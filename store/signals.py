@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import revoke_tokens
+from .cache import bump_generation
+from .models import (
+    UNCACHED_PRODUCT_FIELDS,
+    ClaimsUser,
+    Collection,
+    Customer,
+    Product,
+)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+def invalidate_catalog_cache(sender, using, update_fields=None, **kwargs):
+    if (
+        sender is Product
+        and update_fields is not None
+        and set(update_fields) <= UNCACHED_PRODUCT_FIELDS
+    ):
+        return
+    bump_generation(sender, using=using)
+
+
+# Changes to anything a token carries as a claim revoke the user's tokens.
+USER_CLAIM_FIELDS = ["password", "is_staff", "is_superuser", "is_active"]
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=ClaimsUser)
+@receiver(pre_save, sender=Customer)
+def check_claims_changed(sender, instance, update_fields, using, **kwargs):
+    fields = ["membership"] if sender is Customer else USER_CLAIM_FIELDS
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    # Columns a ClaimsUser never loaded cannot have changed.
+    fields = [
+        field
+        for field in fields
+        if field not in instance.get_deferred_fields()
+    ]
+    if instance.pk is None or not fields:
+        instance._claims_changed = False
+        return
+
+    previous = (
+        sender._base_manager.using(using)
+        .filter(pk=instance.pk)
+        .values(*fields)
+        .first()
+    )
+    instance._claims_changed = previous is not None and any(
+        previous[field] != getattr(instance, field) for field in fields
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
+@receiver(post_save, sender=Customer)
+def revoke_changed_claims(sender, instance, **kwargs):
+    if getattr(instance, "_claims_changed", False):
+        revoke_tokens(instance.user_id if sender is Customer else instance.pk)
+
+
+@receiver(post_delete, sender=Customer)
+def revoke_deleted_customer(sender, instance, using, **kwargs):
+    # After commit: when the customer goes with its user, a token version
+    # row created during the cascade would block deleting the user.
+    transaction.on_commit(lambda: revoke_tokens(instance.user_id), using=using)
@@ -1,3 +1,989 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from base64 import urlsafe_b64encode
+from datetime import datetime, timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.db import connection
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+
+from storefront import slow_queries
+from storefront.asgi import StorefrontASGIHandler
+from storefront.pooled_postgresql.base import DatabaseWrapper
+from storefront.pooled_postgresql.pool import ConnectionPool, PoolTimeout
+from storefront.replicas import (
+    ReplicaRouter,
+    Route,
+    _route,
+    read_from_primary,
+)
+from tags.models import TaggedItem
+
+from .management.commands import benchmark_asgi
+from .management.commands.benchmark_asgi import asgi_get
+from .models import (
+    MAX_HELD_CARTS,
+    Cart,
+    CartItem,
+    Collection,
+    Customer,
+    InsufficientInventory,
+    InventoryHold,
+    InventoryStripe,
+    Order,
+    OrderItem,
+    Product,
+    QuantityTooLarge,
+    UserTokenVersion,
+    restock,
+)
+from .export import export_rows
+from .generator import scaled_volumes
+from .importer import Importer
+from .pagination import KeysetPagination
+from .query_plans import explain
+from .search import inverted_index_backend
+from .serializers import TokenObtainPairSerializer
+
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "catalog": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "test-catalog",
+    },
+}
+
+
+def create_product(inventory=100, collection=None, **fields):
+    if collection is None:
+        collection = Collection.objects.create(title="Test")
+    return Product.objects.create(
+        title=fields.pop("title", "Test product"),
+        slug="test-product",
+        unit_price=fields.pop("unit_price", 10),
+        inventory=inventory,
+        collection=collection,
+        **fields,
+    )
+
+
+class RevokeTokensTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("shopper")
+        self.customer = Customer.objects.create(
+            user=self.user, phone="555-0100"
+        )
+
+    def test_delete_user_with_customer(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(Customer.objects.exists())
+        self.assertFalse(UserTokenVersion.objects.exists())
+
+    def test_delete_customer_revokes_tokens(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.delete()
+
+        self.assertEqual(UserTokenVersion.objects.current(self.user.pk), 1)
+
+
+class InventoryStripeTests(TestCase):
+    def setUp(self):
+        self.product = create_product(inventory=40)
+        # 8 stripes of 5 units.
+        InventoryStripe.objects.allocate(self.product.id, 40, stripes=8)
+        user = User.objects.create_user("shopper")
+        self.customer = Customer.objects.create(user=user, phone="555-0100")
+
+    def available(self):
+        return sum(
+            InventoryStripe.objects.filter(product=self.product).values_list(
+                "available", flat=True
+            )
+        )
+
+    def post_reservation(self, cart, **headers):
+        return self.client.post(
+            f"/store/carts/{cart.id}/reservations/", **headers
+        )
+
+    def test_reservations_need_a_user(self):
+        cart = Cart.objects.create()
+        CartItem.objects.add_quantities(cart.id, {self.product.id: 1})
+
+        self.assertEqual(self.post_reservation(cart).status_code, 401)
+        self.assertFalse(InventoryHold.objects.exists())
+
+    def test_held_carts_per_user(self):
+        token = TokenObtainPairSerializer.get_token(self.customer.user)
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {token.access_token}"}
+        carts = []
+        for _ in range(MAX_HELD_CARTS + 1):
+            cart = Cart.objects.create()
+            CartItem.objects.add_quantities(cart.id, {self.product.id: 1})
+            carts.append(cart)
+
+        for cart in carts[:MAX_HELD_CARTS]:
+            self.assertEqual(
+                self.post_reservation(cart, **auth).status_code, 201
+            )
+        response = self.post_reservation(carts[-1], **auth)
+        self.assertEqual(response.status_code, 400)
+        # Renewing the holds of a cart already held is allowed.
+        response = self.post_reservation(carts[0], **auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.available(), 40 - MAX_HELD_CARTS)
+
+    def test_reserve_more_than_one_stripe(self):
+        cart = Cart.objects.create()
+        holds = InventoryHold.objects.reserve(cart.id, {self.product.id: 12})
+
+        self.assertEqual(sum(hold.quantity for hold in holds), 12)
+        self.assertEqual(self.available(), 28)
+
+    def test_checkout_more_than_one_stripe(self):
+        cart = Cart.objects.create()
+        CartItem.objects.add_quantities(cart.id, {self.product.id: 10})
+
+        order = Order.objects.place_from_cart(cart.id, self.customer.id)
+
+        self.assertEqual(order.orderitem_set.all()[0].quantity, 10)
+        self.assertEqual(self.available(), 30)
+
+    def test_take_more_than_all_stripes(self):
+        self.assertEqual(
+            InventoryStripe.objects.take({self.product.id: 41}), {}
+        )
+        self.assertEqual(self.available(), 40)
+
+        cart = Cart.objects.create()
+        CartItem.objects.add_quantities(cart.id, {self.product.id: 41})
+        with self.assertRaises(InsufficientInventory):
+            Order.objects.place_from_cart(cart.id, self.customer.id)
+        self.assertEqual(self.available(), 40)
+
+
+class ProductsCountTests(TestCase):
+    def setUp(self):
+        self.product = create_product()
+        self.collection = self.product.collection
+
+    def products_count(self, collection):
+        collection.refresh_from_db()
+        return collection.products_count
+
+    def test_save_with_deferred_collection(self):
+        Product.objects.only("title").get(pk=self.product.pk).save()
+
+        self.assertEqual(self.products_count(self.collection), 1)
+
+    def test_move_with_deferred_collection(self):
+        other = Collection.objects.create(title="Other")
+        product = Product.objects.only("title").get(pk=self.product.pk)
+        product.collection = other
+        product.save()
+
+        self.assertEqual(self.products_count(self.collection), 0)
+        self.assertEqual(self.products_count(other), 1)
+
+    def test_save_other_fields_only(self):
+        other = Collection.objects.create(title="Other")
+        self.product.collection = other
+        self.product.save(update_fields=["title"])
+
+        self.assertEqual(self.products_count(self.collection), 1)
+        self.assertEqual(self.products_count(other), 0)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProductListCacheTests(TestCase):
+    def setUp(self):
+        caches["catalog"].clear()
+        create_product()
+
+    def test_cached_list_runs_no_queries(self):
+        path = "/store/products/?ordering=unit_price"
+        first = self.client.get(path)
+        self.assertEqual(first["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(path)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response["ETag"], first["ETag"])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_last_modified_of_the_filtered_products(self):
+        older = create_product()
+        Product.objects.filter(pk=older.pk).update(
+            last_update=datetime(2024, 1, 2, tzinfo=timezone.utc)
+        )
+        path = f"/store/products/?collection_id={older.collection_id}"
+
+        response = self.client.get(path)
+        self.assertEqual(
+            response["Last-Modified"], "Tue, 02 Jan 2024 00:00:00 GMT"
+        )
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                path, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+            )
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(ALLOWED_HOSTS=["a.example", "b.example"])
+    def test_hosts_are_cached_apart(self):
+        self.client.get("/store/products/", HTTP_HOST="a.example")
+
+        response = self.client.get("/store/products/", HTTP_HOST="b.example")
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_inventory_writes_keep_the_cache(self):
+        path = "/store/products/"
+        self.assertNotIn(
+            "inventory", self.client.get(path).json()["results"][0]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            restock({Product.objects.get().id: 5})
+        self.assertEqual(self.client.get(path)["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.update(title="Renamed")
+        self.assertEqual(self.client.get(path)["X-Cache"], "MISS")
+
+
+@override_settings(CACHES=TEST_CACHES)
+class KeysetPaginationTests(TestCase):
+    def test_seek_is_bounded_on_the_first_column(self):
+        queryset = Product.objects.filter(
+            KeysetPagination._seek(("-unit_price", "id"), ["5.00", 3])
+        )
+        sql = str(queryset.query)
+        self.assertIn('"store_product"."unit_price" <= 5.00 AND', sql)
+
+    def test_walk_pages_with_ties(self):
+        collection = Collection.objects.create(title="Test")
+        for index in range(25):
+            create_product(
+                title=f"Product {index % 4}",
+                unit_price=index % 3 + 1,
+                collection=collection,
+            )
+        for ordering in ["title", "-unit_price"]:
+            expected = list(
+                Product.objects.order_by(ordering, "id").values_list(
+                    "id", flat=True
+                )
+            )
+            seen = []
+            path = f"/store/products/?cursor=&ordering={ordering}"
+            while path:
+                data = self.client.get(path).json()
+                seen += [product["id"] for product in data["results"]]
+                path = data["next"]
+            self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_position(self):
+        for ordering, position in [
+            ("title", ["Tea", "not-an-id"]),
+            ("unit_price", ["cheap", 1]),
+            ("last_update", [{"not": "a date"}, 1]),
+        ]:
+            cursor = urlsafe_b64encode(
+                json.dumps({"r": 0, "p": position}).encode()
+            ).decode()
+            response = self.client.get(
+                "/store/products/",
+                {"cursor": cursor, "ordering": ordering},
+            )
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.json()["detail"], "Invalid cursor")
+
+
+def run_in_threads(count, target):
+    """Run `target(index)` on `count` threads started together."""
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def run(index):
+        try:
+            barrier.wait()
+            target(index)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=run, args=(index,)) for index in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+# SQLite's shared-cache test database fails concurrent writers with
+# "database table is locked" instead of waiting for them.
+@skipUnless(
+    connection.vendor == "postgresql", "Concurrent writers need Postgres."
+)
+class ConcurrentCartAddTests(TransactionTestCase):
+    def test_parallel_adds_sum_quantities(self):
+        product = create_product()
+        cart = Cart.objects.create()
+
+        errors = run_in_threads(
+            8,
+            lambda index: [
+                CartItem.objects.add_quantities(cart.id, {product.id: 1})
+                for _ in range(5)
+            ],
+        )
+
+        self.assertEqual(errors, [])
+        item = CartItem.objects.get(cart=cart, product=product)
+        self.assertEqual(item.quantity, 40)
+
+
+class CartItemQuantityLimitTests(TestCase):
+    def test_add_past_limit_changes_nothing(self):
+        first, second = create_product(), create_product()
+        cart = Cart.objects.create()
+        CartItem.objects.add_quantities(cart.id, {first.id: 32767})
+
+        with self.assertRaises(QuantityTooLarge) as raised:
+            CartItem.objects.add_quantities(
+                cart.id, {first.id: 1, second.id: 1}
+            )
+
+        self.assertEqual(raised.exception.product_ids, [first.id])
+        self.assertEqual(
+            dict(
+                CartItem.objects.filter(cart=cart).values_list(
+                    "product_id", "quantity"
+                )
+            ),
+            {first.id: 32767},
+        )
+
+    def test_add_past_limit_is_a_bad_request(self):
+        product = create_product()
+        cart = Cart.objects.create()
+        CartItem.objects.add_quantities(cart.id, {product.id: 32767})
+
+        response = self.client.post(
+            f"/store/carts/{cart.id}/items/",
+            {"product_id": product.id, "quantity": 1},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("quantity", response.json())
+        self.assertEqual(CartItem.objects.get(cart=cart).quantity, 32767)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CheckoutTests(TransactionTestCase):
+    def setUp(self):
+        caches["catalog"].clear()
+        self.collection = Collection.objects.create(title="Test")
+        user = User.objects.create_user("shopper")
+        self.customer = Customer.objects.create(user=user, phone="555-0100")
+
+    def make_cart(self, products):
+        cart = Cart.objects.create()
+        CartItem.objects.add_quantities(
+            cart.id, {product.id: 1 for product in products}
+        )
+        return cart.id
+
+    def test_statements_do_not_depend_on_cart_size(self):
+        products = [
+            create_product(collection=self.collection) for _ in range(20)
+        ]
+        counts = []
+        for size in [1, 5, 20]:
+            cart_id = self.make_cart(products[:size])
+            with CaptureQueriesContext(connection) as queries:
+                order = Order.objects.place_from_cart(
+                    cart_id, self.customer.id
+                )
+            self.assertEqual(len(order.orderitem_set.all()), size)
+            counts.append(len(queries.captured_queries))
+
+        self.assertEqual(len(set(counts)), 1, counts)
+
+    @skipUnless(
+        connection.vendor == "postgresql", "Concurrent writers need Postgres."
+    )
+    def test_parallel_checkouts_do_not_oversell(self):
+        hot = create_product(inventory=5, collection=self.collection)
+        other = create_product(collection=self.collection)
+        cart_ids = [self.make_cart([hot, other]) for _ in range(16)]
+        placed = []
+
+        def checkout(index):
+            try:
+                Order.objects.place_from_cart(
+                    cart_ids[index], self.customer.id
+                )
+                placed.append(index)
+            except InsufficientInventory:
+                pass
+
+        errors = run_in_threads(len(cart_ids), checkout)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(placed), 5)
+        hot.refresh_from_db()
+        self.assertEqual(hot.inventory, 0)
+        self.assertEqual(OrderItem.objects.filter(product=hot).count(), 5)
+
+
+def index_name(model, *fields):
+    """Return the name of the Meta index of `model` on `fields`."""
+    for index in model._meta.indexes:
+        if tuple(index.fields) == fields:
+            return index.name
+    raise LookupError(fields)
+
+
+@skipUnless(connection.vendor == "postgresql", "Plans are read on Postgres.")
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        with connection.cursor() as cursor:
+            # Test tables are tiny, so a scan would otherwise always win.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, name):
+        plan = explain(
+            *queryset.query.sql_with_params(), {queryset.model._meta.db_table}
+        )
+        self.assertEqual(plan.problems, [], plan.lines)
+        self.assertIn(name, "\n".join(plan.lines))
+
+    def test_product_list_shapes(self):
+        self.assertUsesIndex(
+            Product.objects.order_by("title", "id")[:10],
+            index_name(Product, "title", "id"),
+        )
+        self.assertUsesIndex(
+            Product.objects.filter(
+                KeysetPagination._seek(("-unit_price", "id"), ["5.00", 3])
+            ).order_by("-unit_price", "-id")[:10],
+            index_name(Product, "unit_price", "id"),
+        )
+        self.assertUsesIndex(
+            Product.objects.filter(collection_id=1).order_by("title", "id")[
+                :10
+            ],
+            index_name(Product, "collection", "title", "id"),
+        )
+        self.assertUsesIndex(
+            Product.objects.filter(
+                collection_id=1, unit_price__gte=5
+            ).order_by("unit_price", "id")[:10],
+            index_name(Product, "collection", "unit_price", "id"),
+        )
+
+    def test_order_list_shape(self):
+        self.assertUsesIndex(
+            Order.objects.order_by("placed_at", "id")[:10],
+            index_name(Order, "placed_at", "id"),
+        )
+
+    def test_customer_ordering_uses_user_names(self):
+        self.assertUsesIndex(
+            Customer.objects.select_related("user")[:10],
+            "store_auth_user_name_idx",
+        )
+
+    def test_tagged_items_of_an_object(self):
+        self.assertUsesIndex(
+            TaggedItem.objects.filter(
+                content_type=ContentType.objects.get_for_model(Product),
+                object_id=1,
+            ),
+            index_name(TaggedItem, "content_type", "object_id"),
+        )
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        token = _route.set(Route(use_replicas=True))
+        self.addCleanup(_route.reset, token)
+
+    @mock.patch("storefront.replicas.choose_replica", return_value="replica")
+    def test_replica_is_chosen_once_per_request(self, choose_replica):
+        for _ in range(3):
+            self.assertEqual(self.router.db_for_read(Product), "replica")
+
+        choose_replica.assert_called_once_with()
+
+    @mock.patch("storefront.replicas.choose_replica", return_value="replica")
+    def test_read_from_primary(self, choose_replica):
+        with read_from_primary():
+            self.assertIsNone(self.router.db_for_read(Product))
+        choose_replica.assert_not_called()
+
+    @override_settings(CACHES=TEST_CACHES, DATABASE_REPLICAS={"replica": 1})
+    @mock.patch("storefront.replicas.choose_replica", return_value="replica")
+    def test_catalog_cache_is_filled_from_the_primary(self, choose_replica):
+        caches["catalog"].clear()
+        create_product()
+
+        # "replica" is not a configured database, so reading from it fails.
+        response = self.client.get("/store/products/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertNotIn("replica", response["X-DB-Route"])
+
+    @mock.patch("storefront.replicas.choose_replica", return_value="default")
+    def test_export_database_is_chosen_within_the_request(
+        self, choose_replica
+    ):
+        create_product()
+        columns, rows = export_rows("products")
+
+        # The response streams the rows after the middleware returned.
+        with mock.patch.object(ReplicaRouter, "db_for_read") as db_for_read:
+            self.assertEqual(len(list(rows)), 1)
+
+        db_for_read.assert_not_called()
+
+
+@override_settings(METRICS={"TOKEN": "secret", "ALLOWED_IPS": ["10.0.0.9"]})
+class MetricsAccessTests(TestCase):
+    def test_anonymous_is_refused(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get(
+            "/metrics", HTTP_AUTHORIZATION="Bearer wrong"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_token(self):
+        response = self.client.get(
+            "/metrics", HTTP_AUTHORIZATION="Bearer secret"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_allowed_ip(self):
+        response = self.client.get("/metrics", REMOTE_ADDR="10.0.0.9")
+        self.assertEqual(response.status_code, 200)
+
+    def test_loopback_is_not_trusted_by_default(self):
+        with self.settings(METRICS={"TOKEN": "secret"}):
+            response = self.client.get("/metrics", REMOTE_ADDR="127.0.0.1")
+        self.assertEqual(response.status_code, 403)
+
+    @mock.patch(
+        "storefront.metrics.pool_stats",
+        return_value={"default/store": {"size": 2}},
+    )
+    def test_pools_are_labelled_by_database(self, pool_stats):
+        response = self.client.get(
+            "/metrics", HTTP_AUTHORIZATION="Bearer secret"
+        )
+
+        self.assertIn(
+            'storefront_db_pool{pool="default/store",stat="size"} 2',
+            response.content.decode(),
+        )
+
+    def test_staff(self):
+        user = User.objects.create_user("shopper")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+
+class ImporterTests(TestCase):
+    def test_inserts_many_rows_per_statement(self):
+        start = Collection.objects.count() + 1000
+        rows = [
+            {"id": id_, "title": f"C{id_}"}
+            for id_ in range(start, start + 1000)
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            Importer(batch_size=1000, use_copy=False).load("collections", rows)
+
+        inserts = [
+            query["sql"] for query in queries if "INSERT INTO" in query["sql"]
+        ]
+        # executemany() is logged once, as "1000 times: INSERT ...".
+        self.assertFalse(any("times:" in sql for sql in inserts))
+        self.assertLess(len(inserts), 10)
+        self.assertEqual(
+            Collection.objects.filter(id__gte=start).count(), 1000
+        )
+
+
+class CartItemBatchTests(TestCase):
+    def test_batch_to_malformed_cart_id(self):
+        response = self.client.post(
+            "/store/carts/bad/items/", [], content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch_adds_items(self):
+        product = create_product()
+        cart = Cart.objects.create()
+
+        response = self.client.post(
+            f"/store/carts/{cart.id}/items/",
+            [
+                {"op": "add", "product_id": product.id, "quantity": 2},
+                {"op": "add", "product_id": product.id, "quantity": 1},
+            ],
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CartItem.objects.get(cart=cart).quantity, 3)
+
+    def test_batch_past_limit_changes_nothing(self):
+        first, second = create_product(), create_product()
+        cart = Cart.objects.create()
+        CartItem.objects.add_quantities(cart.id, {first.id: 5})
+
+        response = self.client.post(
+            f"/store/carts/{cart.id}/items/",
+            [
+                {"op": "remove", "product_id": first.id},
+                {"op": "add", "product_id": second.id, "quantity": 20000},
+                {"op": "add", "product_id": second.id, "quantity": 20000},
+            ],
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            dict(
+                CartItem.objects.filter(cart=cart).values_list(
+                    "product_id", "quantity"
+                )
+            ),
+            {first.id: 5},
+        )
+
+
+# asgi_get() sends the benchmark's Host header.
+@override_settings(ASGI_MAX_CONCURRENCY=1, ALLOWED_HOSTS=[benchmark_asgi.HOST])
+class ASGIHandlerTests(SimpleTestCase):
+    def test_body_is_read_without_holding_a_worker(self):
+        handler = StorefrontASGIHandler()
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/missing/",
+            "query_string": b"",
+            "headers": [(b"host", benchmark_asgi.HOST.encode())],
+        }
+
+        async def main():
+            body_sent = asyncio.Event()
+
+            async def receive():
+                await body_sent.wait()
+                return {"type": "http.request", "body": b"{}"}
+
+            async def send(message):
+                pass
+
+            upload = asyncio.ensure_future(handler(scope, receive, send))
+            # The only worker is free while the upload waits for its body.
+            status = await asyncio.wait_for(asgi_get(handler, "/missing/"), 5)
+            body_sent.set()
+            await upload
+            return status
+
+        self.assertEqual(asyncio.run(main()), 404)
+
+
+class SlowQueryLogTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "slow.jsonl")
+        settings = override_settings(
+            SLOW_QUERY_LOG={"PATH": self.path, "EXPLAIN_SAMPLE_RATE": 0}
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def capture(self, log, sql):
+        request = RequestFactory().get("/store/products/")
+        log.capture(
+            request,
+            "ProductList",
+            [slow_queries.SlowQuery("default", sql, [], 1)],
+        )
+
+    def test_reopens_the_file_once_rotated(self):
+        log = slow_queries.SlowQueryLog()
+        self.addCleanup(lambda: log._handler.close())
+        self.capture(log, "SELECT 1")
+        # As logrotate does, while the process keeps running.
+        os.rename(self.path, self.path + ".1")
+        self.capture(log, "SELECT 2")
+
+        with open(self.path, encoding="utf-8") as file:
+            self.assertIn('"SELECT 2"', file.read())
+        self.assertEqual(
+            [entry["sql"] for entry in log.entries()], ["SELECT 1", "SELECT 2"]
+        )
+
+    def rotating_logs(self, count, backups):
+        config = {
+            "PATH": self.path,
+            "EXPLAIN_SAMPLE_RATE": 0,
+            # About two entries per file.
+            "MAX_BYTES": 600,
+            "BACKUP_COUNT": backups,
+        }
+        with self.settings(SLOW_QUERY_LOG=config):
+            logs = [slow_queries.SlowQueryLog() for _ in range(count)]
+            for log in logs:
+                log._get_handler()
+                self.addCleanup(lambda log=log: log._handler.close())
+        return logs
+
+    def test_rotates_at_max_bytes(self):
+        (log,) = self.rotating_logs(1, backups=2)
+        for index in range(10):
+            self.capture(log, f"SELECT {index}")
+
+        self.assertFalse(os.path.exists(self.path + ".3"))
+        sql = [entry["sql"] for entry in log.entries()]
+        self.assertLess(len(sql), 10)
+        self.assertEqual(
+            sql, [f"SELECT {index}" for index in range(10)][-len(sql) :]
+        )
+
+    def test_processes_share_rotations(self):
+        # One log per process, each with its own handler.
+        logs = self.rotating_logs(2, backups=20)
+        for index in range(10):
+            self.capture(logs[index % 2], f"SELECT {index}")
+
+        self.assertEqual(
+            [entry["sql"] for entry in logs[0].entries()],
+            [f"SELECT {index}" for index in range(10)],
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        caches["catalog"].clear()
+        inverted_index_backend.reset()
+
+    def search(self, text):
+        data = self.client.get("/store/products/", {"search": text}).json()
+        return [product["title"] for product in data["results"]]
+
+    @skipUnless(connection.vendor == "sqlite", "Tests the SQLite backend.")
+    def test_every_match_is_paginated(self):
+        collection = Collection.objects.create(title="Test")
+        Product.objects.bulk_create(
+            Product(
+                title="Tea tea" if i % 2 else "Tea",
+                slug="tea",
+                unit_price=1,
+                inventory=1,
+                collection=collection,
+            )
+            for i in range(1000)
+        )
+
+        first = self.client.get("/store/products/", {"search": "tea"}).json()
+        last = self.client.get(
+            "/store/products/", {"search": "tea", "page": 100}
+        ).json()
+
+        self.assertEqual(first["count"], 1000)
+        titles = {product["title"] for product in first["results"]}
+        self.assertEqual(titles, {"Tea tea"})
+        titles = {product["title"] for product in last["results"]}
+        self.assertEqual(titles, {"Tea"})
+
+    @skipUnless(connection.vendor == "sqlite", "Tests the SQLite backend.")
+    def test_index_follows_the_product_generation(self):
+        collection = Collection.objects.create(title="Test")
+        self.assertEqual(self.search("tea"), [])
+
+        # Sends no signals, like a write from another process.
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.bulk_create(
+                [
+                    Product(
+                        title="Tea",
+                        slug="tea",
+                        unit_price=1,
+                        inventory=1,
+                        collection=collection,
+                    )
+                ]
+            )
+
+        self.assertEqual(self.search("tea"), ["Tea"])
+
+    @skipUnless(
+        connection.vendor == "postgresql", "Tests the Postgres backend."
+    )
+    def test_stopwords(self):
+        create_product(title="The Theater")
+
+        self.assertEqual(self.search("the"), ["The Theater"])
+        self.assertEqual(self.search("the theater"), ["The Theater"])
+
+
+class FakeConnection:
+    def __init__(self):
+        self.broken = False
+        self.closed = False
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **options):
+        def ping(connection):
+            if connection.broken:
+                raise OSError("server closed the connection")
+
+        def close(connection):
+            connection.closed = True
+
+        return ConnectionPool(
+            connect=FakeConnection,
+            ping=ping,
+            reset=ping,
+            close=close,
+            **options,
+        )
+
+    def test_checkout_and_return(self):
+        pool = self.make_pool()
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertIsNot(first, second)
+
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+
+        stats = pool.stats()
+        self.assertEqual(stats["opened"], 2)
+        self.assertEqual(stats["checkouts"], 3)
+        self.assertEqual(stats["in_use"], 2)
+
+    def test_waits_for_a_release_up_to_max_size(self):
+        pool = self.make_pool(max_size=1, max_wait=5)
+        connection = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, [connection])
+        timer.start()
+
+        self.assertIs(pool.acquire(), connection)
+        timer.join()
+        self.assertEqual(pool.stats()["waits"], 1)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_times_out_at_max_size(self):
+        pool = self.make_pool(max_size=2, max_wait=0.05)
+        pool.acquire()
+        pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = self.make_pool(max_size=1, max_wait=0.05)
+
+        def fail():
+            raise OSError("could not connect")
+
+        with self.assertRaises(OSError):
+            pool.acquire(fail)
+        self.assertIsInstance(pool.acquire(), FakeConnection)
+
+    def test_discards_connection_broken_while_checked_out(self):
+        pool = self.make_pool(max_size=1)
+        connection = pool.acquire()
+        connection.broken = True
+        pool.release(connection)
+
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.acquire(), connection)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_discards_connection_failing_its_ping(self):
+        pool = self.make_pool(max_size=1, ping_after=0)
+        connection = pool.acquire()
+        pool.release(connection)
+        connection.broken = True
+
+        self.assertIsNot(pool.acquire(), connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()["ping_failures"], 1)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_discards_on_request_and_when_idle_too_long(self):
+        pool = self.make_pool(idle_timeout=0)
+        discarded = pool.acquire()
+        pool.release(discarded, discard=True)
+        stale = pool.acquire()
+        pool.release(stale)
+
+        self.assertIsNot(pool.acquire(), stale)
+        self.assertTrue(discarded.closed)
+        self.assertTrue(stale.closed)
+        self.assertEqual(pool.stats()["closed"], 2)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    @mock.patch.dict("storefront.pooled_postgresql.pool._pools", clear=True)
+    def test_one_pool_per_database(self):
+        # As when the test runner switches NAME to the test database.
+        pools = [
+            DatabaseWrapper({"NAME": name}, "default").pool
+            for name in ["store", "test_store", "store"]
+        ]
+
+        self.assertIsNot(pools[0], pools[1])
+        self.assertIs(pools[0], pools[2])
+
+
+class ScaledVolumesTests(SimpleTestCase):
+    def test_scales_counts_but_not_items_per_row(self):
+        volumes = scaled_volumes(
+            0.01, {"products": 10_000, "tags": 50, "items_per_order": 3}
+        )
+
+        self.assertEqual(
+            volumes, {"products": 100, "tags": 1, "items_per_order": 3}
+        )
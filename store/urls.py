@@ -24,10 +24,15 @@ urlpatterns = [
         views.CollectionDetail.as_view(),
         name="collection-detail",
     ),
+    path("catalog-cache/stats/", views.CatalogCacheStatsView.as_view()),
+    path("db-pool/stats/", views.DatabasePoolStatsView.as_view()),
     path("carts/", views.CartListView.as_view()),
     path("carts/<str:pk>/", views.CartView.as_view()),
     path("carts/<str:pk>/items/", views.CartItemView.as_view()),
     path("carts/<str:pk>/items/<int:id>/", views.CartSingleItemView.as_view()),
+    path("carts/<str:pk>/reservations/", views.ReservationView.as_view()),
+    path("carts/<str:pk>/checkout/", views.CheckoutView.as_view()),
     path("customers/", views.CustomerView.as_view()),
     path("customers/me/", views.CustomerProfileView.as_view()),
+    path("exports/<str:name>/", views.ExportView.as_view()),
 ]
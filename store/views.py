@@ -1,5 +1,21 @@
-from django.shortcuts import get_object_or_404
-from django.db.models.aggregates import Count
+from decimal import Decimal
+from uuid import UUID
+
+from django.http import StreamingHttpResponse
+from django.db.models import (
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Max,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Sum,
+    Value,
+    prefetch_related_objects,
+)
+from django.db.models.functions import Coalesce
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.mixins import RetrieveModelMixin
@@ -12,32 +28,100 @@ from rest_framework.generics import (
     RetrieveUpdateAPIView,
     RetrieveUpdateDestroyAPIView,
     UpdateAPIView,
+    get_object_or_404,
 )
 from rest_framework.views import APIView
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+
+from storefront.pooled_postgresql.pool import pool_stats
+from storefront.replicas import read_from_primary
+from store.cache import (
+    CatalogCacheMixin,
+    ConditionalGetMixin,
+    get_catalog_cache,
+    get_generation,
+    normalized_query_string,
+    stats as catalog_cache_stats,
+)
+from store.export import EXPORTS, FORMATS, RENDERERS, export_rows, parse_since
 from store.filters import ProductFilter
-from store.pagination import DefaultPagination
+from store.pagination import (
+    CartPagination,
+    DefaultPagination,
+    KeysetPagination,
+)
 from store.permissions import IsAdminOrReadOnly
-from .models import Cart, CartItem, Collection, Product, Review, Customer
+from store.search import ProductSearchFilter
+from .models import (
+    Cart,
+    CartItem,
+    Collection,
+    Customer,
+    InsufficientInventory,
+    InventoryHold,
+    Order,
+    Product,
+    Review,
+    TooManyHeldCarts,
+)
 from .serializers import (
     AddCartItemSerializer,
+    BatchCartItemSerializer,
+    CartItemValuesSerializer,
     CartItemSerializer,
     CartSerializer,
+    CartSummaryValuesSerializer,
     CollectionSerializer,
+    CollectionValuesSerializer,
     CustomerSerializer,
+    InventoryHoldSerializer,
+    OrderSerializer,
     ProductSerializer,
+    ProductValuesSerializer,
     ReviewSerializer,
     UpdateCartItemSerializer,
 )
 
 
-class ProductList(ListCreateAPIView):
+class ValuesListMixin:
+    """
+    Serves GET list requests from `values()` rows through
+    `values_serializer_class` instead of model instances. Columns in
+    `ordering_fields` are fetched too so that keyset cursors can be built.
+    """
+
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.values_serializer_class()
+        columns = serializer.get_values_fields()
+        for field in getattr(self, "ordering_fields", None) or []:
+            if field not in columns:
+                columns.append(field)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.prefetch_related(None).values(*columns)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.many(page))
+        return Response(serializer.many(queryset))
+
+
+class ProductList(
+    ConditionalGetMixin, CatalogCacheMixin, ValuesListMixin, ListCreateAPIView
+):
+    cache_models = [Product]
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    values_serializer_class = ProductValuesSerializer
+    filter_backends = [
+        DjangoFilterBackend,
+        ProductSearchFilter,
+        OrderingFilter,
+    ]
     # filterset_fields = ["collection_id"]
     filterset_class = ProductFilter
     pagination_class = DefaultPagination
@@ -53,9 +137,45 @@ class ProductList(ListCreateAPIView):
 
     #     return queryset
 
+    @property
+    def paginator(self):
+        # `?cursor=` switches to keyset pagination, which seeks on the sort
+        # key and skips the COUNT(*) that page numbers need.
+        if not hasattr(self, "_paginator"):
+            if (
+                KeysetPagination.cursor_query_param
+                in self.request.query_params
+            ):
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_serializer_context(self):
         return {"request": self.request}
 
+    def get_validators(self, request, *args, **kwargs):
+        # The ETag covers the path and query string; the generation changes
+        # on every write to what the list shows, so validating costs no
+        # query. The newest last_update of the filtered products is cached
+        # per generation as well, so only the first request of a generation
+        # aggregates it. Inventory-only writes touch last_update without a
+        # new generation, like the body, which leaves inventory out.
+        generation = get_generation(Product)
+        cache = get_catalog_cache()
+        key = (
+            f"last-modified:{type(self).__name__}:{generation}:"
+            f"{request.path}?{normalized_query_string(request)}"
+        )
+        cached = cache.get(key)
+        if cached is None:
+            with read_from_primary():
+                cached = self.filter_queryset(self.get_queryset()).aggregate(
+                    last_modified=Max("last_update")
+                )
+            cache.set(key, cached, self.cache_timeout)
+        return generation, cached["last_modified"]
+
 
 # @api_view(["GET", "POST"])
 # def product_list(request):
@@ -72,10 +192,21 @@ class ProductList(ListCreateAPIView):
 #         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class ProductDetail(RetrieveUpdateDestroyAPIView):
+class ProductDetail(
+    ConditionalGetMixin, CatalogCacheMixin, RetrieveUpdateDestroyAPIView
+):
+    cache_models = [Product]
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
 
+    def get_validators(self, request, pk):
+        last_update = (
+            Product.objects.filter(pk=pk)
+            .values_list("last_update", flat=True)
+            .first()
+        )
+        return last_update, last_update
+
     def delete(self, request, pk):
         product = get_object_or_404(Product, id=pk)
         if product.orderitems.count() > 0:
@@ -112,11 +243,18 @@ class ProductDetail(RetrieveUpdateDestroyAPIView):
 #         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class CollectionList(ListCreateAPIView):
-    queryset = Collection.objects.annotate(
-        products_count=Count("product")
-    ).all()
+class CollectionList(
+    ConditionalGetMixin, CatalogCacheMixin, ValuesListMixin, ListCreateAPIView
+):
+    cache_models = [Collection]
+    queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
+    values_serializer_class = CollectionValuesSerializer
+
+    def get_validators(self, request):
+        # Collections have no modification time; their cache generation
+        # changes on every write, including products_count updates.
+        return get_generation(Collection), None
 
 
 # @api_view(["GET", "POST"])
@@ -134,12 +272,16 @@ class CollectionList(ListCreateAPIView):
 #         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class CollectionDetail(RetrieveUpdateDestroyAPIView):
-    queryset = Collection.objects.annotate(
-        products_count=Count("product")
-    ).all()
+class CollectionDetail(
+    ConditionalGetMixin, CatalogCacheMixin, RetrieveUpdateDestroyAPIView
+):
+    cache_models = [Collection]
+    queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
 
+    def get_validators(self, request, pk):
+        return get_generation(Collection), None
+
     def delete(self, request, pk):
         collection = get_object_or_404(Collection, id=pk)
         if collection.product_set.count() > 0:
@@ -178,6 +320,20 @@ class CollectionDetail(RetrieveUpdateDestroyAPIView):
 #         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class CatalogCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(catalog_cache_stats.as_dict())
+
+
+class DatabasePoolStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(pool_stats())
+
+
 class ReviewList(ListCreateAPIView):
     serializer_class = ReviewSerializer
 
@@ -196,26 +352,127 @@ class ReviewDetail(RetrieveUpdateDestroyAPIView):
         return Review.objects.filter(product_id=self.kwargs["pk"])
 
 
-class CartListView(ListCreateAPIView):
-    queryset = Cart.objects.prefetch_related("items__product").all()
+PRICE_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+def cart_items_queryset():
+    """
+    Cart items with the line total computed by the database. Products are
+    prefetched once per distinct product and only with the columns
+    `SimpleProductSerializer` reads.
+    """
+    return CartItem.objects.annotate(
+        total_price=ExpressionWrapper(
+            F("quantity") * F("product__unit_price"),
+            output_field=PRICE_FIELD,
+        )
+    ).prefetch_related(
+        Prefetch(
+            "product",
+            queryset=Product.objects.only("id", "title", "unit_price"),
+        )
+    )
+
+
+def carts_queryset():
+    return Cart.objects.prefetch_related(
+        Prefetch("items", queryset=cart_items_queryset())
+    ).annotate(
+        total_price=Coalesce(
+            Sum(
+                F("items__quantity") * F("items__product__unit_price"),
+                output_field=PRICE_FIELD,
+            ),
+            Value(Decimal(0)),
+            output_field=PRICE_FIELD,
+        )
+    )
+
+
+def cart_summaries_queryset():
+    # Correlated subqueries rather than a join and GROUP BY, so that only
+    # the carts on the requested page are aggregated.
+    items = (
+        CartItem.objects.filter(cart_id=OuterRef("pk"))
+        .order_by()
+        .values("cart_id")
+    )
+    return Cart.objects.annotate(
+        items_count=Coalesce(
+            Subquery(items.annotate(count=Count("id")).values("count")),
+            0,
+        ),
+        total_price=Coalesce(
+            Subquery(
+                items.annotate(
+                    total=Sum(
+                        F("quantity") * F("product__unit_price"),
+                        output_field=PRICE_FIELD,
+                    )
+                ).values("total")
+            ),
+            Value(Decimal(0)),
+            output_field=PRICE_FIELD,
+        ),
+    )
+
+
+class CartListView(ValuesListMixin, ListCreateAPIView):
+    """
+    Lists carts newest first, one keyset page at a time, as summaries with
+    the item count and total computed in SQL. `?expand=items` returns full
+    carts with their items instead, prefetched for the page only.
+    """
+
     serializer_class = CartSerializer
+    values_serializer_class = CartSummaryValuesSerializer
+    pagination_class = CartPagination
+
+    def get_queryset(self):
+        return cart_summaries_queryset()
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("expand") != "items":
+            return super().list(request, *args, **kwargs)
+
+        page = self.paginate_queryset(self.get_queryset())
+        prefetch_related_objects(
+            page, Prefetch("items", queryset=cart_items_queryset())
+        )
+        return self.get_paginated_response(
+            CartSerializer(page, many=True).data
+        )
 
 
 class CartView(RetrieveDestroyAPIView):
-    queryset = Cart.objects.prefetch_related("items__product").all()
+    queryset = carts_queryset()
     serializer_class = CartSerializer
 
 
-class CartItemView(ListCreateAPIView, RetrieveDestroyAPIView):
+class CartItemView(ValuesListMixin, ListCreateAPIView, RetrieveDestroyAPIView):
+    values_serializer_class = CartItemValuesSerializer
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+
+        # A list body is a batch of add/update/remove operations; respond
+        # with the resulting cart.
+        serializer = BatchCartItemSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        cart = get_object_or_404(carts_queryset(), pk=self.kwargs["pk"])
+        return Response(CartSerializer(cart).data)
+
     def get_serializer_class(self):
         if self.request.method == "POST":
             return AddCartItemSerializer
         return CartItemSerializer
 
     def get_queryset(self):
-        return CartItem.objects.filter(
-            cart_id=self.kwargs["pk"]
-        ).select_related("product")
+        return cart_items_queryset().filter(cart_id=self.kwargs["pk"])
 
     def get_serializer_context(self):
         return {"cart_id": self.kwargs["pk"]}
@@ -234,6 +491,87 @@ class CartSingleItemView(RetrieveUpdateDestroyAPIView):
         return CartItem.objects.filter(cart_id=self.kwargs["pk"])
 
 
+class ReservationView(APIView):
+    """
+    Holds inventory for every item of the cart for a limited time, so that
+    checkout only has to convert the holds. Products whose stock is not
+    striped are not held and are returned without a hold. A user holds
+    inventory for at most MAX_HELD_CARTS carts at a time.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        try:
+            cart_id = UUID(pk)
+        except ValueError:
+            raise NotFound("Cart not found.")
+        if not Cart.objects.filter(pk=cart_id).exists():
+            raise NotFound("Cart not found.")
+
+        quantities = dict(
+            CartItem.objects.filter(cart_id=cart_id).values_list(
+                "product_id", "quantity"
+            )
+        )
+        try:
+            holds = InventoryHold.objects.reserve(
+                cart_id, quantities, user_id=request.user.id
+            )
+        except TooManyHeldCarts as error:
+            raise ValidationError(
+                {
+                    "cart": [
+                        f"Inventory is already held for {error.limit} "
+                        f"other carts."
+                    ]
+                }
+            )
+        return Response(
+            InventoryHoldSerializer(holds, many=True).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class CheckoutView(APIView):
+    """
+    Places an order for the current customer from the cart's items,
+    decrementing inventory, and deletes the cart.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        try:
+            cart_id = UUID(pk)
+        except ValueError:
+            raise NotFound("Cart not found.")
+        customer_id = getattr(request.user, "customer_id", None)
+        if customer_id is None:
+            customer_id = get_object_or_404(
+                Customer, user_id=request.user.id
+            ).id
+
+        try:
+            order = Order.objects.place_from_cart(cart_id, customer_id)
+        except InsufficientInventory as error:
+            raise ValidationError(
+                {
+                    "product_id": [
+                        f"Not enough inventory for {error.product_ids}."
+                    ]
+                }
+            )
+        if order is None:
+            if not Cart.objects.filter(pk=cart_id).exists():
+                raise NotFound("Cart not found.")
+            raise ValidationError({"cart": ["The cart is empty."]})
+
+        return Response(
+            OrderSerializer(order).data, status=status.HTTP_201_CREATED
+        )
+
+
 class CustomerView(CreateAPIView):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
@@ -245,10 +583,46 @@ class CustomerProfileView(RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        print(self.request.user.id)
         return Customer.objects.all()
 
     def get_object(self):
         queryset = self.get_queryset()
+        # Tokens from ClaimsJWTAuthentication carry the customer id.
+        customer_id = getattr(self.request.user, "customer_id", None)
+        if customer_id is not None:
+            return get_object_or_404(queryset, pk=customer_id)
         obj = get_object_or_404(queryset, user_id=self.request.user.id)
         return obj
+
+
+class ExportView(APIView):
+    """
+    Streams a full table as NDJSON (`?output=ndjson`, the default) or CSV,
+    optionally limited to rows changed or placed since `?since=`.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, name):
+        if name not in EXPORTS:
+            raise NotFound(f"Unknown export: {name}")
+
+        output = request.query_params.get("output", "ndjson")
+        if output not in FORMATS:
+            raise ValidationError({"output": [f"Choose from {list(FORMATS)}"]})
+
+        since = request.query_params.get("since")
+        if since:
+            try:
+                since = parse_since(since)
+            except ValueError as error:
+                raise ValidationError({"since": [str(error)]})
+
+        columns, rows = export_rows(name, since=since or None)
+        response = StreamingHttpResponse(
+            RENDERERS[output](columns, rows), content_type=FORMATS[output]
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{name}.{output}"'
+        )
+        return response
@@ -7,10 +7,98 @@ For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
 
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core import signals
+from django.core.exceptions import RequestAborted
+from django.core.handlers.asgi import ASGIHandler
+from django.http import FileResponse
+from django.urls import set_script_prefix
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'storefront.settings')
 
+
+class StorefrontASGIHandler(ASGIHandler):
+    """
+    Django 3.2 runs every sync view and middleware of every request on
+    one thread per process, so under ASGI requests are served one at a
+    time. This handler reads each request's body on the event loop, then
+    serves the request on one of settings.ASGI_MAX_CONCURRENCY worker
+    threads, kept for the whole request as Django 4.0 does. Requests
+    beyond that wait on the event loop without holding a thread or a
+    database connection.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.executors = [
+            ThreadPoolExecutor(max_workers=1)
+            for _ in range(settings.ASGI_MAX_CONCURRENCY)
+        ]
+        self._workers = None
+        self._workers_loop = None
+
+    def get_workers(self):
+        """Return the queue of idle executors for the running loop."""
+        # A queue belongs to the loop it is used in.
+        loop = asyncio.get_running_loop()
+        if self._workers_loop is not loop:
+            self._workers = asyncio.Queue()
+            for executor in self.executors:
+                self._workers.put_nowait(executor)
+            self._workers_loop = loop
+        return self._workers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            raise ValueError(
+                "Django can only handle ASGI/HTTP connections, not %s."
+                % scope["type"]
+            )
+        # Slow clients send their body without holding a worker.
+        try:
+            body_file = await self.read_body(receive)
+        except RequestAborted:
+            return
+
+        workers = self.get_workers()
+        worker = await workers.get()
+        try:
+            # Thread-sensitive code runs on the thread that called
+            # async_to_sync(), so the whole request stays on the worker.
+            await sync_to_async(
+                async_to_sync(self.handle),
+                thread_sensitive=False,
+                executor=worker,
+            )(scope, body_file, send)
+        finally:
+            workers.put_nowait(worker)
+
+    async def handle(self, scope, body_file, send):
+        """Serve a request whose body was read, as ASGIHandler does."""
+        set_script_prefix(self.get_script_prefix(scope))
+        await sync_to_async(
+            signals.request_started.send, thread_sensitive=True
+        )(sender=self.__class__, scope=scope)
+        request, error_response = self.create_request(scope, body_file)
+        if request is None:
+            await self.send_response(error_response, send)
+            return
+        response = await self.get_response_async(request)
+        response._handler_class = self.__class__
+        if isinstance(response, FileResponse):
+            response.block_size = self.chunk_size
+        await self.send_response(response, send)
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return StorefrontASGIHandler()
+
+
 application = get_asgi_application()
@@ -0,0 +1,298 @@
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+
+from store.cache import stats as catalog_cache_stats
+from storefront import slow_queries
+from storefront.pooled_postgresql.pool import pool_stats
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Scrapers sending "Authorization: Bearer <TOKEN>" may read /metrics.
+    # Empty disables the token.
+    "TOKEN": "",
+    # Clients at these addresses may read /metrics without the token.
+    "ALLOWED_IPS": [],
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+# The same SQL run this many times in one request is reported as a
+# suspected N+1.
+N_PLUS_ONE_THRESHOLD = 5
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Any other method is recorded as "other", so that clients cannot add
+# label values.
+METHODS = {"GET", "HEAD", "OPTIONS", "POST", "PUT", "PATCH", "DELETE"}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            cumulative += count
+            yield f"{name}_bucket", {**labels, "le": str(bound)}, cumulative
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, cumulative
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql_seconds = 0
+        self.n_plus_one = 0
+        self.responses = Counter()
+
+
+class Registry:
+    """Per-process request metrics, keyed by view and method."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, method, status, seconds, recorder, repeated):
+        with self._lock:
+            metrics = self._views.get((view, method))
+            if metrics is None:
+                metrics = self._views[view, method] = ViewMetrics()
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(recorder.count)
+            metrics.sql_seconds += recorder.seconds
+            metrics.n_plus_one += len(repeated)
+            metrics.responses[status] += 1
+
+    def samples(self):
+        with self._lock:
+            for (view, method), metrics in sorted(self._views.items()):
+                labels = {"view": view, "method": method}
+                yield from metrics.latency.samples(
+                    "storefront_request_duration_seconds", labels
+                )
+                yield from metrics.queries.samples(
+                    "storefront_request_queries", labels
+                )
+                yield "storefront_sql_seconds_total", labels, round(
+                    metrics.sql_seconds, 6
+                )
+                yield "storefront_n_plus_one_total", labels, (
+                    metrics.n_plus_one
+                )
+                for status, count in sorted(metrics.responses.items()):
+                    yield "storefront_responses_total", {
+                        **labels,
+                        "status": str(status),
+                    }, count
+
+
+registry = Registry()
+
+HELP = {
+    "storefront_request_duration_seconds": (
+        "histogram",
+        "Time spent in the view and middleware below MetricsMiddleware.",
+    ),
+    "storefront_request_queries": (
+        "histogram",
+        "SQL queries run per request.",
+    ),
+    "storefront_sql_seconds_total": (
+        "counter",
+        "Time spent executing SQL.",
+    ),
+    "storefront_n_plus_one_total": (
+        "counter",
+        "Query shapes repeated N_PLUS_ONE_THRESHOLD or more times within "
+        "one request.",
+    ),
+    "storefront_responses_total": ("counter", "Responses by status code."),
+    "storefront_catalog_cache_total": (
+        "counter",
+        "Catalog response cache lookups by result.",
+    ),
+    "storefront_db_pool": ("gauge", "Connection pool state and counters."),
+}
+
+
+class QueryRecorder:
+    """
+    An execute wrapper counting and timing queries by their SQL, and
+    keeping those that took `slow_threshold` seconds or more.
+    """
+
+    def __init__(self, slow_threshold=None):
+        self.count = 0
+        self.seconds = 0
+        self.shapes = Counter()
+        self.slow_threshold = slow_threshold
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.seconds += elapsed
+            self.count += 1
+            # Parameters are kept apart from the SQL, so the same SQL
+            # string is the same query shape.
+            self.shapes[sql] += 1
+            if (
+                self.slow_threshold is not None
+                and elapsed >= self.slow_threshold
+            ):
+                self.slow.append(
+                    slow_queries.SlowQuery(
+                        context["connection"].alias, sql, params, elapsed
+                    )
+                )
+
+    def repeated(self):
+        return [
+            (sql, count)
+            for sql, count in self.shapes.items()
+            if count >= N_PLUS_ONE_THRESHOLD
+        ]
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    view = getattr(match.func, "view_class", match.func)
+    return view.__name__
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL query counts and SQL time for each view, logs
+    query shapes repeated within one request as suspected N+1s, and hands
+    statements over SLOW_QUERY_LOG["THRESHOLD_MS"] to the slow query log.
+    Queries run while a streaming response is consumed are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(slow_queries.threshold())
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(recorder)
+                )
+            started = time.perf_counter()
+            response = self.get_response(request)
+            seconds = time.perf_counter() - started
+
+        view = view_name(request)
+        repeated = recorder.repeated()
+        for sql, count in repeated:
+            logger.warning(
+                "Suspected N+1 in %s %s: %d queries of %s",
+                request.method,
+                view,
+                count,
+                sql,
+            )
+        if recorder.slow:
+            slow_queries.slow_query_log.capture(request, view, recorder.slow)
+        registry.record(
+            view,
+            request.method if request.method in METHODS else "other",
+            response.status_code,
+            seconds,
+            recorder,
+            repeated,
+        )
+        return response
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(name, labels, value):
+    if labels:
+        pairs = ",".join(
+            f'{key}="{_escape(label)}"' for key, label in labels.items()
+        )
+        return f"{name}{{{pairs}}} {value}"
+    return f"{name} {value}"
+
+
+def _samples():
+    yield from registry.samples()
+    for result, count in catalog_cache_stats.as_dict().items():
+        yield "storefront_catalog_cache_total", {"result": result}, count
+    for pool, stats in pool_stats().items():
+        for stat, value in stats.items():
+            yield "storefront_db_pool", {"pool": pool, "stat": stat}, value
+
+
+def _family(name):
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and name[: -len(suffix)] in HELP:
+            return name[: -len(suffix)]
+    return name
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "METRICS", {})}
+
+
+def can_read_metrics(request, config):
+    """
+    Whether `request` sends METRICS["TOKEN"] as a bearer token, comes from
+    one of METRICS["ALLOWED_IPS"] or is made by a staff user.
+    """
+    scheme, _, token = request.META.get("HTTP_AUTHORIZATION", "").partition(
+        " "
+    )
+    if scheme == "Bearer" and token and config["TOKEN"]:
+        if hmac.compare_digest(token.encode(), config["TOKEN"].encode()):
+            return True
+    if request.META.get("REMOTE_ADDR") in config["ALLOWED_IPS"]:
+        return True
+    return request.user.is_staff
+
+
+def metrics_view(request):
+    """Serve this process's metrics in the Prometheus text format."""
+    if not can_read_metrics(request, get_config()):
+        raise PermissionDenied
+    # Samples of a family have to be written together.
+    families = {}
+    for name, labels, value in _samples():
+        families.setdefault(_family(name), []).append(
+            _format(name, labels, value)
+        )
+
+    lines = []
+    for family, samples in families.items():
+        kind, text = HELP[family]
+        lines.append(f"# HELP {family} {text}")
+        lines.append(f"# TYPE {family} {kind}")
+        lines += samples
+    return HttpResponse("\n".join(lines) + "\n", content_type=CONTENT_TYPE)
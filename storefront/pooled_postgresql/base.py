@@ -0,0 +1,72 @@
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from .pool import ConnectionPool, get_pool
+
+POOL_DEFAULTS = {
+    "MAX_SIZE": 10,
+    "IDLE_TIMEOUT": 300,
+    "MAX_WAIT": 5,
+    "PING_AFTER": 1,
+}
+
+
+def _ping(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    _reset(connection)
+
+
+def _reset(connection):
+    if connection.closed:
+        raise base.Database.InterfaceError("connection already closed")
+    if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend that takes connections from a per-process pool
+    instead of opening one per request, and gives them back on close().
+
+    Configured with a `POOL` dict next to the usual settings (see
+    POOL_DEFAULTS). Leave CONN_MAX_AGE at 0, so that connections go back
+    to the pool at the end of every request.
+    """
+
+    @property
+    def pool(self):
+        def create():
+            options = {**POOL_DEFAULTS, **self.settings_dict.get("POOL", {})}
+            return ConnectionPool(
+                connect=None,
+                ping=_ping,
+                reset=_reset,
+                close=lambda connection: connection.close(),
+                max_size=options["MAX_SIZE"],
+                idle_timeout=options["IDLE_TIMEOUT"],
+                max_wait=options["MAX_WAIT"],
+                ping_after=options["PING_AFTER"],
+            )
+
+        # One pool per database, so that connections to the real database
+        # are not handed out once the test runner switches NAME.
+        return get_pool(f"{self.alias}/{self.settings_dict['NAME']}", create)
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            )
+        )
+        # Set by the parent on new connections only.
+        self.isolation_level = self.settings_dict["OPTIONS"].get(
+            "isolation_level", connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            # A connection with errors may be broken; reset() in release()
+            # finds out and discards it if so.
+            self.pool.release(self.connection)
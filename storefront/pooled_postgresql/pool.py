@@ -0,0 +1,209 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of DB-API connections for one process.
+
+    `connect()` opens a connection, `ping(connection)` must raise if the
+    connection is no longer usable, `reset(connection)` must leave it
+    outside of any transaction, and `close(connection)` discards it. Idle
+    connections are reused most recent first, closed once idle for more
+    than `idle_timeout` seconds, and pinged before reuse if idle for more
+    than `ping_after` seconds. With `max_size` connections checked out,
+    `acquire()` waits up to `max_wait` seconds before raising PoolTimeout.
+    """
+
+    def __init__(
+        self,
+        connect,
+        ping,
+        reset,
+        close,
+        max_size=10,
+        idle_timeout=300,
+        max_wait=5,
+        ping_after=1,
+    ):
+        self.connect = connect
+        self.ping = ping
+        self.reset = reset
+        self.close = close
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_wait = max_wait
+        self.ping_after = ping_after
+        self.pid = os.getpid()
+
+        self._available = threading.Condition(threading.Lock())
+        self._idle = deque()
+        self._size = 0
+        self._counters = dict.fromkeys(
+            [
+                "checkouts",
+                "waits",
+                "timeouts",
+                "opened",
+                "closed",
+                "ping_failures",
+            ],
+            0,
+        )
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    def acquire(self, connect=None):
+        """
+        Return an idle connection, or a new one if the pool has room, or
+        wait for one to be released.
+        """
+        connect = connect or self.connect
+        deadline = None
+        while True:
+            stale = []
+            connection = idle_for = None
+            with self._available:
+                while self._idle:
+                    candidate, released_at = self._idle.pop()
+                    idle_for = time.monotonic() - released_at
+                    if idle_for > self.idle_timeout:
+                        stale.append(candidate)
+                        self._size -= 1
+                        continue
+                    connection = candidate
+                    break
+
+                if connection is None and self._size >= self.max_size:
+                    if deadline is None:
+                        deadline = time.monotonic() + self.max_wait
+                        self._counters["waits"] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"No connection available within "
+                            f"{self.max_wait}s ({self.max_size} in use)"
+                        )
+                    # Nothing was idle, so nothing is stale either.
+                    self._available.wait(remaining)
+                    continue
+
+                if connection is None:
+                    # Reserve the slot before connecting outside the lock.
+                    self._size += 1
+                self._record_checkout(deadline)
+            self._discard(stale)
+
+            if connection is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    with self._available:
+                        self._size -= 1
+                        self._available.notify()
+                    raise
+                with self._available:
+                    self._counters["opened"] += 1
+                return connection
+
+            if idle_for > self.ping_after:
+                try:
+                    self.ping(connection)
+                except Exception:
+                    with self._available:
+                        self._counters["ping_failures"] += 1
+                        self._size -= 1
+                        self._available.notify()
+                    self._discard([connection])
+                    continue
+            return connection
+
+    def release(self, connection, discard=False):
+        """Return a connection to the pool, or close it if `discard`."""
+        if not discard:
+            try:
+                self.reset(connection)
+            except Exception:
+                discard = True
+
+        with self._available:
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._available.notify()
+        if discard:
+            self._discard([connection])
+
+    def close_idle(self):
+        with self._available:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+        self._discard(idle)
+
+    def stats(self):
+        with self._available:
+            stats = dict(self._counters)
+            stats.update(
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._size - len(self._idle),
+                max_size=self.max_size,
+                wait_time_total=round(self._wait_time, 6),
+                wait_time_max=round(self._max_wait_time, 6),
+            )
+        return stats
+
+    def _record_checkout(self, deadline):
+        # Called with the lock held.
+        self._counters["checkouts"] += 1
+        if deadline is not None:
+            waited = time.monotonic() - (deadline - self.max_wait)
+            self._wait_time += waited
+            self._max_wait_time = max(self._max_wait_time, waited)
+
+    def _discard(self, connections):
+        for connection in connections:
+            try:
+                self.close(connection)
+            except Exception:
+                pass
+        if connections:
+            with self._available:
+                self._counters["closed"] += len(connections)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name, factory):
+    """
+    Return the process-wide pool called `name`, creating it with
+    `factory()`. A pool inherited through fork() is dropped without
+    closing its connections, which belong to the parent.
+    """
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[name] = factory()
+        return pool
+
+
+def pool_stats():
+    """Return `{name: stats}` for the pools of this process."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {
+        name: pool.stats()
+        for name, pool in pools.items()
+        if pool.pid == os.getpid()
+    }
@@ -0,0 +1,133 @@
+import cProfile
+import hmac
+import os
+import random
+import re
+import tempfile
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+
+from storefront.metrics import view_name
+
+DEFAULTS = {
+    "DIR": str(Path(tempfile.gettempdir()) / "storefront-profiles"),
+    # Fraction of all requests profiled.
+    "SAMPLE_RATE": 0,
+    # Requests sending this value in the X-Profile header are profiled.
+    # Empty disables the header.
+    "TOKEN": "",
+    # Number of most recent profiles kept.
+    "KEEP": 200,
+}
+HEADER = "HTTP_X_PROFILE"
+SUFFIX = ".pstats"
+
+Profile = namedtuple("Profile", ["path", "time", "view", "duration_ms"])
+
+# <UTC time>-<id>.<view>.<duration>ms.pstats, so that names sort by time.
+_NAME = re.compile(r"^(\d{8}T\d{12})-\w+\.(\w+)\.(\d+(?:\.\d+)?)ms\.pstats$")
+_STAMP = "%Y%m%dT%H%M%S%f"
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "PROFILING", {})}
+
+
+def should_profile(request, config):
+    """
+    Return whether to profile `request`, and whether it asked to be, by
+    sending the token in the X-Profile header.
+    """
+    token = request.META.get(HEADER)
+    if token and config["TOKEN"]:
+        authorized = hmac.compare_digest(
+            token.encode(), config["TOKEN"].encode()
+        )
+        return authorized, True
+    return random.random() < config["SAMPLE_RATE"], False
+
+
+def save(profiler, view, seconds, config):
+    """Dump `profiler` to DIR, drop profiles beyond KEEP, return the path."""
+    directory = Path(config["DIR"])
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime(_STAMP)
+    name = f"{stamp}-{uuid.uuid4().hex[:8]}.{view}.{seconds * 1000:.1f}ms"
+    path = directory / (name + SUFFIX)
+    # Readers never see a partly written profile.
+    partial = directory / (name + ".tmp")
+    profiler.dump_stats(partial)
+    os.replace(partial, path)
+
+    for stale in sorted(directory.glob("*" + SUFFIX))[: -config["KEEP"]]:
+        try:
+            stale.unlink()
+        except FileNotFoundError:
+            # Pruned by another process.
+            pass
+    return path
+
+
+def stored_profiles(view=None):
+    """Return the kept profiles, oldest first, optionally for one view."""
+    directory = Path(get_config()["DIR"])
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in sorted(directory.glob("*" + SUFFIX)):
+        match = _NAME.match(path.name)
+        if match is None or (view and match[2] != view):
+            continue
+        profiles.append(
+            Profile(
+                path,
+                datetime.strptime(match[1], _STAMP).replace(
+                    tzinfo=timezone.utc
+                ),
+                match[2],
+                float(match[3]),
+            )
+        )
+    return profiles
+
+
+class ProfilingMiddleware:
+    """
+    Runs cProfile over a sample of requests, and over requests whose
+    X-Profile header holds PROFILING["TOKEN"], and keeps the most recent
+    profiles as .pstats files named after the view and the duration.
+    Requests sending the header get the file name in X-Profile-Id.
+    Work done while a streaming response is consumed is not profiled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_config()
+        profile, requested = should_profile(request, config)
+        if not profile:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active, on Python 3.12+ one per process.
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        seconds = time.perf_counter() - started
+
+        path = save(profiler, view_name(request), seconds, config)
+        if requested:
+            response["X-Profile-Id"] = path.name
+        return response
@@ -0,0 +1,185 @@
+import math
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PIN_COOKIE = "db_primary_until"
+HEALTH_CHECK_INTERVAL = 10
+
+_NOT_CHOSEN = object()
+_route = ContextVar("db_route", default=None)
+_health = {}
+_health_lock = threading.Lock()
+
+
+class Route:
+    """Routing state and decisions for one request."""
+
+    def __init__(self, use_replicas, pinned=False):
+        self.use_replicas = use_replicas
+        self.pinned = pinned
+        self.wrote = False
+        # Depth of read_from_primary() blocks.
+        self.primary_only = 0
+        self.replica = _NOT_CHOSEN
+        self.decisions = Counter()
+
+    def read_alias(self):
+        """
+        Return the replica this request reads from, chosen on its first
+        read, or None to read from the primary.
+        """
+        if not self.use_replicas or self.wrote or self.primary_only:
+            return None
+        if self.replica is _NOT_CHOSEN:
+            self.replica = choose_replica()
+        return self.replica
+
+    def describe(self):
+        parts = [
+            f"{kind}={alias}:{count}"
+            for (kind, alias), count in sorted(self.decisions.items())
+        ]
+        if self.pinned:
+            parts.append("pinned")
+        return ", ".join(parts) or "none"
+
+
+def get_replicas():
+    """Return `{alias: weight}` from settings.DATABASE_REPLICAS."""
+    return getattr(settings, "DATABASE_REPLICAS", {})
+
+
+def is_healthy(alias):
+    """
+    Whether a connection to `alias` can be made, checked at most every
+    HEALTH_CHECK_INTERVAL seconds per process.
+    """
+    now = time.monotonic()
+    with _health_lock:
+        healthy, checked_at = _health.get(alias, (True, None))
+        if checked_at is not None and now - checked_at < HEALTH_CHECK_INTERVAL:
+            return healthy
+        # Other threads keep the previous answer while this one checks.
+        _health[alias] = (healthy, now)
+
+    try:
+        connections[alias].ensure_connection()
+        healthy = True
+    except DatabaseError:
+        healthy = False
+    with _health_lock:
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+def choose_replica():
+    """Pick a healthy replica by weight, or None to use the primary."""
+    replicas = [
+        (alias, weight)
+        for alias, weight in get_replicas().items()
+        if weight > 0 and is_healthy(alias)
+    ]
+    if not replicas:
+        return None
+    aliases, weights = zip(*replicas)
+    return random.choices(aliases, weights=weights)[0]
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Send the reads of the current request to the primary within the
+    block, e.g. while filling a cache whose key comes from data the
+    replicas may not have caught up with yet.
+    """
+    route = _route.get()
+    if route is None:
+        yield
+        return
+    route.primary_only += 1
+    try:
+        yield
+    finally:
+        route.primary_only -= 1
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a replica while ReplicaMiddleware allows it for the
+    current request, and everything else to the primary. Outside of a
+    request (commands, shells) every query goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        if route is None:
+            return None
+        alias = route.read_alias()
+        route.decisions["read", alias or DEFAULT_DB_ALIAS] += 1
+        return alias
+
+    def db_for_write(self, model, **hints):
+        route = _route.get()
+        if route is not None:
+            # Reads after a write in the same request see it too.
+            route.wrote = True
+            route.decisions["write", DEFAULT_DB_ALIAS] += 1
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Lets safe requests read from replicas, and pins a client to the
+    primary for settings.REPLICA_PIN_SECONDS after it writes, through a
+    cookie, so that it reads its own writes. Clients that drop cookies
+    are not pinned.
+
+    Each response reports the routing decisions in `X-DB-Route`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        route = Route(
+            use_replicas=request.method in SAFE_METHODS
+            and not pinned
+            and bool(get_replicas()),
+            pinned=pinned,
+        )
+
+        token = _route.set(route)
+        try:
+            response = self.get_response(request)
+        finally:
+            _route.reset(token)
+
+        if route.wrote or request.method not in SAFE_METHODS:
+            window = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+            response.set_cookie(
+                PIN_COOKIE,
+                str(time.time() + window),
+                max_age=math.ceil(window),
+                httponly=True,
+                samesite="Lax",
+            )
+        response["X-DB-Route"] = route.describe()
+        return response
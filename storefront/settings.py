@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "djoser",
     "django_filters",
@@ -51,8 +53,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "storefront.metrics.MetricsMiddleware",
+    "storefront.profiling.ProfilingMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "storefront.replicas.ReplicaMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -91,14 +96,34 @@ WSGI_APPLICATION = "storefront.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        # django.db.backends.postgresql with a per-process connection pool.
+        # CONN_MAX_AGE stays 0 so connections return to the pool after
+        # every request.
+        "ENGINE": "storefront.pooled_postgresql",
         "NAME": "storefront2",
         "USER": "postgres",
         "PASSWORD": "postgres",
         "HOST": "localhost",
+        "POOL": {
+            "MAX_SIZE": 10,
+            "IDLE_TIMEOUT": 300,
+            "MAX_WAIT": 5,
+            "PING_AFTER": 1,
+        },
     }
 }
 
+# Read replicas as {alias: weight}, each alias also defined in DATABASES.
+# Safe requests read from a healthy replica chosen by weight; clients are
+# pinned to the primary for REPLICA_PIN_SECONDS after they write.
+DATABASE_REPLICAS = {}
+REPLICA_PIN_SECONDS = 5
+DATABASE_ROUTERS = ["storefront.replicas.ReplicaRouter"]
+
+# Requests storefront.asgi runs at once, each on its own thread; keep it
+# at or below the connection pool's MAX_SIZE.
+ASGI_MAX_CONCURRENCY = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -143,10 +168,55 @@ STATIC_URL = "/static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Catalog responses are cached per model generation, which every worker
+    # must see, so this is file based rather than per-process local memory.
+    # LocMemCache is fine for a single-process runserver.
+    "catalog": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": str(Path(tempfile.gettempdir()) / "storefront-catalog"),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+# Statements slower than THRESHOLD_MS are appended to PATH, rotated at
+# MAX_BYTES to PATH.1 ... PATH.<BACKUP_COUNT>; see `manage.py
+# slow_queries`. EXPLAIN output is captured for a sample of the slow
+# SELECTs. Set PARAMS to False to keep parameter values, which can hold
+# personal data, out of the log.
+SLOW_QUERY_LOG = {
+    "PATH": str(Path(tempfile.gettempdir()) / "storefront-slow-queries.jsonl"),
+    "THRESHOLD_MS": 200,
+    "EXPLAIN_SAMPLE_RATE": 0.1,
+    "EXPLAIN_INTERVAL": 300,
+    "MAX_BYTES": 10 * 1024 * 1024,
+    "BACKUP_COUNT": 5,
+    "PARAMS": True,
+}
+
+# /metrics answers scrapers sending TOKEN as a bearer token, clients at
+# ALLOWED_IPS and staff users; anyone else gets a 403. Behind a reverse
+# proxy on the same host every client comes from 127.0.0.1, so no address
+# is trusted by default.
+METRICS = {
+    "TOKEN": "",
+    "ALLOWED_IPS": [],
+}
+
+PROFILING = {
+    "DIR": str(Path(tempfile.gettempdir()) / "storefront-profiles"),
+    "SAMPLE_RATE": 0,
+    "TOKEN": "",
+    "KEEP": 200,
+}
+
 REST_FRAMEWORK = {
     "COERCE_DECIMAL_TO_STRING": False,
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "store.authentication.ClaimsJWTAuthentication",
     ),
 }
 
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import locks
+from django.db import DatabaseError, connections, transaction
+
+DEFAULTS = {
+    "PATH": str(Path(tempfile.gettempdir()) / "storefront-slow-queries.jsonl"),
+    "THRESHOLD_MS": 200,
+    # Fraction of slow SELECTs whose plan is captured, at most once per
+    # fingerprint every EXPLAIN_INTERVAL seconds.
+    "EXPLAIN_SAMPLE_RATE": 0.1,
+    "EXPLAIN_INTERVAL": 300,
+    # PATH is rotated at MAX_BYTES, keeping PATH.1 to PATH.<BACKUP_COUNT>.
+    "MAX_BYTES": 10 * 1024 * 1024,
+    "BACKUP_COUNT": 5,
+    # Parameter values can hold personal data.
+    "PARAMS": True,
+}
+# Parameters are truncated to this many characters each.
+MAX_PARAM_LENGTH = 200
+
+SlowQuery = namedtuple("SlowQuery", ["alias", "sql", "params", "seconds"])
+
+_NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    # IN lists and VALUES rows of any length.
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+"), "(...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "SLOW_QUERY_LOG", {})}
+
+
+def threshold():
+    """The duration in seconds from which a statement is recorded."""
+    return get_config()["THRESHOLD_MS"] / 1000
+
+
+def normalize(sql):
+    """
+    Replace literals and placeholders, so that statements differing only
+    in their values normalize to the same text.
+    """
+    for pattern, replacement in _NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:16]
+
+
+def explainable(sql):
+    """Whether `sql` is a SELECT that takes no row locks."""
+    statement = sql.lstrip().upper()
+    return statement.startswith("SELECT") and "FOR UPDATE" not in statement
+
+
+def explain(alias, sql, params):
+    """
+    Return the plan of a SELECT, with run-time statistics on PostgreSQL,
+    or None for other statements and databases.
+
+    EXPLAIN ANALYZE runs the statement, and a SELECT can still write
+    through the functions it calls, so it is run in a transaction or
+    savepoint that is always rolled back.
+    """
+    if not explainable(sql):
+        return None
+    connection = connections[alias]
+    if connection.vendor == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    elif connection.vendor == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return None
+    try:
+        with transaction.atomic(using=alias):
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                rows = cursor.fetchall()
+            transaction.set_rollback(True, using=alias)
+    except DatabaseError as error:
+        return f"EXPLAIN failed: {error}"
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def _params(params):
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        params = params.items()
+    return [repr(param)[:MAX_PARAM_LENGTH] for param in params]
+
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler for a file that several processes append to.
+
+    Records are written under an exclusive lock on `<file>.lock`, and a
+    process reopens the file first if another one has rotated it, so the
+    file is rotated once, by whichever process fills it.
+    """
+
+    def emit(self, record):
+        with open(self.baseFilename + ".lock", "a") as lock:
+            locks.lock(lock, locks.LOCK_EX)
+            try:
+                self._reopen_if_moved()
+                super().emit(record)
+            finally:
+                locks.unlock(lock)
+
+    def _reopen_if_moved(self):
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(self.stream.fileno())
+        if current is None or not os.path.samestat(current, opened):
+            self.stream.close()
+            self.stream = None
+
+
+class SlowQueryLog:
+    """
+    Appends slow statements as JSON lines to a file rotated at MAX_BYTES,
+    and reads them back with its rotated copies, oldest first.
+
+    Every process appends to the same file through a
+    SharedRotatingFileHandler. Processes also reopen the file once an
+    outside tool such as logrotate has moved it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handler = None
+        self._explained = {}
+
+    @property
+    def path(self):
+        return Path(get_config()["PATH"])
+
+    def paths(self):
+        config = get_config()
+        backups = [
+            self.path.with_name(f"{self.path.name}.{index}")
+            for index in range(config["BACKUP_COUNT"], 0, -1)
+        ]
+        return [path for path in [*backups, self.path] if path.exists()]
+
+    def _get_handler(self):
+        with self._lock:
+            if self._handler is None:
+                config = get_config()
+                self._handler = SharedRotatingFileHandler(
+                    config["PATH"],
+                    maxBytes=config["MAX_BYTES"],
+                    backupCount=config["BACKUP_COUNT"],
+                    encoding="utf-8",
+                    delay=True,
+                )
+            return self._handler
+
+    def _should_explain(self, key):
+        config = get_config()
+        if random.random() >= config["EXPLAIN_SAMPLE_RATE"]:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained.get(key)
+            if last is not None and now - last < config["EXPLAIN_INTERVAL"]:
+                return False
+            self._explained[key] = now
+        return True
+
+    def capture(self, request, view, queries):
+        """Record `queries`, slow SlowQuery tuples run by `request`."""
+        match = getattr(request, "resolver_match", None)
+        handler = self._get_handler()
+        with_params = get_config()["PARAMS"]
+        for query in queries:
+            key = fingerprint(query.sql)
+            entry = {
+                "time": datetime.now(timezone.utc).isoformat(),
+                "fingerprint": key,
+                "duration_ms": round(query.seconds * 1000, 3),
+                "alias": query.alias,
+                "sql": query.sql,
+                "params": _params(query.params) if with_params else [],
+                "view": view,
+                "url_name": match.view_name if match else None,
+                "method": request.method,
+                "path": request.path,
+            }
+            if self._should_explain(key):
+                entry["plan"] = explain(query.alias, query.sql, query.params)
+            handler.handle(
+                logging.makeLogRecord({"msg": json.dumps(entry, default=str)})
+            )
+
+    def entries(self):
+        for path in self.paths():
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash.
+                        continue
+
+
+slow_query_log = SlowQueryLog()
@@ -1,7 +1,14 @@
 from django.contrib import admin
 from django.urls import path, include
+from rest_framework_simplejwt.views import (
+    TokenObtainPairView,
+    TokenRefreshView,
+)
 import debug_toolbar
 
+from store.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from storefront.metrics import metrics_view
+
 admin.site.site_header = "Storefront Admin"
 admin.site.index_title = "Admin"
 
@@ -10,6 +17,18 @@ urlpatterns = [
     path("playground/", include("playground.urls")),
     path("store/", include("store.urls")),
     path("auth/", include("djoser.urls")),
+    # Issue tokens carrying the claims store.authentication relies on.
+    path(
+        "auth/jwt/create/",
+        TokenObtainPairView.as_view(
+            serializer_class=TokenObtainPairSerializer
+        ),
+    ),
+    path(
+        "auth/jwt/refresh/",
+        TokenRefreshView.as_view(serializer_class=TokenRefreshSerializer),
+    ),
     path("auth/", include("djoser.urls.jwt")),
     path("__debug__/", include(debug_toolbar.urls)),
+    path("metrics", metrics_view),
 ]
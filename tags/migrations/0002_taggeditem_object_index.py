@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+import storefront.operations
+
+
+class Migration(migrations.Migration):
+
+    # The index is built concurrently on PostgreSQL, which cannot be done
+    # in a transaction.
+    atomic = False
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tags', '0001_initial'),
+    ]
+
+    operations = [
+        storefront.operations.AddIndexConcurrently(
+            model_name='taggeditem',
+            index=models.Index(fields=['content_type', 'object_id'], name='tags_tagged_content_eaa81e_idx'),
+        ),
+        migrations.AlterField(
+            model_name='taggeditem',
+            name='content_type',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype'),
+        ),
+    ]
@@ -9,6 +9,12 @@ class Tag(models.Model):
 
 class TaggedItem(models.Model):
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
-    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    # Indexed by the (content_type, object_id) index in Meta.
+    content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, db_index=False
+    )
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
+
+    class Meta:
+        indexes = [models.Index(fields=["content_type", "object_id"])]